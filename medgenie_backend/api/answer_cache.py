@@ -0,0 +1,183 @@
+# medgenie_backend/api/answer_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .utils import GROQ_EMBED_MODEL
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))  # 0 = disabled
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds, 0 = never expire
+# Cosine, question vs question, for near-duplicate hits. Only on by default
+# with a semantic embedding model: hash embeddings are bags of words, where
+# "is metformin safe" / "... unsafe" score 0.67 and real paraphrases score
+# lower still, so no threshold separates them (exact repeats still hit).
+_similarity = os.getenv("ANSWER_CACHE_SIMILARITY", "").strip()
+ANSWER_CACHE_SIMILARITY = float(_similarity) if _similarity else (0.95 if GROQ_EMBED_MODEL else None)
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split()).strip(" ?!.")
+
+
+def doc_fingerprints(hits) -> dict:
+    """id -> hash of the chunk text each retrieved hit carried."""
+    return {
+        h["id"]: hashlib.sha1((h.get("contents") or "").encode("utf-8")).hexdigest()
+        for h in hits
+        if h.get("id") is not None
+    }
+
+
+def _group_key(model: str, docs: dict, budget) -> str:
+    return hashlib.sha1(f"{model}\0{budget}\0{sorted(docs.items())}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU of generated answers keyed on the model, the context token budget,
+    the question and the retrieved chunks (ids + content hashes). A lookup with the same
+    normalized question is an exact hit; otherwise an entry for the same
+    model and chunks whose question embedding is within `similarity`
+    (cosine) is a near-duplicate hit; `similarity` None turns that off. An entry citing a chunk whose content
+    has since changed is dropped the first time the new content is seen.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> entry
+        self._groups = {}  # group key -> {key}
+        self._by_doc = {}  # chunk id -> {key}
+        self.exact_hits = self.similar_hits = self.misses = self.invalidated = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, model: str, question: str, qvec, hits, budget=None):
+        """(answer, "exact" | "similar") or None."""
+        if not self.max_entries:
+            return None
+        docs = doc_fingerprints(hits)
+        group = _group_key(model, docs, budget)
+        key = f"{group}:{_normalize(question)}"
+        now = time.time()
+        with self._lock:
+            self._drop_changed(docs)
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry, now):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["answer"], "exact"
+
+            if self.similarity is None:
+                self.misses += 1
+                return None
+            q = _unit(qvec)
+            best, best_sim = None, self.similarity
+            for k in list(self._groups.get(group, ())):
+                cand = self._entries[k]
+                if not self._fresh(cand, now):
+                    self._remove(k)
+                    continue
+                if cand["vec"].shape != q.shape:
+                    continue
+                sim = float(np.dot(q, cand["vec"]))
+                if sim >= best_sim:
+                    best, best_sim = k, sim
+            if best is not None:
+                self._entries.move_to_end(best)
+                self.similar_hits += 1
+                return self._entries[best]["answer"], "similar"
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, question: str, qvec, hits, answer: str, budget=None):
+        if not self.max_entries or not answer:
+            return
+        docs = doc_fingerprints(hits)
+        group = _group_key(model, docs, budget)
+        key = f"{group}:{_normalize(question)}"
+        with self._lock:
+            self._drop_changed(docs)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"stored_at": time.time(), "vec": _unit(qvec), "answer": answer, "group": group, "docs": docs}
+            self._groups.setdefault(group, set()).add(key)
+            for doc_id in docs:
+                self._by_doc.setdefault(doc_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, ids) -> int:
+        """Drops every answer that cited one of the chunk `ids` (called on index writes)."""
+        with self._lock:
+            keys = set().union(*(self._by_doc.get(i, ()) for i in ids)) if ids else set()
+            for k in keys:
+                self._remove(k)
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._by_doc.clear()
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "llm_calls_saved": hits,
+            "invalidated": self.invalidated,
+            "evictions": self.evictions,
+        }
+
+    def _fresh(self, entry, now: float) -> bool:
+        return not self.ttl or (now - entry["stored_at"]) <= self.ttl
+
+    def _drop_changed(self, docs: dict):
+        stale = {
+            k
+            for doc_id, fp in docs.items()
+            for k in self._by_doc.get(doc_id, ())
+            if self._entries[k]["docs"][doc_id] != fp
+        }
+        for k in stale:
+            self._remove(k)
+        self.invalidated += len(stale)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        keys = self._groups.get(entry["group"])
+        keys.discard(key)
+        if not keys:
+            del self._groups[entry["group"]]
+        for doc_id in entry["docs"]:
+            keys = self._by_doc[doc_id]
+            keys.discard(key)
+            if not keys:
+                del self._by_doc[doc_id]
+
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).ravel()
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+ANSWER_CACHE = AnswerCache()
@@ -0,0 +1,87 @@
+# medgenie_backend/api/async_api.py
+import functools
+import json
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+
+def async_api_view(methods):
+    """
+    @api_view for `async def` views (DRF's decorator only runs sync ones):
+    method check, CSRF exemption and `request.data` from a JSON or form body.
+    Views return JsonResponse.
+    """
+    allowed = [m.upper() for m in methods]
+
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in allowed:
+                return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                request.data = _parse_body(request)
+            except ValueError:
+                return JsonResponse({"detail": "JSON parse error"}, status=400)
+            return await view(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+def _parse_body(request):
+    if request.method in ("GET", "HEAD", "DELETE"):
+        return {}
+    if (request.content_type or "").startswith("application/json"):
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+    return request.POST
+
+
+def wants_stream(request) -> bool:
+    """Streaming mode: {"stream": true} in the body or an SSE Accept header."""
+    return bool(request.data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def sse_response(events) -> StreamingHttpResponse:
+    """Server-Sent Events response over an async iterator of sse_event() bytes."""
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep nginx-style proxies from buffering the stream
+    return response
+
+
+def sse_completion(model: str, messages: list, params: dict, result_key: str, first=(), on_done=None):
+    """
+    Streams a completion as SSE: the `first` (event, data) pairs (e.g.
+    retrieval hits) go out immediately, then one "token" event per delta,
+    then "done" with the whole text under `result_key` (or "error").
+    `on_done(text)` runs once a completion finished without error.
+    """
+    from .llm import astream
+
+    async def events():
+        for event, data in first:
+            yield sse_event(event, data)
+        parts = []
+        try:
+            async for token in astream(model, messages, **params):
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        text = "".join(parts)
+        if on_done is not None:
+            on_done(text)
+        yield sse_event("done", {result_key: text})
+
+    return sse_response(events())
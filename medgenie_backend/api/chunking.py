@@ -0,0 +1,172 @@
+# medgenie_backend/api/chunking.py
+import hashlib
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "900"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", "150"))  # trailing sentences repeated in the next chunk
+
+# Sections: blank lines, or a markdown / "Heading:" style line starting a block.
+_SECTION_RE = re.compile(r"\n\s*\n|\n(?=#{1,6} |[A-Z][A-Za-z /&-]{0,40}:\s*\n)")
+# A sentence ends at . ! ? (optionally closed by a quote/bracket) followed by
+# whitespace, or at a line break.
+_SENTENCE_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\s*\n\s*")
+# "Dr. Smith", "e.g. aspirin", "approx. 5 mg": not sentence ends
+_ABBREV = frozenset("dr mr mrs ms prof st vs e.g i.e etc approx no fig mg ml kg min max wk yr".split())
+
+
+def split_sections(text: str) -> List[str]:
+    return [s.strip() for s in _SECTION_RE.split(text or "") if s.strip()]
+
+
+def split_sentences(section: str) -> List[str]:
+    out: List[str] = []
+    pos = 0
+    for m in _SENTENCE_RE.finditer(section):
+        piece = section[pos : m.start()] + section[m.start() : m.end()].strip()
+        words = piece.rsplit(None, 1)
+        last = words[-1].rstrip(".").lower() if words else ""
+        if "\n" not in m.group(0) and last in _ABBREV:
+            continue
+        if piece.strip():
+            out.append(piece.strip())
+        pos = m.end()
+    if section[pos:].strip():
+        out.append(section[pos:].strip())
+    return out
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """A sentence longer than a chunk: cut at the last space before the limit."""
+    out = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars + 1)
+        if cut <= max_chars // 2:
+            cut = max_chars
+        out.append(sentence[:cut].rstrip())
+        sentence = sentence[cut:].lstrip()
+    if sentence:
+        out.append(sentence)
+    return out
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_MAX_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """
+    Splits `text` into chunks of at most `max_chars`, packing whole
+    sentences. Sections (blank-line separated blocks, headings) always start
+    a new chunk, so editing one section leaves the chunks of every other
+    section byte-identical, which is what lets re-indexing skip them. Each
+    chunk after the first in a section repeats the previous chunk's trailing
+    sentences, up to `overlap` characters.
+    """
+    max_chars = max(1, int(max_chars))
+    overlap = max(0, min(int(overlap), max_chars // 2))
+    chunks: List[str] = []
+    for section in split_sections(text):
+        sentences = [p for s in split_sentences(section) for p in _split_long(s, max_chars)]
+        current: List[str] = []
+        size = 0
+        for s in sentences:
+            if current and size + 1 + len(s) > max_chars:
+                chunks.append(" ".join(current))
+                carry: List[str] = []
+                kept = 0
+                for prev in reversed(current):
+                    if kept + len(prev) + 1 > overlap or kept + len(prev) + 1 + len(s) > max_chars:
+                        break
+                    carry.insert(0, prev)
+                    kept += len(prev) + 1
+                current, size = carry, max(0, kept - 1)
+            size += (1 if current else 0) + len(s)
+            current.append(s)
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_id(doc_id: str, text: str) -> str:
+    """Content-addressed: the same chunk text in the same document always gets the same id."""
+    return f"{doc_id}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+
+
+def plan_chunks(doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None, **chunk_args) -> List[Dict[str, Any]]:
+    """Index items (without vectors) for one document; repeated chunks are kept once."""
+    items: Dict[str, Dict[str, Any]] = {}
+    for i, c in enumerate(chunk_text(text, **chunk_args)):
+        cid = chunk_id(doc_id, c)
+        if cid not in items:
+            items[cid] = {"id": cid, "contents": c, "metadata": {**(metadata or {}), "doc_id": doc_id, "chunk": i}}
+    return list(items.values())
+
+
+# metadata that tells two otherwise identical notes apart
+IDENTITY_FIELDS = ("patient_id", "encounter_id", "visit_id", "visit_date")
+
+
+def document_id(text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    A stable id for a document sent without one: "<source>:<hash>" over the
+    text and the identifying metadata (IDENTITY_FIELDS), so the same note
+    for two patients or two visits stays two documents. The same text for
+    the same patient and visit always maps to the same chunks; edited text
+    is a new document (send a doc_id to replace one).
+    """
+    metadata = metadata or {}
+    source = str(metadata.get("source") or "vault")
+    key = "\x1f".join([f"{f}={metadata.get(f)}" for f in IDENTITY_FIELDS if metadata.get(f) is not None] + [text or ""])
+    return f"{source}:{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def split_known(index, items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    Sorts planned items (content-hash ids, no vectors) against `index`:
+    (new items to embed, known items whose metadata changed, with their
+    stored vector, count of items already indexed as they are).
+    """
+    existing = index.get([it["id"] for it in items])
+    new, updated, unchanged = [], [], 0
+    for item in items:
+        old = existing.get(item["id"])
+        if old is None or old["contents"] != item["contents"]:
+            new.append(item)
+        elif old["metadata"] != item["metadata"]:
+            updated.append({**item, "vector": old["vector"]})
+        else:
+            unchanged += 1
+    return new, updated, unchanged
+
+
+def reindex_documents(
+    index,
+    docs: Sequence[Tuple[str, str, Optional[Dict[str, Any]]]],
+    embed: Callable[[List[str]], List[List[float]]],
+    **chunk_args,
+) -> List[Dict[str, int]]:
+    """
+    (Re)indexes [(doc_id, text, metadata), ...] incrementally against what
+    `index` already holds for each doc_id: only chunks whose content hash is
+    new are embedded (all in one `embed` call); unchanged chunks whose
+    metadata moved (e.g. their position) are re-upserted with their stored
+    vector; chunks no longer in the document are deleted. Returns per doc
+    {"chunks", "new", "updated", "unchanged", "deleted"}.
+    """
+    to_embed, to_upsert, stale, out = [], [], [], []
+    for doc_id, text, metadata in docs:
+        planned = plan_chunks(doc_id, text, metadata, **chunk_args)
+        new, updated, unchanged = split_known(index, planned)
+        planned_ids = {it["id"] for it in planned}
+        gone = [id_ for id_ in index.ids({"doc_id": doc_id}) if id_ not in planned_ids]
+        to_embed.extend(new)
+        to_upsert.extend(updated)
+        stale.extend(gone)
+        out.append({"chunks": len(planned), "new": len(new), "updated": len(updated), "unchanged": unchanged, "deleted": len(gone)})
+
+    if to_embed:
+        for item, vec in zip(to_embed, embed([it["contents"] for it in to_embed])):
+            item["vector"] = vec
+    if to_embed or to_upsert:
+        index.upsert(to_embed + to_upsert)
+    if stale:
+        index.delete(stale)
+    return out
@@ -1,12 +1,11 @@
-import os
-from groq import Groq
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from django.http import JsonResponse
 
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from .async_api import async_api_view
+from .llm import acomplete
 
-@api_view(["POST"])
-def ai_climate_forecast(request):
+
+@async_api_view(["POST"])
+async def ai_climate_forecast(request):
     location = request.data.get("location", "Unknown")
     weather = request.data.get("weather", {})
 
@@ -24,16 +23,13 @@ IMD weather data:
 """.strip()
 
     try:
-        completion = groq_client.chat.completions.create(
-            model="qwen2.5-32b",   # safer default (your earlier model)
-            messages=[{"role": "user", "content": prompt}],
+        result = await acomplete(
+            "qwen2.5-32b",   # safer default (your earlier model)
+            [{"role": "user", "content": prompt}],
             temperature=0.2
         )
-
-        msg = completion.choices[0].message
-        result = getattr(msg, "content", None) or msg.get("content")
-        return Response({"forecast": result})
+        return JsonResponse({"forecast": result})
 
     except Exception as e:
         print("CLIMATE GROQ ERROR:", e)
-        return Response({"error": str(e)}, status=500)
+        return JsonResponse({"error": str(e)}, status=500)
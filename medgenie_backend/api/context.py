@@ -0,0 +1,148 @@
+# medgenie_backend/api/context.py
+import hashlib
+import os
+import re
+from typing import Any, Dict, List
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # prompt tokens for retrieved docs
+CONTEXT_DEDUP_SIMILARITY = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", "0.9"))  # word-shingle Jaccard
+MIN_PARTIAL_TOKENS = 48  # a truncated block shorter than this is dropped instead
+
+# Roughly how BPE tokenizers split English: short words are one token, long
+# words a few, punctuation its own. Within ~15% of tiktoken on clinical text.
+_TOKEN_RE = re.compile(r"\w{1,6}|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _doc_and_chunk(hit: Dict[str, Any]):
+    """(document key, chunk number) for merging neighbours; chunk is None if unknown."""
+    meta = hit.get("metadata") or {}
+    hid = str(hit.get("id") or "")
+    chunk = meta.get("chunk")
+    if not isinstance(chunk, int):
+        return meta.get("doc_id") or hid, None
+    # chunker items carry doc_id; older vault ids are "<doc>_<n>"
+    suffix = str(chunk)
+    doc = hid[: -len(suffix) - 1] if hid.endswith(suffix) and len(hid) > len(suffix) else hid
+    return meta.get("doc_id") or doc, chunk
+
+
+def _join(a: str, b: str, max_overlap: int = 200) -> str:
+    """Concatenates neighbouring chunks, dropping text repeated across the boundary."""
+    for k in range(min(max_overlap, len(a), len(b)), 0, -1):
+        if a.endswith(b[:k]):
+            return a + b[k:]
+    return a + ("" if a.endswith((" ", "\n")) or b.startswith((" ", "\n")) else " ") + b
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Longest prefix within `tokens`, cut at a sentence end when there is one."""
+    pieces = list(_TOKEN_RE.finditer(text))
+    if len(pieces) <= tokens:
+        return text
+    cut = text[: pieces[tokens].start()]
+    end = max(cut.rfind(". "), cut.rfind("\n"))
+    if end > len(cut) // 2:
+        cut = cut[: end + 1]
+    return cut.rstrip() + " …"
+
+
+def assemble_context(
+    hits: List[Dict[str, Any]],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    similarity: float = CONTEXT_DEDUP_SIMILARITY,
+) -> Dict[str, Any]:
+    """
+    Turns ranked hits into prompt blocks: identical or near-identical chunks
+    (word 3-shingle Jaccard >= `similarity`) keep only their best-ranked
+    copy, consecutive chunks of one document become one block, and blocks
+    are taken in rank order until `budget` estimated tokens (the last one
+    truncated if enough room is left). Returns {"blocks": [...], "stats": {...}}
+    where each block is {"title", "text", "ids", "tokens"}.
+    """
+    stats = {
+        "chunks": len(hits),
+        "duplicates": 0,
+        "merged": 0,
+        "dropped": 0,
+        "truncated": 0,
+        "tokens_in": sum(estimate_tokens(h.get("contents") or "") for h in hits),
+    }
+
+    # 1) dedupe, best rank first
+    kept, seen_hashes, seen_shingles = [], set(), []
+    for h in hits:
+        text = (h.get("contents") or "").strip()
+        digest = hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+        sh = _shingles(text)
+        if not text or digest in seen_hashes or any(_jaccard(sh, s) >= similarity for s in seen_shingles):
+            stats["duplicates"] += 1
+            continue
+        seen_hashes.add(digest)
+        seen_shingles.append(sh)
+        kept.append(h)
+
+    # 2) merge consecutive chunks of a document; a block ranks as its best chunk
+    blocks: List[Dict[str, Any]] = []
+    by_doc: Dict[Any, List[Dict[str, Any]]] = {}
+    for h in kept:
+        doc, chunk = _doc_and_chunk(h)
+        text = h["contents"].strip()
+        for block in by_doc.get(doc, []) if chunk is not None else []:
+            if chunk == block["last"] + 1:
+                block["text"], block["last"] = _join(block["text"], text), chunk
+            elif chunk == block["first"] - 1:
+                block["text"], block["first"] = _join(text, block["text"]), chunk
+            else:
+                continue
+            block["ids"].append(h["id"])
+            stats["merged"] += 1
+            break
+        else:
+            meta = h.get("metadata") or {}
+            block = {"title": meta.get("title"), "text": text, "ids": [h["id"]], "first": chunk, "last": chunk}
+            blocks.append(block)
+            if chunk is not None:
+                by_doc.setdefault(doc, []).append(block)
+
+    # 3) fit the budget in rank order
+    out, used = [], 0
+    for block in blocks:
+        tokens = estimate_tokens(block["text"])
+        room = budget - used
+        if tokens > room:
+            if room < MIN_PARTIAL_TOKENS:
+                stats["dropped"] += 1
+                continue
+            block["text"] = _truncate(block["text"], room - 1)  # the ellipsis is a token
+            tokens = estimate_tokens(block["text"])
+            stats["truncated"] += 1
+        used += tokens
+        out.append({"title": block["title"], "text": block["text"], "ids": block["ids"], "tokens": tokens})
+
+    stats["blocks"] = len(out)
+    stats["tokens_used"] = used
+    stats["tokens_saved"] = max(0, stats["tokens_in"] - used)
+    return {"blocks": out, "stats": stats}
+
+
+def format_blocks(blocks: List[Dict[str, Any]]) -> str:
+    """The prompt's document section: "[DOC n] <title>" then the text, per block."""
+    return "\n".join(
+        f"[DOC {i}] {b.get('title') or f'DOC {i}'}\n{b['text']}".strip() for i, b in enumerate(blocks, start=1)
+    )
@@ -0,0 +1,127 @@
+# medgenie_backend/api/embed_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))  # seconds, 0 = never expire
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "").strip() or None  # sqlite file, optional
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha1(f"{model}\0{_normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of embeddings keyed on model name + normalized text, with a
+    TTL and an optional sqlite store that every put is written through to,
+    so entries evicted from memory (or lost on restart) can still be found.
+    Vectors are kept as float64 arrays so cached values round-trip exactly.
+    """
+
+    def __init__(self, max_entries: int = EMBED_CACHE_SIZE, ttl: float = EMBED_CACHE_TTL, path: str = None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()  # key -> (stored_at, vector)
+        self._db = None
+        self.hits = self.misses = self.evictions = self.expired = self.disk_hits = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, stored_at REAL, vec BLOB)")
+            if self.ttl:
+                self._db.execute("DELETE FROM embeddings WHERE stored_at < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._mem)
+
+    def get(self, model: str, text: str):
+        key = cache_key(model, text)
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and self._fresh(entry[0], now):
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry[1].tolist()
+            if entry is not None:
+                del self._mem[key]
+                self.expired += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT stored_at, vec FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row and self._fresh(row[0], now):
+                    vec = np.frombuffer(row[1], dtype=np.float64)
+                    self._insert(key, row[0], vec)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vec.tolist()
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector):
+        self.put_many(model, [(text, vector)])
+
+    def put_many(self, model: str, pairs):
+        """Caches [(text, vector), ...]; the sqlite tier gets one executemany and one commit."""
+        now = time.time()
+        rows = [(cache_key(model, text), np.asarray(vector, dtype=np.float64)) for text, vector in pairs]
+        if not rows:
+            return
+        with self._lock:
+            for key, vec in rows:
+                self._insert(key, now, vec)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, stored_at, vec) VALUES (?, ?, ?)",
+                    [(key, now, vec.tobytes()) for key, vec in rows],
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._mem),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "disk_hits": self.disk_hits,
+            "disk": self._db is not None,
+        }
+
+    def _fresh(self, stored_at: float, now: float) -> bool:
+        return not self.ttl or (now - stored_at) <= self.ttl
+
+    def _insert(self, key, stored_at, vec):
+        if not self.max_entries:
+            return
+        self._mem[key] = (stored_at, vec)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+
+EMBED_CACHE = EmbeddingCache(path=EMBED_CACHE_PATH)
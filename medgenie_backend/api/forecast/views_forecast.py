@@ -1,14 +1,18 @@
-import os
 import requests
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from groq import Groq
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from ..async_api import async_api_view
+from ..llm import acomplete
 
 
-@api_view(["GET"])
-def forecast_engine(request):
+def _imd_weather(city_id):
+    imd_url = f"https://city.imd.gov.in/api/cityweather.php?id={city_id}"
+    return requests.get(imd_url, timeout=10).json()
+
+
+@async_api_view(["GET"])
+async def forecast_engine(request):
     """
     Hybrid Forecast Engine:
     1. Pulls real IMD data (API)
@@ -23,8 +27,7 @@ def forecast_engine(request):
     city_id = request.GET.get("city_id", "42182")  # default Chandigarh
 
     try:
-        imd_url = f"https://city.imd.gov.in/api/cityweather.php?id={city_id}"
-        imd_data = requests.get(imd_url, timeout=10).json()
+        imd_data = await sync_to_async(_imd_weather, thread_sensitive=False)(city_id)
     except Exception as e:
         imd_data = {"error": str(e)}
 
@@ -51,20 +54,18 @@ def forecast_engine(request):
     """
 
     try:
-        ai_response = client.chat.completions.create(
-            model="qwen/qwen3-32b",
-            messages=[{"role": "user", "content": prompt}],
+        ai_text = await acomplete(
+            "qwen/qwen3-32b",
+            [{"role": "user", "content": prompt}],
             temperature=0.4,
             max_completion_tokens=700,
         )
 
-        ai_text = ai_response.choices[0].message["content"]
-
     except Exception as e:
         ai_text = f"AI Error: {e}"
 
     # ----------- 3. Final JSON Output -----------
-    return Response({
+    return JsonResponse({
         "city_id": city_id,
         "imd_data": imd_data,
         "ai_analysis": ai_text
@@ -0,0 +1,154 @@
+# medgenie_backend/api/jobs.py
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))  # pending jobs; submit fails beyond this
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))  # finished jobs kept for status lookups
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    One unit of background work. The job function receives the Job and
+    reports through update(), calling check_cancelled() between steps so a
+    cancel takes effect at the next step boundary.
+    """
+
+    def __init__(self, kind: str, fn, kwargs: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.kwargs = kwargs
+        self.status = "queued"  # queued | running | done | failed | cancelled
+        self.progress = {"docs": 0, "chunks": 0, "bytes": 0}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def update(self, **counts):
+        self.progress.update(counts)
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self) -> bool:
+        """Requests cancellation; False if the job already finished."""
+        if self._done.is_set():
+            return False
+        self._cancel.set()
+        return True
+
+    def wait(self, timeout=None) -> bool:
+        return self._done.wait(timeout)
+
+    def run(self):
+        if self._cancel.is_set():
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            self.result = self.fn(self, **self.kwargs)
+            self._finish("done")
+        except JobCancelled:
+            self._finish("cancelled")
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", self.id, self.kind)
+            self.error = str(e)
+            self._finish("failed")
+
+    def _finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        self._done.set()
+
+    def as_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "elapsed_s": elapsed,
+            "chunks_per_s": (self.progress.get("chunks", 0) / elapsed) if elapsed else 0.0,
+            "bytes_per_s": (self.progress.get("bytes", 0) / elapsed) if elapsed else 0.0,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self._cancel.is_set(),
+        }
+
+
+class JobQueue:
+    """
+    Bounded FIFO of jobs run by a small pool of daemon threads (started on
+    first submit). submit() raises queue.Full instead of letting a backlog
+    grow without limit.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_SIZE, history: int = JOB_HISTORY):
+        self.workers = max(1, int(workers))
+        self.history = max(1, int(history))
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, kind: str, fn, **kwargs) -> Job:
+        job = Job(kind, fn, kwargs)
+        with self._lock:
+            self._start()
+            self._queue.put_nowait(job)
+            self._jobs[job.id] = job
+            self._trim()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self._queue.qsize(), "max_pending": self._queue.maxsize}
+
+    def _start(self):
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _trim(self):
+        # forget the oldest finished jobs beyond the history limit
+        excess = len(self._jobs) - self.history
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at][: max(0, excess)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            finally:
+                self._queue.task_done()
+
+
+JOBS = JobQueue()
@@ -0,0 +1,218 @@
+# medgenie_backend/api/llm.py
+import asyncio
+import logging
+import os
+import random
+import threading
+from collections import defaultdict
+
+import groq
+import httpx
+from groq import AsyncGroq
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# ------------------------------------------------------------
+# LLM gateway: the one way views talk to the model
+# ------------------------------------------------------------
+# GROQ_BASE_URL lets the load test (or a proxy) stand in for api.groq.com
+LLM_BASE_URL = os.getenv("GROQ_BASE_URL", "").strip() or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds per attempt (read/write/pool)
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))  # seconds, doubled per retry with jitter
+# in-flight completions per model; "model=n,model=n" overrides the default
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "32"))
+LLM_MODEL_LIMITS = {
+    k.strip(): int(v)
+    for k, _, v in (p.partition("=") for p in os.getenv("LLM_MODEL_LIMITS", "").split(","))
+    if k.strip() and v.strip()
+}
+
+# Worth retrying: connection problems, timeouts, 429 and 5xx.
+_RETRYABLE = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMStreamInterrupted(Exception):
+    """A streamed completion failed after tokens had been sent."""
+
+
+class LLMStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = self.retries = self.errors = 0
+        self.in_flight = defaultdict(int)  # model -> running completions
+        self.waiting = defaultdict(int)  # model -> queued on the model's limit
+
+    def add(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def move(self, model: str, src=None, dst=None):
+        with self._lock:
+            if src is not None:
+                src[model] -= 1
+            if dst is not None:
+                dst[model] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "errors": self.errors,
+                "in_flight": {m: n for m, n in self.in_flight.items() if n},
+                "waiting": {m: n for m, n in self.waiting.items() if n},
+                "http2": _HTTP2,
+            }
+
+
+LLM_STATS = LLMStats()
+
+# All completions run on one background event loop with one AsyncGroq, so
+# the keep-alive connection pool is shared whether a view runs on the ASGI
+# loop or on a throwaway loop (Django runs async views that way under WSGI).
+_loop = None
+_clients = {}  # base URL -> AsyncGroq, used on the LLM loop only
+_limits = {}  # model -> asyncio.Semaphore, used on the LLM loop only
+_loop_lock = threading.Lock()
+
+
+def _llm_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _get_client() -> AsyncGroq:
+    # only called on the LLM loop. One client per base URL, kept for the
+    # life of the process: requests may still be running on an earlier one
+    # when LLM_BASE_URL is pointed elsewhere (the load test, the tests).
+    key = (LLM_BASE_URL or "").rstrip("/")
+    client = _clients.get(key)
+    if client is None:
+        http = httpx.AsyncClient(
+            http2=_HTTP2,
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        # retries are ours (jittered, counted), not the SDK's
+        client = _clients[key] = AsyncGroq(base_url=LLM_BASE_URL, max_retries=0, http_client=http)
+    return client
+
+
+def _limit(model: str) -> asyncio.Semaphore:
+    sem = _limits.get(model)
+    if sem is None:
+        sem = _limits[model] = asyncio.Semaphore(LLM_MODEL_LIMITS.get(model, LLM_MODEL_CONCURRENCY))
+    return sem
+
+
+def _delay(attempt: int, error: Exception) -> float:
+    delay = LLM_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+async def _with_retries(model: str, call):
+    """Runs `call()` under the model's concurrency limit, retrying transient failures."""
+    LLM_STATS.move(model, dst=LLM_STATS.waiting)
+    async with _limit(model):
+        LLM_STATS.move(model, src=LLM_STATS.waiting, dst=LLM_STATS.in_flight)
+        try:
+            for attempt in range(LLM_RETRIES + 1):
+                LLM_STATS.add("requests")
+                try:
+                    return await call()
+                except _RETRYABLE as e:
+                    if attempt == LLM_RETRIES:
+                        LLM_STATS.add("errors")
+                        raise
+                    LLM_STATS.add("retries")
+                    logger.warning("LLM call to %s failed (%s), retrying", model, e)
+                    await asyncio.sleep(_delay(attempt, e))
+                except Exception:
+                    LLM_STATS.add("errors")
+                    raise
+        finally:
+            LLM_STATS.move(model, src=LLM_STATS.in_flight)
+
+
+async def _complete(model: str, messages: list, **params) -> str:
+    async def call():
+        return await _get_client().chat.completions.create(model=model, messages=messages, **params)
+
+    completion = await _with_retries(model, call)
+    return completion.choices[0].message.content
+
+
+async def acomplete(model: str, messages: list, **params) -> str:
+    """One chat completion without blocking the caller's event loop; returns the message text."""
+    future = asyncio.run_coroutine_threadsafe(_complete(model, messages, **params), _llm_loop())
+    return await asyncio.wrap_future(future)
+
+
+async def astream(model: str, messages: list, **params):
+    """
+    Streams a chat completion: yields text deltas as the model produces
+    them. The request runs on the LLM loop; deltas are handed over to the
+    caller's loop. Only opening the stream is retried (never mid-answer).
+    Closing the generator early cancels the request.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def push(kind, value=None):
+        loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+
+    async def produce():
+        started = False
+
+        async def call():
+            nonlocal started
+            stream = await _get_client().chat.completions.create(model=model, messages=messages, stream=True, **params)
+            try:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        started = True
+                        push("token", delta)
+            except _RETRYABLE as e:
+                if started:
+                    # the caller already has part of the answer; don't start over
+                    raise LLMStreamInterrupted(str(e)) from e
+                raise
+
+        try:
+            await _with_retries(model, call)
+            push("done")
+        except Exception as e:
+            push("error", e)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), _llm_loop())
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        future.cancel()
@@ -0,0 +1,134 @@
+# medgenie_backend/api/llm_stub.py
+import asyncio
+import json
+import threading
+import time
+
+
+class StubLLMServer:
+    """
+    Minimal OpenAI/Groq-compatible chat completions server for load tests:
+    every POST .../chat/completions answers after `delay` seconds with a
+    fixed reply, or with "stream": true sends the reply word by word as SSE
+    chunks spread over `delay`. Runs its own event loop in a daemon thread;
+    keep-alive is supported so clients can pool connections. Setting
+    `failures` makes that many of the next completions answer 503, and
+    `peak` records the most completions served at once.
+    """
+
+    def __init__(self, delay: float = 0.2, reply: str = "stub reply", host: str = "127.0.0.1", port: int = 0):
+        self.delay = delay
+        self.reply = reply
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.failures = 0
+        self.active = self.peak = 0
+        self._loop = None
+        self._server = None
+        self._conns = {}  # handler task -> writer, for open connections
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "StubLLMServer":
+        threading.Thread(target=self._run, name="llm-stub", daemon=True).start()
+        self._ready.wait(10)
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _shutdown(self):
+        self._server.close()
+        for writer in list(self._conns.values()):
+            writer.close()  # idle keep-alive readers see EOF and return
+        await asyncio.gather(*self._conns, return_exceptions=True)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _handle(self, reader, writer):
+        self._conns[asyncio.current_task()] = writer
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path = lines[0].split(" ")[:2]
+                headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+                body = json.loads(await reader.readexactly(int(headers.get("content-length") or 0)) or b"{}")
+                if method == "POST" and body.get("stream") and self._is_completions(path) and not self.failures:
+                    await self._stream(writer, body.get("model") or "stub")
+                    continue
+                status, payload = await self._respond(method, path, body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._conns.pop(asyncio.current_task(), None)
+            writer.close()
+
+    @staticmethod
+    def _is_completions(path):
+        return path.rstrip("/").endswith("/chat/completions")
+
+    async def _respond(self, method, path, body):
+        if method != "POST" or not self._is_completions(path):
+            return "404 Not Found", {"error": {"message": "not found"}}
+        self.requests += 1
+        if self.failures > 0:
+            self.failures -= 1
+            return "503 Service Unavailable", {"error": {"message": "overloaded"}}
+        model = body.get("model") or "stub"
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return "200 OK", {
+            "id": f"stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": self.reply}}],
+        }
+
+    async def _stream(self, writer, model):
+        self.requests += 1
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n"
+        )
+        words = self.reply.split(" ")
+        base = {"id": f"stub-{self.requests}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.delay / len(words))
+            delta = {"content": word if i == 0 else " " + word}
+            _write_chunk(writer, {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            await writer.drain()
+        _write_chunk(writer, {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        _write_chunk(writer, "[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def _write_chunk(writer, event):
+    data = b"data: " + (event if isinstance(event, str) else json.dumps(event)).encode("utf-8") + b"\n\n"
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
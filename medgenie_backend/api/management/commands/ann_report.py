@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from medgenie_backend.ann_index import IVFVectorIndex, recall_report
+from medgenie_backend.cyborg_client import LocalVectorIndex
+from api.utils import EMBED_DIM, generate_embedding
+
+
+class Command(BaseCommand):
+    help = "Recall@k vs latency of the IVF index against the exact index on synthetic clustered vectors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument("--nlist", type=int, default=0, help="0 = sqrt(rows)")
+        parser.add_argument("--nprobe", default="1,2,4,8,16,32")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        rng = np.random.default_rng(opts["seed"])
+        rows, dim = opts["rows"], EMBED_DIM
+
+        # Clustered data so that IVF has structure to exploit.
+        centers = rng.standard_normal((max(8, rows // 500), dim)).astype(np.float32)
+        data = centers[rng.integers(0, centers.shape[0], rows)]
+        data += 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+        picks = rng.integers(0, rows, opts["queries"])
+        queries = data[picks] + 0.3 * rng.standard_normal((opts["queries"], dim)).astype(np.float32)
+
+        items = [{"id": str(i), "vector": v, "contents": "", "metadata": {}} for i, v in enumerate(data)]
+        exact = LocalVectorIndex(embedding_fn=generate_embedding)
+        exact.upsert(items)
+
+        t0 = time.perf_counter()
+        ann = IVFVectorIndex(embedding_fn=generate_embedding, nlist=opts["nlist"] or None, min_train=1)
+        ann.upsert(items)
+        build_s = time.perf_counter() - t0
+
+        nprobes = [int(x) for x in opts["nprobe"].split(",") if x.strip()]
+        report = recall_report(exact, ann, list(queries), top_k=opts["top_k"], nprobes=nprobes)
+
+        self.stdout.write(f"rows={rows} dim={dim} nlist={len(ann._lists)} build={build_s:.2f}s top_k={opts['top_k']}")
+        self.stdout.write(f"{'nprobe':>7} {'recall':>7} {'ann_ms':>8} {'exact_ms':>9} {'speedup':>8}")
+        for r in report:
+            self.stdout.write(
+                f"{r['nprobe']:>7} {r['recall']:>7.3f} {r['ann_ms']:>8.2f} {r['exact_ms']:>9.2f} {r['speedup']:>7.1f}x"
+            )
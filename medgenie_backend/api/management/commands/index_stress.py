@@ -0,0 +1,87 @@
+import threading
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from medgenie_backend.cyborg_client import LocalVectorIndex
+from api.utils import EMBED_DIM, generate_embedding
+
+
+class Command(BaseCommand):
+    help = (
+        "Query throughput of the vector index under concurrent upserts. "
+        "Compares snapshot reads with reads serialised on the writer lock (the old behaviour)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--write-batch", type=int, default=256)
+        parser.add_argument("--top-k", type=int, default=10)
+
+    def handle(self, *args, **opts):
+        self.stdout.write(
+            f"rows={opts['rows']} readers={opts['readers']} seconds={opts['seconds']} write_batch={opts['write_batch']}"
+        )
+        self.stdout.write(f"{'mode':>10} {'writer':>7} {'qps':>9} {'p50_ms':>8} {'p99_ms':>8} {'writes/s':>9}")
+        for locked in (False, True):
+            for writer in (False, True):
+                r = self._run(opts, locked=locked, writer=writer)
+                self.stdout.write(
+                    f"{'locked' if locked else 'snapshot':>10} {'yes' if writer else 'no':>7} "
+                    f"{r['qps']:>9.1f} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['wps']:>9.0f}"
+                )
+
+    def _run(self, opts, locked: bool, writer: bool):
+        rng = np.random.default_rng(0)
+        index = LocalVectorIndex(embedding_fn=generate_embedding)
+        base = rng.standard_normal((opts["rows"], EMBED_DIM)).astype(np.float32)
+        index.upsert([{"id": str(i), "vector": v, "contents": "", "metadata": {}} for i, v in enumerate(base)])
+        queries = rng.standard_normal((256, EMBED_DIM)).astype(np.float32)
+
+        stop = threading.Event()
+        latencies = [[] for _ in range(opts["readers"])]
+        written = [0]
+
+        def read(slot):
+            i = slot
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                if locked:
+                    with index._lock:
+                        index.search_vectors([queries[i % 256]], top_k=opts["top_k"], include=["distance"])
+                else:
+                    index.search_vectors([queries[i % 256]], top_k=opts["top_k"], include=["distance"])
+                latencies[slot].append((time.perf_counter() - t0) * 1000.0)
+                i += opts["readers"]
+
+        def write():
+            wrng = np.random.default_rng(1)
+            n = 0
+            while not stop.is_set():
+                vecs = wrng.standard_normal((opts["write_batch"], EMBED_DIM)).astype(np.float32)
+                # half new ids, half overwrites of existing ones
+                ids = [f"w{n + j}" if j % 2 else str(int(wrng.integers(0, opts["rows"]))) for j in range(len(vecs))]
+                index.upsert([{"id": id_, "vector": v, "contents": "", "metadata": {}} for id_, v in zip(ids, vecs)])
+                n += len(vecs)
+                written[0] = n
+
+        threads = [threading.Thread(target=read, args=(s,)) for s in range(opts["readers"])]
+        if writer:
+            threads.append(threading.Thread(target=write))
+        for t in threads:
+            t.start()
+        time.sleep(opts["seconds"])
+        stop.set()
+        for t in threads:
+            t.join()
+
+        lat = np.array([x for per in latencies for x in per]) if any(latencies) else np.zeros(1)
+        return {
+            "qps": lat.size / opts["seconds"],
+            "p50": float(np.percentile(lat, 50)),
+            "p99": float(np.percentile(lat, 99)),
+            "wps": written[0] / opts["seconds"],
+        }
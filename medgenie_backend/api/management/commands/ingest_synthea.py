@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.synthea import INGEST_BATCH_SIZE, SYNTHEA_10_PATIENTS_ZIP, ingest
+
+
+class Command(BaseCommand):
+    help = "Streams a Synthea bulk-FHIR export ZIP (local path or URL) into the medical index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", nargs="?", default=SYNTHEA_10_PATIENTS_ZIP)
+        parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+        parser.add_argument("--max-patients", type=int, default=0, help="0 = all")
+
+    def handle(self, *args, **opts):
+        def progress(stats):
+            self.stdout.write(f"  {stats['chunks']} chunks in {stats['batches']} batches")
+
+        stats = ingest(
+            opts["source"],
+            batch_size=opts["batch_size"],
+            max_patients=opts["max_patients"] or None,
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['patients']} patients, {stats['chunks']} chunks "
+            f"({stats['new']} new, {stats['updated']} updated, {stats['unchanged']} unchanged, {stats['deleted']} deleted)"
+        ))
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from api import llm
+from api.llm_stub import StubLLMServer
+
+PATH = "/api/ai/chat/"
+
+
+class Command(BaseCommand):
+    help = (
+        "Throughput of the LLM-backed views against a local stub LLM server: "
+        "N sync workers (one request at a time each, like gunicorn sync workers) "
+        "vs one event loop with many requests in flight (ASGI)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--delay", type=float, default=0.2, help="stub completion latency, seconds")
+        parser.add_argument("--sync-workers", type=int, default=4)
+        parser.add_argument("--concurrency", type=int, default=100, help="in-flight requests on the async loop")
+
+    def handle(self, *args, **opts):
+        stub = StubLLMServer(delay=opts["delay"]).start()
+        llm.LLM_BASE_URL = stub.base_url
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]  # the in-process test clients
+        self.stdout.write(f"stub at {stub.base_url}, delay={opts['delay']}s, requests={opts['requests']}")
+        self.stdout.write(f"{'mode':>28} {'req/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'errors':>7}")
+        try:
+            self._report(f"sync x{opts['sync_workers']} workers", self._sync(opts))
+            self._report(f"async, {opts['concurrency']} in flight", asyncio.run(self._async(opts)))
+        finally:
+            stub.stop()
+
+    def _report(self, mode, result):
+        elapsed, latencies, errors = result
+        lat = np.array(latencies) * 1000.0
+        self.stdout.write(
+            f"{mode:>28} {len(latencies) / elapsed:>8.1f} {np.percentile(lat, 50):>8.1f} "
+            f"{np.percentile(lat, 95):>8.1f} {errors:>7}"
+        )
+
+    def _sync(self, opts):
+        client = Client()
+
+        def one(i):
+            t0 = time.perf_counter()
+            res = client.post(PATH, {"message": f"question {i}"}, content_type="application/json")
+            return time.perf_counter() - t0, res.status_code != 200
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["sync_workers"]) as pool:
+            out = list(pool.map(one, range(opts["requests"])))
+        return time.perf_counter() - t0, [d for d, _ in out], sum(e for _, e in out)
+
+    async def _async(self, opts):
+        client = AsyncClient()
+        gate = asyncio.Semaphore(opts["concurrency"])
+
+        async def one(i):
+            async with gate:
+                t0 = time.perf_counter()
+                res = await client.post(PATH, {"message": f"question {i}"}, content_type="application/json")
+                return time.perf_counter() - t0, res.status_code != 200
+
+        t0 = time.perf_counter()
+        out = await asyncio.gather(*[one(i) for i in range(opts["requests"])])
+        return time.perf_counter() - t0, [d for d, _ in out], sum(e for _, e in out)
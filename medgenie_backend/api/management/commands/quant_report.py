@@ -0,0 +1,59 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from medgenie_backend.cyborg_client import LocalVectorIndex
+from medgenie_backend.quant_index import QuantizedVectorIndex, quant_report
+from medgenie_backend.vector_store import SegmentStore
+from api.utils import EMBED_DIM, generate_embedding
+
+
+class Command(BaseCommand):
+    help = "Resident bytes per vector and recall@k of the int8 / PQ indexes against the exact index on synthetic clustered vectors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument("--pq-m", default="24,48,96", help="PQ subspaces (= bytes per vector) to try")
+        parser.add_argument("--rerank", default="1,8,32", help="shortlist factors; 1 = no re-ranking")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        rng = np.random.default_rng(opts["seed"])
+        rows, dim = opts["rows"], EMBED_DIM
+
+        centers = rng.standard_normal((max(8, rows // 500), dim)).astype(np.float32)
+        data = centers[rng.integers(0, centers.shape[0], rows)]
+        data += 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+        picks = rng.integers(0, rows, opts["queries"])
+        queries = data[picks] + 0.3 * rng.standard_normal((opts["queries"], dim)).astype(np.float32)
+
+        items = [{"id": str(i), "vector": v, "contents": "", "metadata": {}} for i, v in enumerate(data)]
+        exact = LocalVectorIndex(embedding_fn=generate_embedding)
+        exact.upsert(items)
+
+        configs = [("sq8", None)] + [("pq", int(m)) for m in opts["pq_m"].split(",") if m.strip()]
+        reranks = [int(x) for x in opts["rerank"].split(",") if x.strip()]
+
+        self.stdout.write(f"rows={rows} dim={dim} top_k={opts['top_k']} float32={dim * 4} B/vector")
+        self.stdout.write(
+            f"{'index':>8} {'B/vec':>6} {'ratio':>6} {'build_s':>8} {'rerank':>7} {'recall':>7} {'ms':>7} {'exact_ms':>9}"
+        )
+        for kind, m in configs:
+            with tempfile.TemporaryDirectory() as path:
+                t0 = time.perf_counter()
+                index = QuantizedVectorIndex(
+                    embedding_fn=generate_embedding, kind=kind, pq_m=m or 48, min_train=1, store=SegmentStore(path, fsync=False)
+                )
+                index.upsert(items)
+                build_s = time.perf_counter() - t0
+                label = kind if m is None else f"pq{index.memory_stats()['code_bytes_per_vector']}"
+                for r in quant_report(exact, index, list(queries), top_k=opts["top_k"], reranks=reranks):
+                    self.stdout.write(
+                        f"{label:>8} {r['bytes_per_vector']:>6.0f} {r['float_bytes_per_vector'] / r['bytes_per_vector']:>5.0f}x "
+                        f"{build_s:>8.2f} {r['rerank']:>7} {r['recall']:>7.3f} {r['quant_ms']:>7.2f} {r['exact_ms']:>9.2f}"
+                    )
+                index._store.close()
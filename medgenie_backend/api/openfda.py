@@ -0,0 +1,182 @@
+# medgenie_backend/api/openfda.py
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENFDA_LABEL_URL = "https://api.fda.gov/drug/label.json"
+OPENFDA_CONCURRENCY = int(os.getenv("OPENFDA_CONCURRENCY", "4"))
+OPENFDA_TIMEOUT = float(os.getenv("OPENFDA_TIMEOUT", "15"))
+OPENFDA_CACHE_TTL = float(os.getenv("OPENFDA_CACHE_TTL", "86400"))  # seconds before revalidating
+OPENFDA_CACHE_DIR = os.getenv("OPENFDA_CACHE_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "medgenie_openfda")
+# Read-only directory of cache files (same format); when set, nothing goes to the network
+OPENFDA_FIXTURE_DIR = os.getenv("OPENFDA_FIXTURE_DIR", "").strip() or None
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(search: str, limit: int) -> str:
+    return hashlib.sha1(f"{search}\0{int(limit)}".encode("utf-8")).hexdigest()
+
+
+class LabelFetcher:
+    """
+    openFDA drug label lookups through one pooled session, run concurrently
+    for a list of queries. Each query's `results` (the label documents) is
+    cached on disk as <cache_dir>/<key>.json along with the response ETag /
+    Last-Modified; past the TTL an entry is revalidated with a conditional
+    GET, and served stale if the network is down. With a fixture dir, only
+    those files are read.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = OPENFDA_CACHE_DIR,
+        ttl: float = OPENFDA_CACHE_TTL,
+        concurrency: int = OPENFDA_CONCURRENCY,
+        timeout: float = OPENFDA_TIMEOUT,
+        fixture_dir: Optional[str] = OPENFDA_FIXTURE_DIR,
+        url: str = OPENFDA_LABEL_URL,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.fixture_dir = fixture_dir
+        self.url = url
+        self._session = None
+        self._lock = threading.Lock()
+        self.hits = self.revalidated = self.fetched = self.stale = self.errors = 0
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                self._session = s
+            return self._session
+
+    def fetch(self, search: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Label documents for one openFDA search ([] when nothing matches)."""
+        key = cache_key(search, limit)
+        if self.fixture_dir:
+            entry = _read(os.path.join(self.fixture_dir, f"{key}.json"))
+            if entry is None:
+                raise LookupError(f"no openFDA fixture for {search!r} (limit={limit})")
+            self._count("hits")
+            return entry["results"]
+
+        path = os.path.join(self.cache_dir, f"{key}.json") if self.cache_dir else None
+        entry = _read(path) if path else None
+        if entry is not None and time.time() - entry.get("fetched_at", 0) <= self.ttl:
+            self._count("hits")
+            return entry["results"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            r = self.session.get(
+                self.url, params={"search": search, "limit": str(limit)}, headers=headers, timeout=self.timeout
+            )
+            if r.status_code == 304 and entry is not None:
+                self._count("revalidated")
+                entry["fetched_at"] = time.time()
+                self._write(path, entry)
+                return entry["results"]
+            if r.status_code == 404:
+                # openFDA answers "no matches" with 404
+                results = []
+            else:
+                r.raise_for_status()
+                results = r.json().get("results") or []
+        except (requests.RequestException, ValueError):
+            if entry is None:
+                self._count("errors")
+                raise
+            logger.warning("openFDA unreachable, serving cached labels for %r", search)
+            self._count("stale")
+            return entry["results"]
+
+        self._count("fetched")
+        entry = {
+            "search": search,
+            "limit": int(limit),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "results": results,
+        }
+        if path:
+            self._write(path, entry)
+        return results
+
+    def fetch_many(self, searches: List[str], limit: int = 1) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        fetch() for every search on a bounded pool; a failed search yields
+        None. Repeated searches are fetched once (concurrent duplicates would
+        all miss the cache and all hit the network) and fanned back out.
+        """
+
+        def one(search):
+            try:
+                return self.fetch(search, limit)
+            except Exception as e:
+                logger.warning("openFDA lookup %r failed: %s", search, e)
+                return None
+
+        unique = list(dict.fromkeys(searches))
+        if len(unique) <= 1:
+            results = [one(s) for s in unique]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(unique))) as pool:
+                results = list(pool.map(one, unique))
+        by_search = dict(zip(unique, results))
+        return [by_search[s] for s in searches]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "fetched": self.fetched,
+            "stale": self.stale,
+            "errors": self.errors,
+            "offline": bool(self.fixture_dir),
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _write(self, path: str, entry: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry if isinstance(entry.get("results"), list) else None
+
+
+OPENFDA = LabelFetcher()
@@ -0,0 +1,267 @@
+# medgenie_backend/api/synthea.py
+import json
+import os
+import tempfile
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+from medgenie_backend.cyborg_client import get_medical_index
+from .chunking import plan_chunks, split_known
+from .utils import generate_embedding, generate_embeddings
+
+SYNTHEA_10_PATIENTS_ZIP = (
+    "https://github.com/smart-on-fhir/sample-bulk-fhir-datasets/archive/refs/heads/10-patients.zip"
+)
+
+# NOTE: dataset is Synthea-generated synthetic records (public bulk samples).
+# Repo treats datasets as CC0/public domain.
+# (Good for demos, no real PHI.)
+
+INGEST_BATCH_SIZE = int(os.getenv("SYNTHEA_INGEST_BATCH_SIZE", "256"))  # chunks per embed + upsert
+# where the seed view may read local exports from (by file name only); unset = none
+SYNTHEA_DATA_DIR = os.getenv("SYNTHEA_DATA_DIR", "").strip() or None
+
+# Per-patient caps: what a patient's records can quote, so memory stays
+# O(patients) however many resources the export holds.
+MAX_CONDITIONS = 5
+MAX_OBSERVATIONS = 8
+MAX_MEDICATIONS = 5
+
+
+# ---------------------------
+# Streaming readers
+# ---------------------------
+def iter_ndjson(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """One JSON object per line; blank or malformed lines are skipped."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def iter_resources(zipf: zipfile.ZipFile, resource_type: str, stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams every resource of one type, member by member (exports name them
+    Patient.ndjson or Patient.000.ndjson, ...), decompressing as it goes.
+    Adds the uncompressed size of each finished member to stats["bytes"].
+    """
+    prefix = resource_type.lower() + "."
+    for info in zipf.infolist():
+        base = info.filename.rsplit("/", 1)[-1].lower()
+        if base.startswith(prefix) and base.endswith(".ndjson"):
+            with zipf.open(info) as f:
+                yield from iter_ndjson(f)
+            if stats is not None:
+                stats["bytes"] = stats.get("bytes", 0) + info.file_size
+
+
+def _subject_id(resource: Dict[str, Any]) -> Optional[str]:
+    # "Patient/<id>" or "urn:uuid:<id>"
+    ref = ((resource.get("subject") or resource.get("patient") or {}).get("reference")) or ""
+    return ref.replace(":", "/").rsplit("/", 1)[-1] or None
+
+
+# ---------------------------
+# Per-patient records
+# ---------------------------
+def _new_patient(p: Dict[str, Any]) -> Dict[str, Any]:
+    name = " ".join(
+        [
+            ((p.get("name") or [{}])[0].get("given") or [""])[0],
+            (p.get("name") or [{}])[0].get("family", ""),
+        ]
+    ).strip() or "Demo Patient"
+    return {
+        "id": p.get("id"),
+        "name": name,
+        "gender": p.get("gender", "unknown"),
+        "birth": p.get("birthDate", "unknown"),
+        # insertion-ordered, deduplicated, capped
+        "conditions": {},
+        "observations": {},
+        "medications": {},
+    }
+
+
+def _collect(patients: Dict[str, Dict[str, Any]], zipf: zipfile.ZipFile, stats: Dict[str, int]):
+    for c in iter_resources(zipf, "Condition", stats):
+        p = patients.get(_subject_id(c))
+        code = ((c.get("code") or {}).get("text")) or ""
+        if p and code and len(p["conditions"]) < MAX_CONDITIONS:
+            p["conditions"][code] = True
+
+    for o in iter_resources(zipf, "Observation", stats):
+        p = patients.get(_subject_id(o))
+        code = ((o.get("code") or {}).get("text")) or ""
+        val = o.get("valueQuantity") or {}
+        if not p or not code or val.get("value") is None:
+            continue
+        # keep the last value seen per measurement
+        if code in p["observations"] or len(p["observations"]) < MAX_OBSERVATIONS:
+            p["observations"][code] = f"{code}: {val.get('value')} {val.get('unit', '')}".strip()
+
+    for m in iter_resources(zipf, "MedicationRequest", stats):
+        p = patients.get(_subject_id(m))
+        mc = (m.get("medicationCodeableConcept") or {}).get("text") or ""
+        if p and mc and len(p["medications"]) < MAX_MEDICATIONS:
+            p["medications"][mc] = True
+
+
+def patient_records(p: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Short, medtech-style docs for one patient: {title, text, metadata}."""
+    pid = p["id"]
+    cond_texts = list(p["conditions"])
+    obs_texts = list(p["observations"].values())
+    med_texts = list(p["medications"])
+
+    def meta(kind):
+        return {"patient_id": pid, "type": kind, "source": "SYNTHETHEA"}
+
+    records = [{
+        "title": "Patient Summary",
+        "text": f"Patient {p['name']} ({pid}), gender {p['gender']}, DOB {p['birth']}. Known problems: {', '.join(cond_texts) or '—'}.",
+        "metadata": meta("summary"),
+    }]
+    if cond_texts:
+        records.append({
+            "title": "Problem List Snapshot",
+            "text": "Active/Recent conditions: " + "; ".join(cond_texts) + ".",
+            "metadata": meta("conditions"),
+        })
+    if obs_texts:
+        records.append({
+            "title": "Vitals / Observations",
+            "text": "Observed measurements: " + "; ".join(obs_texts) + ".",
+            "metadata": meta("observations"),
+        })
+    if med_texts:
+        records.append({
+            "title": "Medication Requests",
+            "text": "Medications requested: " + "; ".join(med_texts) + ".",
+            "metadata": meta("medications"),
+        })
+
+    # Always include a “clinical note” style doc for nicer RAG
+    records.append({
+        "title": "Clinical Note (Synthetic)",
+        "text": (
+            "Assessment: patient has history suggestive of chronic disease burden. "
+            "Review active conditions, vitals trends, and medication adherence. "
+            "Plan: targeted labs, lifestyle counselling, follow-up in 2–4 weeks, "
+            "and red-flag education. (Synthetic demo note.)"
+        ),
+        "metadata": meta("note"),
+    })
+    return records
+
+
+def iter_documents(patients: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """(doc_id, index items without vectors) for every patient's records."""
+    for p in patients:
+        for rdoc in patient_records(p):
+            # stable, content-hashed ids: re-ingesting the same export replaces, not duplicates
+            doc_id = f"synthea:{p['id']}:{rdoc['metadata']['type']}"
+            yield doc_id, plan_chunks(doc_id, rdoc["text"], {**rdoc["metadata"], "title": rdoc["title"]})
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+def _download(url: str, dest) -> None:
+    with requests.get(url, timeout=60, stream=True) as r:
+        r.raise_for_status()
+        for block in r.iter_content(chunk_size=1 << 20):
+            dest.write(block)
+    dest.flush()
+
+
+def ingest_zip(
+    zip_file,
+    index=None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    max_patients: Optional[int] = None,
+    progress=None,
+) -> Dict[str, Any]:
+    """
+    Indexes every patient in a Synthea bulk-FHIR export ZIP (a path or a
+    binary file object). Members are decompressed and parsed line by line;
+    only capped per-patient summaries are held, and chunks are embedded and
+    upserted `batch_size` at a time. `progress(stats)` runs after each batch.
+
+    Chunks already indexed with the same text are not embedded again, and
+    chunks a record no longer produces are deleted, so re-ingesting an
+    export only pays for what changed (stats "new", "updated", "unchanged",
+    "deleted").
+    """
+    if index is None:
+        index = get_medical_index(embedding_fn=generate_embedding, batch_embedding_fn=generate_embeddings)
+    batch_size = max(1, int(batch_size))
+    stats = {"patients": 0, "chunks": 0, "new": 0, "updated": 0, "unchanged": 0, "deleted": 0, "batches": 0, "bytes": 0}
+
+    with zipfile.ZipFile(zip_file) as zipf:
+        patients: Dict[str, Dict[str, Any]] = {}
+        for p in iter_resources(zipf, "Patient", stats):
+            if p.get("id") and p["id"] not in patients:
+                patients[p["id"]] = _new_patient(p)
+                if max_patients and len(patients) >= max_patients:
+                    break
+        _collect(patients, zipf, stats)
+
+    stats["patients"] = len(patients)
+
+    def flush(batch):
+        new, updated, unchanged = split_known(index, batch)
+        if new:
+            for it, vec in zip(new, generate_embeddings([it["contents"] for it in new])):
+                it["vector"] = vec
+        if new or updated:
+            index.upsert(new + updated)
+        stats["chunks"] += len(batch)
+        stats["new"] += len(new)
+        stats["updated"] += len(updated)
+        stats["unchanged"] += unchanged
+        stats["batches"] += 1
+        if progress:
+            progress(dict(stats))
+
+    batch, stale = [], []
+    for doc_id, items in iter_documents(patients.values()):
+        keep = {it["id"] for it in items}
+        stale.extend(id_ for id_ in index.ids({"doc_id": doc_id}) if id_ not in keep)
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+    if stale:
+        stats["deleted"] = index.delete(stale)
+    return stats
+
+
+def local_export(name: str) -> Optional[str]:
+    """
+    Path of export `name` under SYNTHEA_DATA_DIR, or None. Only a bare
+    ".zip" file name is accepted, never a path or URL, so API callers
+    can't make the server read arbitrary files or fetch arbitrary hosts.
+    """
+    if not SYNTHEA_DATA_DIR or not name or os.path.basename(name) != name or not name.endswith(".zip"):
+        return None
+    path = os.path.join(SYNTHEA_DATA_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def ingest(source: str = SYNTHEA_10_PATIENTS_ZIP, **kwargs) -> Dict[str, Any]:
+    """`source` is a local ZIP path (offline) or an http(s) URL, downloaded to a temp file first."""
+    if not source.startswith(("http://", "https://")):
+        return ingest_zip(source, **kwargs)
+    with tempfile.TemporaryFile() as tmp:
+        _download(source, tmp)
+        tmp.seek(0)
+        return ingest_zip(tmp, **kwargs)
@@ -1,5 +1,1036 @@
-from django.test import TestCase
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+from medgenie_backend.ann_index import IVFVectorIndex, recall_report
+from medgenie_backend.cyborg_client import LocalVectorIndex
+from .utils import EMBED_DIM, _hash_embed, generate_embedding, generate_embeddings
+
 
 class BasicTest(TestCase):
     def test_ok(self):
         self.assertEqual(1, 1)
+
+
+def _item(id_, text, **metadata):
+    return {"id": id_, "vector": generate_embedding(text), "contents": text, "metadata": metadata}
+
+
+class HashEmbedTest(SimpleTestCase):
+    def test_compat_mode_matches_md5_scheme(self):
+        import hashlib
+        import math
+
+        text = "ECG shows ST elevation in leads II, III, aVF; patient's HbA1c 8.2%"
+        vec = [0.0] * EMBED_DIM
+        for t in "ecg shows st elevation in leads ii iii avf patient's hba1c 8 2".split():
+            h = int(hashlib.md5(t.encode("utf-8")).hexdigest(), 16)
+            vec[h % EMBED_DIM] += 1.0 if ((h >> 8) & 1) == 0 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        self.assertEqual(_hash_embed(text, compat=True), [v / norm for v in vec])
+
+    def test_batch_matches_single(self):
+        texts = ["metformin 500mg BID", "", "penicillin allergy", "!!!"]
+        mat = generate_embeddings(texts)
+        self.assertEqual(mat.shape, (4, EMBED_DIM))
+        self.assertEqual(str(mat.dtype), "float32")
+        for row, text in zip(mat, texts):
+            np.testing.assert_allclose(row, generate_embedding(text), atol=1e-6)
+        fast = _hash_embed("metformin 500mg BID", compat=False)
+        self.assertAlmostEqual(float(np.linalg.norm(fast)), 1.0, places=6)
+
+
+class RemoteEmbeddingBatchTest(SimpleTestCase):
+    def test_batches_requests_and_counts_fallbacks(self):
+        from types import SimpleNamespace
+        from unittest import mock
+
+        from . import utils
+
+        calls = []
+
+        def create(model, input):
+            calls.append(list(input))
+            if "boom" in input:
+                raise RuntimeError("model unavailable")
+            data = [SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)]
+            return SimpleNamespace(data=data[::-1])  # order must come from .index
+
+        fake = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+        texts = [f"chunk {i}" for i in range(5)] + ["boom"]
+        with mock.patch.multiple(utils, _GROQ=fake, GROQ_EMBED_MODEL="fake-embed", EMBED_BATCH_SIZE=3,
+                                 EMBED_RETRIES=1, EMBED_BACKOFF=0.0, EMBED_STATS=utils.EmbeddingStats()):
+            out = utils.generate_embeddings(texts)
+            stats = utils.EMBED_STATS.as_dict()
+            again = utils.generate_embeddings(texts[:3])  # cached: no new request
+
+        self.assertEqual(len(calls), 3)  # [0..2], [3, 4, boom] + one retry
+        self.assertEqual(out[0].tolist()[:2], [7.0, 1.0])
+        np.testing.assert_allclose(out[5], _hash_embed("boom"), atol=1e-6)
+        self.assertEqual((stats["remote_requests"], stats["retries"]), (1, 1))
+        self.assertEqual((stats["fallback_requests"], stats["fallback_texts"]), (1, 3))
+        np.testing.assert_array_equal(again, out[:3, : again.shape[1]])
+
+
+class EmbeddingCacheTest(SimpleTestCase):
+    def test_lru_eviction_and_counters(self):
+        from .embed_cache import EmbeddingCache
+
+        cache = EmbeddingCache(max_entries=2, ttl=0)
+        cache.put("m", "a", [1.0])
+        cache.put("m", "b", [2.0])
+        self.assertEqual(cache.get("m", "  a "), [1.0])  # normalized text, refreshes "a"
+        cache.put("m", "c", [3.0])  # evicts "b"
+        self.assertIsNone(cache.get("m", "b"))
+        self.assertIsNone(cache.get("other-model", "a"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 2, 1))
+
+    def test_ttl_and_disk_store(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        from . import embed_cache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "emb.sqlite3")
+            cache = embed_cache.EmbeddingCache(max_entries=1, ttl=60, path=path)
+            cache.put("m", "a", [0.1, 0.2])
+            cache.put("m", "b", [0.3])  # "a" evicted from memory, still on disk
+            self.assertEqual(cache.get("m", "a"), [0.1, 0.2])
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+
+            reopened = embed_cache.EmbeddingCache(max_entries=10, ttl=60, path=path)
+            self.assertEqual(reopened.get("m", "b"), [0.3])
+            with mock.patch.object(embed_cache.time, "time", return_value=embed_cache.time.time() + 120):
+                self.assertIsNone(reopened.get("m", "b"))
+            self.assertEqual(reopened.stats()["expired"], 1)
+
+            # a batch is one executemany + one commit, not one per vector
+            batch = embed_cache.EmbeddingCache(max_entries=10, ttl=60, path=path)
+            db = batch._db
+            batch._db = mock.Mock(wraps=db)
+            batch.put_many("m", [("c", [1.0]), ("d", [2.0])])
+            self.assertEqual((batch._db.executemany.call_count, batch._db.commit.call_count), (1, 1))
+            self.assertEqual(embed_cache.EmbeddingCache(max_entries=10, ttl=60, path=path).get("m", "d"), [2.0])
+
+
+class LocalVectorIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = LocalVectorIndex(embedding_fn=generate_embedding, initial_capacity=2)
+        self.index.upsert([
+            _item("a", "ECG shows ST elevation in leads II III aVF", patient_id="PT-001"),
+            _item("b", "HbA1c 8.2 metformin diabetes follow-up", patient_id="PT-001"),
+            _item("c", "penicillin allergy urticaria wheeze", patient_id="PT-017"),
+        ])
+
+    def test_query_ranks_closest_first(self):
+        hits = self.index.query("metformin diabetes", top_k=2)[0]
+        self.assertEqual(len(hits), 2)
+        self.assertEqual(hits[0]["id"], "b")
+        self.assertLessEqual(hits[0]["distance"], hits[1]["distance"])
+
+    def test_upsert_replaces_existing_id(self):
+        self.index.upsert([_item("c", "metformin diabetes", patient_id="PT-017")])
+        self.assertEqual(len(self.index), 3)
+        hits = self.index.query("metformin diabetes", top_k=1)[0]
+        self.assertEqual(hits[0]["id"], "c")
+        self.assertAlmostEqual(hits[0]["distance"], 0.0, places=5)
+
+    def test_filters_restrict_candidates(self):
+        hits = self.index.query("metformin diabetes", top_k=5, filters={"patient_id": "PT-017"})[0]
+        self.assertEqual([h["id"] for h in hits], ["c"])
+
+    def test_delete_tombstones_then_compacts(self):
+        self.index.compact_min = 2
+        self.assertEqual(self.index.delete(["b", "missing"]), 1)
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn("b", self.index)
+        hits = self.index.query("metformin diabetes", top_k=5)[0]
+        self.assertEqual(sorted(h["id"] for h in hits), ["a", "c"])
+        self.assertEqual(self.index.query("x", top_k=5, filters={"patient_id": "PT-001"})[0][0]["id"], "a")
+
+        self.index.delete(["a"])  # crosses compact_min -> rows renumbered
+        self.assertEqual(self.index._count, 1)
+        self.index.upsert([_item("a", "ECG ST elevation", patient_id="PT-001")])
+        self.assertEqual(self.index.query("ECG ST elevation", top_k=1)[0][0]["id"], "a")
+        self.assertEqual([h["id"] for h in self.index.query("x", filters={"patient_id": "PT-017"})[0]], ["c"])
+
+    def test_queries_run_while_writer_upserts(self):
+        import threading
+
+        errors = []
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                try:
+                    hits = self.index.query("metformin", top_k=3, filters={"patient_id": "PT-001"})[0]
+                    assert hits and all(h["metadata"]["patient_id"] == "PT-001" for h in hits)
+                except Exception as e:  # pragma: no cover - reported below
+                    errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for t in readers:
+            t.start()
+        for i in range(200):
+            self.index.upsert([_item("b", "HbA1c metformin", patient_id="PT-001"), _item(f"n{i}", "note", patient_id="PT-9")])
+        stop.set()
+        for t in readers:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.index), 203)
+
+    def test_query_batch_returns_one_hit_list_per_query(self):
+        results = self.index.query_batch(["metformin diabetes", "penicillin allergy"], top_k=1)
+        self.assertEqual([hits[0]["id"] for hits in results], ["b", "c"])
+        self.assertEqual(self.index.query(["penicillin allergy"], top_k=1), results[1:])
+
+
+class PersistentIndexTest(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def open(self, **kwargs):
+        from medgenie_backend.vector_store import SegmentStore
+
+        return LocalVectorIndex(embedding_fn=generate_embedding, initial_capacity=2, store=SegmentStore(self.tmp.name), **kwargs)
+
+    def test_reopen_maps_vectors_and_replays_log(self):
+        index = self.open()
+        index.upsert([_item("a", "ST elevation aVF", patient_id="PT-001"), _item("b", "metformin HbA1c", patient_id="PT-001")])
+        index.upsert([_item("c", "penicillin allergy", patient_id="PT-017"), _item("a", "dengue fever", patient_id="PT-044")])
+        index.delete(["b"])
+        before = index.query("dengue fever", top_k=5)[0]
+
+        reopened = self.open()
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.query("dengue fever", top_k=5)[0], before)
+        self.assertEqual([h["id"] for h in reopened.query("x", filters={"patient_id": "PT-044"})[0]], ["a"])
+
+    def test_torn_log_tail_is_dropped(self):
+        import os
+
+        index = self.open()
+        index.upsert([_item("a", "ST elevation"), _item("b", "metformin")])
+        log = os.path.join(index._store._gen_dir(), "records.jsonl")
+        with open(log, "ab") as f:
+            f.write(b'{"op":"put","id":"c","conte')
+
+        reopened = self.open()
+        self.assertEqual(sorted(h["id"] for h in reopened.query("x", top_k=5)[0]), ["a", "b"])
+        reopened.upsert([_item("c", "penicillin")])
+        self.assertEqual(len(self.open()), 3)
+
+    def test_compaction_switches_generation(self):
+        import os
+
+        index = self.open(compact_min=1)
+        index.upsert([_item(str(i), f"note {i}") for i in range(8)])
+        first = index._store._gen
+        index.delete(["1", "2", "3"])
+        self.assertNotEqual(index._store._gen, first)
+        # the replaced generation outlives one compaction, for readers still on it
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, first)))
+        index.delete(["4", "5"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, first)))
+
+        reopened = self.open()
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual(reopened._count, 3)
+        self.assertEqual(reopened.query("note 7", top_k=1)[0][0]["id"], "7")
+
+    def test_refresh_waits_for_a_writer_holding_the_store(self):
+        import threading
+
+        from medgenie_backend.vector_store import SegmentStore
+
+        reader = self.open()
+        writer = self.open()
+        writer.upsert([_item("a", "ST elevation")])
+        done = threading.Thread(target=reader.refresh)
+        with SegmentStore(self.tmp.name).locked():  # e.g. mid-compaction in another process
+            done.start()
+            done.join(0.3)
+            self.assertTrue(done.is_alive())
+        done.join(5)
+        self.assertFalse(done.is_alive())
+        self.assertIn("a", reader)
+
+    def test_indexes_sharing_a_store_see_each_others_writes(self):
+        # two "workers" on one directory, each with its own SegmentStore
+        a, b = self.open(compact_min=2), self.open(compact_min=2)
+        a.upsert([_item("x", "ST elevation", patient_id="PT-001"), _item("y", "metformin")])
+        self.assertEqual(b.query("ST elevation", top_k=1)[0][0]["id"], "x")
+
+        b.upsert([_item(f"n{i}", f"note {i}") for i in range(6)])  # grows past a's maps
+        a.delete(["y"])
+        self.assertEqual(len(b), 7)
+        self.assertEqual(b.query("note 5", top_k=1)[0][0]["id"], "n5")
+        self.assertEqual([h["id"] for h in a.query("x", filters={"patient_id": "PT-001"})[0]], ["x"])
+
+        b.delete(["n0", "n1"])  # compacts into a new generation
+        self.assertEqual(sorted(h["id"] for h in a.query("note", top_k=10)[0]), ["n2", "n3", "n4", "n5", "x"])
+        self.assertEqual(len(self.open()), 5)
+
+    def test_writer_in_another_process(self):
+        import multiprocessing
+
+        index = self.open()
+        index.upsert([_item("a", "ST elevation")])
+        proc = multiprocessing.get_context("fork").Process(
+            target=_upsert_in_child, args=(self.tmp.name, [_item("b", "penicillin allergy")])
+        )
+        proc.start()
+        proc.join(30)
+        self.assertEqual(proc.exitcode, 0)
+        self.assertEqual(index.query("penicillin allergy", top_k=1)[0][0]["id"], "b")
+
+
+def _upsert_in_child(path, items):
+    from medgenie_backend.vector_store import SegmentStore
+
+    LocalVectorIndex(embedding_fn=generate_embedding, store=SegmentStore(path)).upsert(items)
+
+
+class MetadataFilterTest(SimpleTestCase):
+    def setUp(self):
+        self.index = LocalVectorIndex(embedding_fn=generate_embedding)
+        self.index.upsert([
+            _item("a", "ST elevation", patient_id="PT-001", visit_date="2025-12-20", tags=["ECG", "MI"]),
+            _item("b", "HbA1c metformin", patient_id="PT-001", visit_date="2025-11-05", tags=["Diabetes"]),
+            _item("c", "dengue fever", patient_id="PT-044", visit_date="2025-12-12", tags=["Dengue"], source="Community"),
+            _item("d", "penicillin allergy", patient_id="PT-017", visit_date="2025-10-01", source="EMR"),
+        ])
+
+    def ids(self, filters):
+        return sorted(h["id"] for h in self.index.query("fever", top_k=10, filters=filters)[0])
+
+    def test_equality_in_and_tag_membership(self):
+        self.assertEqual(self.ids({"patient_id": "PT-001"}), ["a", "b"])
+        self.assertEqual(self.ids({"patient_id": {"$in": ["PT-044", "PT-017"]}}), ["c", "d"])
+        self.assertEqual(self.ids({"tags": "ECG"}), ["a"])
+        self.assertEqual(self.ids({"tags": ["ECG", "MI"]}), ["a"])
+
+    def test_visit_date_range_and_residual_fields(self):
+        self.assertEqual(self.ids({"visit_date": {"$gte": "2025-11-05", "$lt": "2025-12-20"}}), ["b", "c"])
+        self.assertEqual(self.ids({"patient_id": "PT-001", "chunk": 3}), [])
+
+    def test_upsert_moves_postings(self):
+        self.index.upsert([_item("d", "penicillin allergy", patient_id="PT-001")])
+        self.assertEqual(self.ids({"patient_id": "PT-001"}), ["a", "b", "d"])
+        self.assertEqual(self.ids({"patient_id": "PT-017"}), [])
+        self.assertEqual(self.ids({"visit_date": {"$lt": "2025-11-01"}}), [])
+
+    def test_unknown_operator_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.ids({"chunk": {"$regex": "x"}})
+        for field in ("tags", "chunk"):  # indexed and residual
+            with self.assertRaises(ValueError):
+                self.ids({field: {"$in": "ECG"}})
+
+    def test_range_bounds_stay_within_their_type(self):
+        self.index.upsert([_item("e", "numeric visit", visit_date=7)])
+        self.assertEqual(self.ids({"visit_date": {"$lt": "2025-11-01"}}), ["d"])
+        self.assertEqual(self.ids({"visit_date": {"$gt": 1}}), ["e"])
+        self.assertEqual(self.ids({"visit_date": {"$gt": 1, "$lt": "2026"}}), [])
+        self.assertEqual(self.ids({"visit_date": {"$gt": 1}, "source": None}), ["e"])
+
+    def test_range_entries_match_before_and_after_the_tail_merges(self):
+        from medgenie_backend import metadata_index
+
+        meta = metadata_index.MetadataIndex(fields=(), range_fields=("visit_date",))
+        total = 3 * metadata_index.RANGE_TAIL_MIN
+        days = [f"2025-{1 + row % 12:02d}-{1 + row % 28:02d}" for row in range(total)]
+        for row, day in enumerate(days):
+            meta.add_batch([(row, {"visit_date": day})])
+            if row in (10, metadata_index.RANGE_TAIL_MIN + 5, total - 1):  # tail only, just merged, both
+                got = meta.select({"visit_date": {"$gte": "2025-03-10", "$lt": "2025-06"}}, row + 1, None)
+                want = [r for r, d in enumerate(days[: row + 1]) if "2025-03-10" <= d < "2025-06"]
+                self.assertEqual(got.tolist(), want)
+        bands, tail = meta._sorted["visit_date"]
+        self.assertLessEqual(len(tail[1]), metadata_index.RANGE_TAIL_MIN)
+        self.assertGreater(bands[1][0].size, 0)
+
+
+class RecordColumnsTest(SimpleTestCase):
+    def test_round_trip_and_dictionary_encoded_filters(self):
+        from medgenie_backend.record_columns import RecordColumns
+
+        cols = RecordColumns(capacity=2)
+        for i in range(6):
+            meta = {"source": "EMR", "patient_id": f"PT-{i % 2}", "chunk": i, "tags": ["cardio"] if i < 3 else ["renal"]}
+            if i == 5:
+                meta["visit_date"] = "2025-11-02"
+            cols.append(f"doc_{i}", f"note {i} ✓", meta)
+
+        self.assertEqual(len(cols), 6)
+        self.assertEqual(cols.record(5), {
+            "id": "doc_5",
+            "contents": "note 5 ✓",
+            "metadata": {"source": "EMR", "patient_id": "PT-1", "chunk": 5, "tags": ["renal"], "visit_date": "2025-11-02"},
+        })
+        self.assertEqual(len(cols._columns["source"].values), 1)  # one copy for every row
+        cols.metadata(0)["tags"].append("mutated")
+        self.assertEqual(cols.metadata(1)["tags"], ["cardio"])
+
+        def rows(filters, n=6):
+            return np.flatnonzero(cols.select(filters, n)).tolist()
+
+        self.assertEqual(rows({"patient_id": "PT-1", "tags": "cardio"}), [1])
+        self.assertEqual(rows({"chunk": {"$gte": 2, "$lt": 4}}), [2, 3])
+        self.assertEqual(rows({"visit_date": {"$in": ["2025-11-02"]}}), [5])
+        self.assertEqual(rows({"missing": "x"}), [])
+        self.assertEqual(rows({"source": "EMR"}, n=3), [0, 1, 2])
+
+        kept = cols.take([4, 1])
+        self.assertEqual(kept.ids, ["doc_4", "doc_1"])
+        self.assertEqual(kept.record(1), cols.record(1))
+
+
+class IVFVectorIndexTest(SimpleTestCase):
+    def test_ivf_recall_against_exact(self):
+        rng = np.random.default_rng(1)
+        centers = rng.standard_normal((20, 32)).astype(np.float32)
+        data = centers[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 32)).astype(np.float32)
+        items = [{"id": str(i), "vector": v, "contents": "", "metadata": {}} for i, v in enumerate(data)]
+
+        exact = LocalVectorIndex(embedding_fn=generate_embedding)
+        exact.upsert(items)
+        ann = IVFVectorIndex(embedding_fn=generate_embedding, nlist=20, nprobe=4, min_train=1000)
+        ann.upsert(items[:500])
+        self.assertFalse(ann.is_trained)
+        ann.upsert(items[500:])
+        self.assertTrue(ann.is_trained)
+
+        report = recall_report(exact, ann, list(data[:50]), top_k=5, nprobes=[4])
+        self.assertGreater(report[0]["recall"], 0.9)
+
+        ann.compact_min = 10
+        ann.delete([str(i) for i in range(0, 2000, 2)])
+        self.assertEqual(len(ann), 1000)
+        hits = ann.search_vectors(list(data[:20]), top_k=5, include=["distance"])
+        self.assertTrue(all(int(h["id"]) % 2 == 1 for q in hits for h in q))
+
+
+class QuantizedVectorIndexTest(SimpleTestCase):
+    def test_compressed_search_reranks_to_exact_recall(self):
+        import tempfile
+
+        from medgenie_backend.quant_index import QuantizedVectorIndex, quant_report
+        from medgenie_backend.vector_store import SegmentStore
+
+        rng = np.random.default_rng(1)
+        centers = rng.standard_normal((20, 32)).astype(np.float32)
+        data = centers[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 32)).astype(np.float32)
+        items = [{"id": str(i), "vector": v, "contents": "", "metadata": {}} for i, v in enumerate(data)]
+        exact = LocalVectorIndex(embedding_fn=generate_embedding)
+        exact.upsert(items)
+
+        with self.assertRaises(ValueError):  # floats would stay in RAM next to the codes
+            QuantizedVectorIndex(embedding_fn=generate_embedding)
+
+        for kind, code_bytes, min_recall in (("sq8", 32, 0.99), ("pq", 16, 0.9)):
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            index = QuantizedVectorIndex(
+                embedding_fn=generate_embedding, kind=kind, pq_m=16, min_train=1000, store=SegmentStore(tmp.name, fsync=False)
+            )
+            index.upsert(items[:500])
+            self.assertFalse(index.is_trained)
+            index.upsert(items[500:])
+            self.assertTrue(index.is_trained)
+            memory = index.memory_stats()
+            self.assertEqual(memory["code_bytes_per_vector"], code_bytes)
+            # the float vectors are mapped from the store: only the codes are resident
+            self.assertLess(memory["resident_bytes_per_vector"], 2 * code_bytes)
+
+            no_rerank, rerank = quant_report(exact, index, list(data[:50]), top_k=5, reranks=[1, 8])
+            self.assertGreaterEqual(rerank["recall"], min_recall)
+            self.assertGreaterEqual(rerank["recall"], no_rerank["recall"])
+
+            index.compact_min = 10
+            index.delete([str(i) for i in range(0, 2000, 2)])
+            hits = index.search_vectors(list(data[:20]), top_k=5, include=["distance"])
+            self.assertTrue(all(len(q) == 5 and all(int(h["id"]) % 2 == 1 for h in q) for q in hits))
+
+
+class LexicalIndexTest(SimpleTestCase):
+    def test_maxscore_matches_exhaustive_bm25(self):
+        import math
+        from collections import Counter
+
+        from medgenie_backend.lexical_index import LexicalIndex, tokenize
+
+        rng = np.random.default_rng(3)
+        vocab = [f"w{i}" for i in range(300)]
+        weights = 1.0 / np.arange(1, 301)
+        weights /= weights.sum()
+        texts = [" ".join(rng.choice(vocab, size=int(rng.integers(5, 40)), p=weights)) for _ in range(3000)]
+        lex = LexicalIndex()
+        lex.add(list(range(1500)), texts[:1500])
+        lex.add(list(range(1500, 3000)), texts[1500:])
+
+        docs = [Counter(tokenize(t)) for t in texts]
+        avgdl = sum(sum(d.values()) for d in docs) / len(docs)
+
+        def brute(query):
+            terms = list(dict.fromkeys(tokenize(query)))
+            df = {t: sum(1 for d in docs if t in d) for t in terms}
+            out = []
+            for row, d in enumerate(docs):
+                dl = sum(d.values())
+                score = sum(
+                    math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5)) * d[t] * 2.2 / (d[t] + 1.2 * (0.25 + 0.75 * dl / avgdl))
+                    for t in terms if d[t]
+                )
+                if score:
+                    out.append((score, row))
+            return sorted(out, key=lambda x: (-x[0], x[1]))[:10]
+
+        for query in ("w0 w1 w250", "w3 w299 w7 w120", "w42"):
+            got = lex.search([query], 3000, 10)[0]
+            want = brute(query)
+            self.assertEqual([r for _, r in got], [r for _, r in want])
+            self.assertTrue(np.allclose([s for s, _ in got], [s for s, _ in want], rtol=1e-4))
+        self.assertGreater(lex.postings_skipped, 0)  # common terms' lists were not walked in full
+
+    def test_statistics_cover_live_rows_only(self):
+        texts = {f"n{i}": f"routine visit {i} blood pressure" + " stable" * (i % 5) for i in range(40)}
+        texts["lab"] = "blood sugar high on metformin"
+        churned = LocalVectorIndex(embedding_fn=generate_embedding, compact_min=10_000)
+        churned.upsert([_item(id_, "blood blood blood pressure cuff " * 20) for id_ in list(texts)[:20]])
+        churned.upsert([_item(id_, "metformin blood note") for id_ in ("gone1", "gone2", "gone3")])
+        churned.upsert([_item(id_, t) for id_, t in texts.items()])  # replaces the first 20
+        churned.delete(["gone1", "gone2", "gone3"])
+        fresh = LocalVectorIndex(embedding_fn=generate_embedding)
+        fresh.upsert([_item(id_, t) for id_, t in texts.items()])
+
+        self.assertEqual(len(churned._lexical), len(fresh._lexical))
+        for query in ("blood metformin", "stable pressure"):
+            got = {h["id"]: h["score"] for h in churned.query_batch([query], top_k=10, mode="lexical")[0]}
+            want = {h["id"]: h["score"] for h in fresh.query_batch([query], top_k=10, mode="lexical")[0]}
+            self.assertEqual(got.keys(), want.keys())
+            self.assertTrue(all(abs(got[k] - want[k]) < 1e-4 for k in want))
+
+    def test_hybrid_surfaces_exact_terms(self):
+        index = LocalVectorIndex(embedding_fn=generate_embedding, batch_embedding_fn=None)
+        index.upsert([
+            _item("ecg", "ECG: ST elevation in leads II, III and aVF", source="ECG"),
+            _item("lab", "HbA1c 8.2% on metformin", source="Lab"),
+        ] + [_item(f"n{i}", f"routine follow-up visit {i}, leads a healthy lifestyle", source="Note") for i in range(30)])
+
+        self.assertEqual(index.query_batch(["aVF"], top_k=1, mode="lexical")[0][0]["id"], "ecg")
+        hybrid = index.query_batch(["HbA1c result"], top_k=3, mode="hybrid")[0]
+        self.assertEqual(hybrid[0]["id"], "lab")
+        self.assertIn("bm25", hybrid[0])
+        self.assertEqual(index.query_batch(["leads"], top_k=5, mode="lexical", filters={"source": "ECG"})[0][0]["id"], "ecg")
+
+        index.compact_min = 1
+        index.delete(["lab"] + [f"n{i}" for i in range(20)])
+        self.assertEqual(index.query_batch(["HbA1c"], top_k=3, mode="lexical")[0], [])
+        self.assertEqual(len(index.query_batch(["leads"], top_k=20, mode="lexical")[0]), 11)
+
+        res = self.client.post("/api/cyborg/search/", {"query": "aVF", "mode": "nope"}, content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+
+
+class CyborgSearchBatchTest(SimpleTestCase):
+    def test_queries_form_returns_batched_results(self):
+        from .views_cyborg_memory import _vault_upsert
+
+        _vault_upsert("Documented allergy: Penicillin (urticaria + wheeze).", {"source": "EMR"})
+        _vault_upsert("HbA1c 8.2%. Current meds: Metformin 500mg BID.", {"source": "OPD"})
+
+        res = self.client.post(
+            "/api/cyborg/search/",
+            {"queries": ["penicillin allergy", "metformin"], "top_k": 1},
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 200)
+        results = res.json()["results"]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0]["metadata"]["source"], "EMR")
+        self.assertEqual(results[1][0]["metadata"]["source"], "OPD")
+
+    def test_vault_and_medical_index_are_one_store(self):
+        from medgenie_backend.cyborg_client import get_medical_index, query_vector, upsert_items
+        from .views_cyborg_memory import VAULT
+
+        self.assertIs(VAULT, get_medical_index())
+        upsert_items([_item("shared-1", "Dengue NS1 antigen positive, platelets 92k", source="Lab")])
+        res = self.client.post("/api/cyborg/search/", {"query": "dengue platelets", "top_k": 1}, content_type="application/json")
+        self.assertEqual(res.json()["results"][0]["id"], "shared-1")
+        self.assertEqual(query_vector(generate_embedding("dengue platelets"), top_k=1)["results"][0]["id"], "shared-1")
+
+    def test_text_modes_need_the_lexical_index(self):
+        from unittest import mock
+
+        from .views_cyborg_memory import VAULT
+
+        with mock.patch.object(VAULT, "_lexical", None):
+            for url, body in (("/api/cyborg/search/", {"query": "aVF"}), ("/api/cyborg/ask/", {"question": "aVF"})):
+                for mode in ("lexical", "hybrid"):
+                    res = self.client.post(url, {**body, "mode": mode}, content_type="application/json")
+                    self.assertEqual(res.status_code, 400, (url, mode))
+                    self.assertEqual(res.json()["error"], "mode must be one of vector")
+
+
+class SyntheaIngestTest(SimpleTestCase):
+    def test_streams_every_patient_in_batches(self):
+        import io
+        import json
+        import zipfile
+
+        from .synthea import ingest_zip
+
+        def ndjson(rows):
+            return "\n".join(json.dumps(r) for r in rows) + "\n"
+
+        patients = [{"id": f"p{i}", "name": [{"given": ["Ana"], "family": f"Doe{i}"}], "gender": "female"} for i in range(3)]
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as z:
+            z.writestr("export/Patient.000.ndjson", ndjson(patients) + "not json\n")
+            z.writestr("export/Condition.000.ndjson", ndjson([
+                {"subject": {"reference": "Patient/p1"}, "code": {"text": "Prediabetes"}},
+                {"subject": {"reference": "urn:uuid:p2"}, "code": {"text": "Asthma"}},
+                {"subject": {"reference": "Patient/unknown"}, "code": {"text": "Ignored"}},
+            ]))
+            z.writestr("export/Observation.000.ndjson", ndjson([
+                {"subject": {"reference": "Patient/p1"}, "code": {"text": "Body Weight"}, "valueQuantity": {"value": 70, "unit": "kg"}},
+                {"subject": {"reference": "Patient/p1"}, "code": {"text": "Body Weight"}, "valueQuantity": {"value": 72, "unit": "kg"}},
+            ]))
+
+        index = LocalVectorIndex(embedding_fn=generate_embedding)
+        batches = []
+        stats = ingest_zip(buf, index=index, batch_size=4, progress=batches.append)
+
+        # p0: summary + note; p1: + conditions + observations; p2: + conditions
+        self.assertEqual((stats["patients"], stats["chunks"]), (3, 9))
+        self.assertEqual([b["chunks"] for b in batches], [4, 8, 9])
+        self.assertEqual(len(index), 9)
+        hits = index.query("body weight", top_k=1, filters={"patient_id": "p1", "type": "observations"})[0]
+        self.assertEqual(hits[0]["contents"], "Observed measurements: Body Weight: 72 kg.")
+
+        again = ingest_zip(buf, index=index, batch_size=4)  # same export again: ids are stable
+        self.assertEqual(len(index), 9)
+        self.assertEqual((again["new"], again["unchanged"], again["deleted"]), (0, 9, 0))
+
+    def test_seed_view_only_loads_exports_by_name(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        from . import synthea
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(synthea, "SYNTHEA_DATA_DIR", tmp):
+            open(os.path.join(tmp, "export.zip"), "wb").close()
+            self.assertEqual(synthea.local_export("export.zip"), os.path.join(tmp, "export.zip"))
+            for name in ("missing.zip", "../export.zip", "/etc/passwd", "https://example.com/x.zip", tmp + "/export.zip"):
+                self.assertIsNone(synthea.local_export(name), name)
+        self.assertIsNone(synthea.local_export("export.zip"))  # no data dir configured
+
+    def test_seed_view_rejects_bad_max_patients(self):
+        from rest_framework.test import APIRequestFactory
+
+        from .views_cyborg_seed import cyborg_seed_open
+
+        for value in ("ten", "5.5", -1):
+            req = APIRequestFactory().post("/", {"max_patients": value}, format="json")
+            res = cyborg_seed_open(req)
+            self.assertEqual(res.status_code, 400, value)
+            self.assertEqual(res.data["error"], "max_patients must be a non-negative integer")
+
+
+class JobQueueTest(SimpleTestCase):
+    def test_bounded_queue_progress_and_cancel(self):
+        import queue
+        import threading
+
+        from .jobs import JobQueue
+
+        gate = threading.Event()
+
+        def work(job, steps):
+            for i in range(steps):
+                gate.wait(5)
+                job.check_cancelled()
+                job.update(docs=i + 1, chunks=2 * (i + 1))
+            return {"steps": steps}
+
+        jobs = JobQueue(workers=1, max_pending=1)
+        first = jobs.submit("t", work, steps=3)
+        while first.status == "queued":
+            threading.Event().wait(0.01)
+        second = jobs.submit("t", work, steps=1)  # waits behind `first`
+        with self.assertRaises(queue.Full):
+            jobs.submit("t", work, steps=1)
+
+        second.cancel()
+        gate.set()
+        self.assertTrue(first.wait(5) and second.wait(5))
+        self.assertEqual((first.status, first.result, first.progress["chunks"]), ("done", {"steps": 3}, 6))
+        self.assertEqual(second.status, "cancelled")
+        self.assertEqual(jobs.get(first.id).as_dict()["progress"]["docs"], 3)
+
+    def test_async_index_endpoint_returns_job(self):
+        from .jobs import JOBS
+
+        res = self.client.post(
+            "/api/cyborg/index/",
+            {"text": "Troponin I elevated 2.3 ng/mL", "metadata": {"source": "Lab"}, "async": True},
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 202)
+        job = JOBS.get(res.json()["job_id"])
+        self.assertTrue(job.wait(5))
+        status = self.client.get(res.json()["status_url"]).json()
+        self.assertEqual((status["status"], status["progress"]["chunks"]), ("done", 1))
+        self.assertEqual(self.client.get("/api/jobs/missing/").status_code, 404)
+
+
+class OpenFDAFetcherTest(SimpleTestCase):
+    def test_disk_cache_revalidates_with_etag_and_serves_fixtures(self):
+        import tempfile
+        from types import SimpleNamespace
+
+        import requests
+
+        from .openfda import LabelFetcher
+
+        calls = []
+        label = {"openfda": {"generic_name": ["metformin"]}, "indications_and_usage": ["T2DM"]}
+
+        def get(url, params, headers, timeout):
+            calls.append(dict(headers))
+            if len(calls) >= 3:
+                raise requests.ConnectionError("offline")
+            if headers.get("If-None-Match") == '"v1"':
+                return SimpleNamespace(status_code=304, headers={})
+            return SimpleNamespace(status_code=200, headers={"ETag": '"v1"'}, json=lambda: {"results": [label]},
+                                   raise_for_status=lambda: None)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fetcher = LabelFetcher(cache_dir=tmp, ttl=3600, fixture_dir=None)
+            fetcher._session = SimpleNamespace(get=get)
+            self.assertEqual(fetcher.fetch_many(["metformin", "metformin"]), [[label], [label]])
+            self.assertEqual(len(calls), 1)  # duplicates are fetched once
+            self.assertEqual(fetcher.fetch("metformin"), [label])
+            self.assertEqual((len(calls), fetcher.hits), (1, 1))  # then served from the disk cache
+
+            fetcher.ttl = 0  # everything is stale: revalidate
+            self.assertEqual(fetcher.fetch("metformin"), [label])
+            self.assertEqual(calls[-1], {"If-None-Match": '"v1"'})
+            self.assertEqual(fetcher.fetch("metformin"), [label])  # network down: stale copy
+            self.assertEqual(fetcher.fetch_many(["aspirin"]), [None])
+            self.assertEqual((fetcher.revalidated, fetcher.stale, fetcher.errors), (1, 1, 1))
+
+            offline = LabelFetcher(fixture_dir=tmp)  # the cache dir doubles as fixtures
+            self.assertEqual(offline.fetch("metformin"), [label])
+            with self.assertRaises(LookupError):
+                offline.fetch("insulin")
+
+
+class AsyncLLMViewTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from .llm_stub import StubLLMServer
+
+        cls.stub = StubLLMServer(delay=0.2, reply="Hydrate and monitor platelets [DOC 1].").start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        from .answer_cache import ANSWER_CACHE
+
+        ANSWER_CACHE.clear()
+
+    async def test_completions_overlap_on_one_loop(self):
+        import asyncio
+        import os
+        import time
+        from unittest import mock
+
+        from . import llm
+
+        with mock.patch.object(llm, "LLM_BASE_URL", self.stub.base_url), mock.patch.dict(os.environ, {"GROQ_API_KEY": "stub"}):
+            t0 = time.perf_counter()
+            responses = await asyncio.gather(*[
+                self.async_client.post("/api/ai/chat/", {"message": f"hi {i}"}, content_type="application/json")
+                for i in range(10)
+            ])
+            elapsed = time.perf_counter() - t0
+            ask = await self.async_client.post("/api/cyborg/ask/", {"question": "dengue fever"}, content_type="application/json")
+
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(responses[0].json()["reply"], "Hydrate and monitor platelets [DOC 1].")
+        self.assertLess(elapsed, 1.5)  # 10 x 0.2s served concurrently, not back to back
+        self.assertEqual(ask.status_code, 200)
+        self.assertIn("hits", ask.json())
+
+    async def test_validation_and_method(self):
+        res = await self.async_client.post("/api/ai/chat/", {"message": "  "}, content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+        res = await self.async_client.get("/api/ai/chat/")
+        self.assertEqual(res.status_code, 405)
+
+    async def test_streaming_sends_hits_then_tokens(self):
+        import json
+        import os
+        from unittest import mock
+
+        from . import llm
+
+        def parse(raw):
+            out = []
+            for block in raw.decode("utf-8").strip().split("\n\n"):
+                event, data = block.split("\n")
+                out.append((event[len("event: "):], json.loads(data[len("data: "):])))
+            return out
+
+        with mock.patch.object(llm, "LLM_BASE_URL", self.stub.base_url), mock.patch.dict(os.environ, {"GROQ_API_KEY": "stub"}):
+            res = await self.async_client.post("/api/cyborg/ask/", {"question": "dengue fever", "stream": True},
+                                               content_type="application/json")
+            self.assertEqual(res["Content-Type"], "text/event-stream")
+            events = parse(b"".join([chunk async for chunk in res.streaming_content]))
+            chat = await self.async_client.post("/api/ai/chat/", {"message": "hi"}, content_type="application/json",
+                                                headers={"accept": "text/event-stream"})
+            chat_events = parse(b"".join([chunk async for chunk in chat.streaming_content]))
+
+        self.assertEqual(events[0][0], "hits")
+        tokens = [d["text"] for e, d in events if e == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(events[-1], ("done", {"answer": "Hydrate and monitor platelets [DOC 1]."}))
+        self.assertEqual("".join(tokens), events[-1][1]["answer"])
+        self.assertEqual(chat_events[-1], ("done", {"reply": "Hydrate and monitor platelets [DOC 1]."}))
+
+    async def test_gateway_retries_and_limits_per_model(self):
+        import asyncio
+        import os
+        from unittest import mock
+
+        from . import llm
+
+        with mock.patch.object(llm, "LLM_BASE_URL", self.stub.base_url), mock.patch.dict(os.environ, {"GROQ_API_KEY": "stub"}), \
+                mock.patch.object(llm, "LLM_BACKOFF", 0.01), mock.patch.dict(llm.LLM_MODEL_LIMITS, {"limited-model": 2}):
+            retries = llm.LLM_STATS.retries
+            self.stub.failures = 2
+            reply = await llm.acomplete("retry-model", [{"role": "user", "content": "hi"}])
+            self.assertEqual(reply, "Hydrate and monitor platelets [DOC 1].")
+            self.assertEqual(llm.LLM_STATS.retries - retries, 2)
+
+            self.stub.peak = 0
+            await asyncio.gather(*[llm.acomplete("limited-model", [{"role": "user", "content": "hi"}]) for _ in range(6)])
+            self.assertEqual(self.stub.peak, 2)
+            self.assertEqual(llm.LLM_STATS.as_dict()["in_flight"], {})
+
+        # one pooled client per base URL, also when the SDK normalizes it
+        with mock.patch.object(llm, "LLM_BASE_URL", "https://proxy.example.com/groq"), \
+                mock.patch.dict(os.environ, {"GROQ_API_KEY": "stub"}):
+            self.assertIs(llm._get_client(), llm._get_client())
+
+    async def test_repeated_question_is_answered_from_cache(self):
+        import os
+        from unittest import mock
+
+        from . import llm
+
+        with mock.patch.object(llm, "LLM_BASE_URL", self.stub.base_url), mock.patch.dict(os.environ, {"GROQ_API_KEY": "stub"}):
+            first = await self.async_client.post("/api/cyborg/ask/", {"question": "metformin dosage"}, content_type="application/json")
+            calls = self.stub.requests
+            again = await self.async_client.post("/api/cyborg/ask/", {"question": "Metformin  dosage?"}, content_type="application/json")
+            fresh = await self.async_client.post("/api/cyborg/ask/", {"question": "metformin dosage", "cache": False},
+                                                 content_type="application/json")
+
+        self.assertNotIn("cached", first.json())
+        self.assertEqual(again.json()["cached"], "exact")
+        self.assertEqual(again.json()["answer"], first.json()["answer"])
+        self.assertEqual(self.stub.requests, calls + 1)  # only the cache-bypassing ask reached the model
+        self.assertNotIn("cached", fresh.json())
+
+
+class AnswerCacheTest(SimpleTestCase):
+    def setUp(self):
+        from .answer_cache import AnswerCache
+
+        self.cache = AnswerCache(max_entries=10, ttl=0, similarity=0.9)
+        self.hits = [{"id": "a", "contents": "metformin 500mg"}, {"id": "b", "contents": "take with meals"}]
+
+    def test_exact_and_near_duplicate_hits(self):
+        self.cache.put("m", "metformin dosage", [1.0, 0.0, 0.0], self.hits, "500mg twice daily")
+        self.assertEqual(self.cache.get("m", "Metformin dosage?", [0.0, 1.0, 0.0], self.hits), ("500mg twice daily", "exact"))
+        self.assertEqual(self.cache.get("m", "dosage of metformin", [0.99, 0.1, 0.0], self.hits), ("500mg twice daily", "similar"))
+        self.assertIsNone(self.cache.get("m", "metformin side effects", [0.5, 0.8, 0.0], self.hits))
+        self.assertIsNone(self.cache.get("other-model", "metformin dosage", [1.0, 0.0, 0.0], self.hits))
+        self.assertIsNone(self.cache.get("m", "metformin dosage", [1.0, 0.0, 0.0], self.hits[:1]))
+        stats = self.cache.stats()
+        self.assertEqual((stats["exact_hits"], stats["similar_hits"], stats["misses"]), (1, 1, 3))
+        self.assertEqual(stats["llm_calls_saved"], 2)
+
+    def test_near_duplicates_with_the_configured_embedder(self):
+        import os
+
+        from .answer_cache import ANSWER_CACHE_SIMILARITY, AnswerCache
+
+        if os.getenv("GROQ_EMBED_MODEL") or os.getenv("ANSWER_CACHE_SIMILARITY"):
+            self.skipTest("embedder or threshold configured in the environment")
+        # the suite runs on the hash embedder: bag-of-words vectors can't tell
+        # a paraphrase from a different question, so only exact repeats hit
+        self.assertIsNone(ANSWER_CACHE_SIMILARITY)
+        cache = AnswerCache(max_entries=10, ttl=0)
+        cache.put("m", "is metformin safe", generate_embedding("is metformin safe"), self.hits, "generally, yes")
+        for question in ("is metformin unsafe", "how safe is metformin"):
+            self.assertIsNone(cache.get("m", question, generate_embedding(question), self.hits))
+        self.assertEqual(cache.get("m", "Is metformin safe?", generate_embedding("Is metformin safe?"), self.hits),
+                         ("generally, yes", "exact"))
+
+    def test_updated_chunk_invalidates_answers_citing_it(self):
+        self.cache.put("m", "metformin dosage", [1.0, 0.0], self.hits, "500mg twice daily")
+        self.cache.put("m", "metformin timing", [0.0, 1.0], self.hits[1:], "with meals")
+        updated = [{"id": "a", "contents": "metformin 850mg"}, self.hits[1]]
+        self.assertIsNone(self.cache.get("m", "metformin dosage", [1.0, 0.0], updated))
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.stats()["invalidated"], 1)
+        self.assertEqual(self.cache.invalidate(["b"]), 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_index_writes_invalidate_and_budget_is_part_of_the_key(self):
+        index = LocalVectorIndex(embedding_fn=generate_embedding)
+        index.on_change(self.cache.invalidate)
+        index.upsert([_item("a", "metformin 500mg"), _item("b", "take with meals")])
+        self.cache.put("m", "metformin dosage", [1.0, 0.0], self.hits, "500mg twice daily", 3000)
+        self.cache.put("m", "metformin timing", [0.0, 1.0], self.hits[1:], "with meals", 3000)
+
+        self.assertIsNone(self.cache.get("m", "metformin dosage", [1.0, 0.0], self.hits, 500))
+        index.upsert([_item("a", "metformin 850mg")])
+        self.assertEqual(len(self.cache), 1)
+        index.delete(["b"])
+        self.assertEqual(len(self.cache), 0)
+
+
+class ContextAssemblyTest(SimpleTestCase):
+    def hit(self, id_, text, chunk=None, title="Metformin label"):
+        meta = {"title": title} if chunk is None else {"title": title, "chunk": chunk}
+        return {"id": id_, "contents": text, "metadata": meta}
+
+    def test_dedupes_and_merges_neighbouring_chunks(self):
+        from .context import assemble_context, format_blocks
+
+        a0 = "Metformin is first-line therapy for type 2 diabetes in adults."
+        a1 = "Usual starting dose is 500 mg twice daily with meals."
+        hits = [
+            self.hit("doc1_1", a1, 1),
+            self.hit("doc1_0", a0, 0),
+            self.hit("doc2_0", a1, 0),  # re-seeded copy
+            self.hit("doc3_0", a0.replace("adults", "adults ") + " ", 0),  # whitespace-only variant
+            self.hit("note", "Check renal function before starting metformin therapy."),
+        ]
+        context = assemble_context(hits, budget=1000)
+        blocks, stats = context["blocks"], context["stats"]
+
+        self.assertEqual([b["ids"] for b in blocks], [["doc1_1", "doc1_0"], ["note"]])
+        self.assertEqual(blocks[0]["text"], f"{a0} {a1}")
+        self.assertEqual((stats["duplicates"], stats["merged"], stats["blocks"]), (2, 1, 2))
+        self.assertGreater(stats["tokens_saved"], 0)
+        self.assertTrue(format_blocks(blocks).startswith("[DOC 1] Metformin label\nMetformin is"))
+
+    def test_fits_budget(self):
+        from .context import assemble_context, estimate_tokens
+
+        sentence = "Monitor blood glucose and kidney function regularly. "
+        hits = [self.hit(f"d{i}", f"Document {i}. " + sentence * 40) for i in range(4)]
+        context = assemble_context(hits, budget=600)
+        stats = context["stats"]
+
+        self.assertLessEqual(stats["tokens_used"], 600)
+        self.assertEqual(stats["tokens_used"], sum(estimate_tokens(b["text"]) for b in context["blocks"]))
+        self.assertEqual(stats["truncated"], 1)
+        self.assertEqual(stats["tokens_saved"], stats["tokens_in"] - stats["tokens_used"])
+        self.assertTrue(context["blocks"][-1]["text"].endswith("…"))
+
+
+class ChunkingTest(SimpleTestCase):
+    def test_chunks_on_sentences_with_overlap(self):
+        from .chunking import chunk_text
+
+        text = (
+            "Indications: metformin is first-line for type 2 diabetes. Dr. Rao reviews HbA1c every 3 months. "
+            "Start at 500 mg twice daily. Titrate weekly as tolerated.\n\n"
+            "Warnings: hold before contrast studies."
+        )
+        chunks = chunk_text(text, max_chars=100, overlap=40)
+
+        self.assertEqual(chunks, [
+            "Indications: metformin is first-line for type 2 diabetes. Dr. Rao reviews HbA1c every 3 months.",
+            # overlap: the previous chunk's last sentence is repeated
+            "Dr. Rao reviews HbA1c every 3 months. Start at 500 mg twice daily. Titrate weekly as tolerated.",
+            "Warnings: hold before contrast studies.",
+        ])
+        self.assertEqual(chunk_text("word " * 50, max_chars=30, overlap=0)[0], "word " * 5 + "word")
+
+    def test_reindex_embeds_only_changed_chunks(self):
+        from .chunking import reindex_documents
+
+        index = LocalVectorIndex(embedding_fn=generate_embedding)
+        embedded = []
+
+        def embed(texts):
+            embedded.extend(texts)
+            return generate_embeddings(texts)
+
+        sections = [f"Section {i}. Follow-up note number {i} for the clinic." for i in range(4)]
+        counts = reindex_documents(index, [("note-1", "\n\n".join(sections), {"source": "OPD"})], embed)
+        self.assertEqual(counts[0], {"chunks": 4, "new": 4, "updated": 0, "unchanged": 0, "deleted": 0})
+
+        embedded.clear()
+        sections[2] = "Section 2. Edited: patient now on insulin."
+        del sections[3]
+        counts = reindex_documents(index, [("note-1", "\n\n".join(sections), {"source": "OPD"})], embed)
+        self.assertEqual(counts[0], {"chunks": 3, "new": 1, "updated": 0, "unchanged": 2, "deleted": 2})
+        self.assertEqual(embedded, [sections[2]])
+        self.assertEqual(sorted(h["contents"] for h in index.get(index.ids({"doc_id": "note-1"})).values()), sorted(sections))
+        self.assertEqual(len(index), 3)
+
+    def test_repeated_ingest_is_idempotent(self):
+        from .views_cyborg_memory import VAULT, _vault_upsert_many
+
+        text = "Documented allergy: Penicillin (urticaria + wheeze). Avoid beta-lactams."
+        meta = {"source": "EMR", "patient_id": "PT-9", "title": "Allergy Record"}
+        size = len(VAULT)
+        (doc_id, first), = _vault_upsert_many([(text, meta, None)])
+        (same_id, again), = _vault_upsert_many([(text, meta, None)])
+        (_, retagged), = _vault_upsert_many([(text, {**meta, "tags": ["Allergy"]}, None)])
+
+        self.assertEqual(same_id, doc_id)
+        self.assertEqual((first["new"], again["new"], again["unchanged"]), (1, 0, 1))
+        self.assertEqual((retagged["new"], retagged["updated"]), (0, 1))
+        self.assertEqual(len(VAULT), size + 1)
+
+        # another note under the same title is another document, not an edit
+        (other_id, other), = _vault_upsert_many([("Allergy: sulfa drugs (rash).", meta, None)])
+        self.assertNotEqual(other_id, doc_id)
+        self.assertEqual((other["new"], other["deleted"]), (1, 0))
+        self.assertEqual(len(VAULT), size + 2)
+        VAULT.delete(VAULT.ids({"doc_id": {"$in": [doc_id, other_id]}}))
+
+    def test_same_note_for_two_patients_is_two_documents(self):
+        from .views_cyborg_memory import VAULT, _vault_upsert_many
+
+        text = "BP normal, follow up in 6 months."
+        size = len(VAULT)
+        upserted = _vault_upsert_many([(text, {"source": "OPD", "patient_id": p}, None) for p in ("PT-1", "PT-2")])
+        (first_id, first), (second_id, second) = upserted
+
+        self.assertNotEqual(first_id, second_id)
+        self.assertEqual((first["new"], second["new"], second["updated"]), (1, 1, 0))
+        self.assertEqual(len(VAULT), size + 2)
+        for patient in ("PT-1", "PT-2"):
+            self.assertEqual(len(VAULT.ids({"patient_id": patient, "doc_id": {"$in": [first_id, second_id]}})), 1)
+        VAULT.delete(VAULT.ids({"doc_id": {"$in": [first_id, second_id]}}))
@@ -2,7 +2,9 @@
 from django.urls import path
 
 from .views_ai import ai_chat, climate_forecast, get_records, UploadMedicalRecord
-from .views_cyborg_memory import cyborg_index, cyborg_search, cyborg_ask, cyborg_seed
+from .views_health import health
+from .views_cyborg_memory import cyborg_index, cyborg_search, cyborg_ask, cyborg_seed, cyborg_stats
+from .views_jobs import job_detail, job_list
 
 urlpatterns = [
     # AI
@@ -15,6 +17,11 @@ urlpatterns = [
     path("cyborg/search/", cyborg_search, name="cyborg_search"),
     path("cyborg/ask/", cyborg_ask, name="cyborg_ask"),
     path("cyborg/seed/", cyborg_seed, name="cyborg_seed"),
+    path("cyborg/stats/", cyborg_stats, name="cyborg_stats"),
+
+    # Background jobs (seeding / bulk indexing); DELETE cancels
+    path("jobs/", job_list, name="job_list"),
+    path("jobs/<str:job_id>/", job_detail, name="job_detail"),
 
     # Climate
     path("climate/forecast/", climate_forecast, name="climate_forecast"),
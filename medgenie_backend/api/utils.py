@@ -2,7 +2,18 @@
 import os
 import re
 import math
+import time
+import zlib
+import random
 import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from .embed_cache import EMBED_CACHE
 
 # Optional: Groq embeddings (ONLY if you actually have an embed model)
 try:
@@ -15,41 +26,232 @@ except Exception:
 EMBED_DIM = int(os.getenv("EMBED_DIM", "384"))
 GROQ_EMBED_MODEL = os.getenv("GROQ_EMBED_MODEL", "").strip() or None
 
+# Remote (Groq) batching: texts per embeddings.create call, concurrent calls,
+# and retries (exponential backoff with jitter) before falling back to hashing.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "2"))
+EMBED_BACKOFF = float(os.getenv("EMBED_BACKOFF", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+# 1 (default): token buckets/signs from MD5, bit-identical to the original
+# hashing embedder. 0: CRC32 instead (faster cache misses, different vectors
+# -- don't mix the two in one index).
+EMBED_HASH_COMPAT = os.getenv("EMBED_HASH_COMPAT", "1") != "0"
+EMBED_TOKEN_CACHE = int(os.getenv("EMBED_TOKEN_CACHE", "200000"))
+
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9']+")
+
+
+@lru_cache(maxsize=EMBED_TOKEN_CACHE)
+def _token_slot(tok: str, dim: int, compat: bool):
+    """(bucket, sign) for a token; memoized since vocabularies repeat heavily."""
+    data = tok.encode("utf-8")
+    if compat:
+        h = int(hashlib.md5(data).hexdigest(), 16)
+    else:
+        h = zlib.crc32(data)
+    return h % dim, (1.0 if ((h >> 8) & 1) == 0 else -1.0)
+
+
+def _token_slots(text: str, dim: int, compat: bool):
+    slots = [_token_slot(t, dim, compat) for t in _TOKEN_RE.findall((text or "").lower())]
+    if not slots:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    idx, sign = zip(*slots)
+    return np.fromiter(idx, dtype=np.int64, count=len(idx)), np.fromiter(sign, dtype=np.float64, count=len(sign))
+
 
-def _hash_embed(text: str, dim: int = EMBED_DIM):
+def _hash_embed(text: str, dim: int = EMBED_DIM, compat: bool = EMBED_HASH_COMPAT):
     """
     Deterministic lightweight embedding (no ML deps).
     Good enough for demo vector search / RAG grounding.
     """
-    vec = [0.0] * dim
-    toks = re.findall(r"[a-zA-Z0-9']+", (text or "").lower())
+    idx, sign = _token_slots(text, dim, compat)
+    vec = np.bincount(idx, weights=sign, minlength=dim)
+    norm = math.sqrt(float(np.dot(vec, vec))) or 1.0
+    return (vec / norm).tolist()
+
+
+def _hash_embed_batch(texts, dim: int = EMBED_DIM, compat: bool = EMBED_HASH_COMPAT, dtype=np.float32) -> np.ndarray:
+    """_hash_embed for many texts at once: one bincount over a (len(texts), dim) grid."""
+    flat_idx, flat_sign = [], []
+    for row, text in enumerate(texts):
+        idx, sign = _token_slots(text, dim, compat)
+        flat_idx.append(idx + row * dim)
+        flat_sign.append(sign)
+    if not texts:
+        return np.zeros((0, dim), dtype=dtype)
+    mat = np.bincount(
+        np.concatenate(flat_idx), weights=np.concatenate(flat_sign), minlength=len(texts) * dim
+    ).reshape(len(texts), dim)
+    norms = np.sqrt(np.einsum("ij,ij->i", mat, mat))
+    norms[norms == 0] = 1.0
+    return (mat / norms[:, None]).astype(dtype, copy=False)
+
+
+# cache namespace for the local hashing embedder
+HASH_EMBED_MODEL = f"hash-{'md5' if EMBED_HASH_COMPAT else 'crc32'}-{EMBED_DIM}"
+
+
+class EmbeddingStats:
+    """
+    Counters for remote embedding traffic. Fallbacks matter: a hashed
+    vector and a model vector live in different spaces, so every fallback
+    puts a vector in the index that won't compare sensibly with the rest.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.remote_requests = 0
+        self.remote_texts = 0
+        self.retries = 0
+        self.fallback_requests = 0
+        self.fallback_texts = 0
+        self.last_error = None
 
-    for t in toks:
-        h = int(hashlib.md5(t.encode("utf-8")).hexdigest(), 16)
-        idx = h % dim
-        sign = 1.0 if ((h >> 8) & 1) == 0 else -1.0
-        vec[idx] += sign
+    def add(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
 
-    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
-    return [v / norm for v in vec]
+    def fallback(self, n_texts: int, error: Exception):
+        with self._lock:
+            first = self.fallback_texts == 0
+            self.fallback_requests += 1
+            self.fallback_texts += n_texts
+            self.last_error = str(error)
+        if first:
+            logger.warning(
+                "Remote embeddings (%s) failed, using hash embeddings for %d text(s); "
+                "vector spaces are now mixed in the index: %s", GROQ_EMBED_MODEL, n_texts, error,
+            )
+
+    def as_dict(self) -> dict:
+        return {
+            "model": GROQ_EMBED_MODEL or HASH_EMBED_MODEL,
+            "remote_requests": self.remote_requests,
+            "remote_texts": self.remote_texts,
+            "retries": self.retries,
+            "fallback_requests": self.fallback_requests,
+            "fallback_texts": self.fallback_texts,
+            "last_error": self.last_error,
+        }
+
+
+EMBED_STATS = EmbeddingStats()
+
+
+def _remote_embed(texts):
+    """One embeddings.create call for `texts`, retried with backoff; raises when all attempts fail."""
+    for attempt in range(EMBED_RETRIES + 1):
+        try:
+            resp = _GROQ.embeddings.create(model=GROQ_EMBED_MODEL, input=texts)
+            EMBED_STATS.add(remote_requests=1, remote_texts=len(texts))
+            return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        except Exception:
+            if attempt == EMBED_RETRIES:
+                raise
+            EMBED_STATS.add(retries=1)
+            time.sleep(EMBED_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+
+
+def _remote_embed_or_hash(texts):
+    """(vectors, from_remote) for one batch; hashing when the remote call keeps failing."""
+    try:
+        return _remote_embed(texts), True
+    except Exception as e:
+        EMBED_STATS.fallback(len(texts), e)
+        return [_hash_embed(t) for t in texts], False
+
+
+def _remote_embed_many(texts):
+    """Embeds texts in EMBED_BATCH_SIZE requests, up to EMBED_CONCURRENCY at a time."""
+    size = max(1, EMBED_BATCH_SIZE)
+    batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+    if len(batches) == 1 or EMBED_CONCURRENCY <= 1:
+        results = [_remote_embed_or_hash(b) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as pool:
+            results = list(pool.map(_remote_embed_or_hash, batches))
+
+    vecs, remote = [], []
+    for batch_vecs, ok in results:
+        vecs.extend(batch_vecs)
+        remote.extend([ok] * len(batch_vecs))
+    return vecs, remote
 
 
 def generate_embedding(text: str):
     """
     Uses Groq embeddings ONLY if GROQ_EMBED_MODEL is set AND works.
     Otherwise falls back to hashing embedding (always available).
+    Results are memoized in EMBED_CACHE (see embed_cache.py).
     """
     text = (text or "").strip()
     if not text:
         return [0.0] * EMBED_DIM
 
     if _GROQ and GROQ_EMBED_MODEL:
-        try:
-            resp = _GROQ.embeddings.create(model=GROQ_EMBED_MODEL, input=text)
-            return resp.data[0].embedding
-        except Exception:
-            # fallback if model not available (e.g. nomic-embed-text not on your account)
-            return _hash_embed(text)
+        cached = EMBED_CACHE.get(GROQ_EMBED_MODEL, text)
+        if cached is not None:
+            return cached
+        # fallback if model not available (e.g. nomic-embed-text not on your account)
+        vecs, remote = _remote_embed_many([text])
+        if remote[0]:
+            EMBED_CACHE.put(GROQ_EMBED_MODEL, text, vecs[0])
+        return vecs[0]
+
+    cached = EMBED_CACHE.get(HASH_EMBED_MODEL, text)
+    if cached is not None:
+        return cached
+    vec = _hash_embed(text)
+    EMBED_CACHE.put(HASH_EMBED_MODEL, text, vec)
+    return vec
+
+
+def generate_embeddings(texts) -> np.ndarray:
+    """
+    Batch form of generate_embedding: returns a float32 matrix, one row per
+    text (empty texts give zero rows). Cache misses are embedded together:
+    one hashing pass, or batched embeddings.create calls when remote.
+    """
+    texts = [(t or "").strip() for t in texts]
+    remote = bool(_GROQ and GROQ_EMBED_MODEL)
+    model = GROQ_EMBED_MODEL if remote else HASH_EMBED_MODEL
+
+    found = {}  # row -> vector
+    missing = {}  # text -> rows
+    for row, t in enumerate(texts):
+        if not t:
+            continue
+        if t in missing:
+            missing[t].append(row)
+            continue
+        cached = EMBED_CACHE.get(model, t)
+        if cached is not None:
+            found[row] = cached
+        else:
+            missing[t] = [row]
 
-    return _hash_embed(text)
+    if missing:
+        if remote:
+            fresh, ok = _remote_embed_many(list(missing))
+        else:
+            # float64 so cached rows stay bit-identical to generate_embedding()
+            fresh, ok = _hash_embed_batch(list(missing), dtype=np.float64), [True] * len(missing)
+        for (t, rows), vec in zip(missing.items(), fresh):
+            for r in rows:
+                found[r] = vec
+        # one write (and one sqlite commit) for the whole batch
+        EMBED_CACHE.put_many(model, [(t, vec) for t, vec, cacheable in zip(missing, fresh, ok) if cacheable])
 
+    width = max((len(v) for v in found.values()), default=EMBED_DIM)
+    out = np.zeros((len(texts), width), dtype=np.float32)
+    for row, v in found.items():
+        out[row, : len(v)] = v
+    return out
@@ -1,32 +1,33 @@
 # medgenie_backend/api/views_ai.py
 import random
+from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from groq import Groq
 
+from .async_api import async_api_view, sse_completion, wants_stream
+from .llm import acomplete
 
-@api_view(["POST"])
-def ai_chat(request):
+
+@async_api_view(["POST"])
+async def ai_chat(request):
     user_msg = (request.data.get("message") or "").strip()
     model = request.data.get("model", "qwen/qwen3-32b")
 
     if not user_msg:
-        return Response({"error": "message is required"}, status=400)
+        return JsonResponse({"error": "message is required"}, status=400)
+
+    messages = [{"role": "user", "content": user_msg}]
+    params = dict(temperature=0.6, max_completion_tokens=1024, top_p=0.95, reasoning_effort="default")
+
+    # {"stream": true}: SSE token events, then "done" with the full reply
+    if wants_stream(request):
+        return sse_completion(model, messages, params, "reply")
 
     try:
-        client = Groq()
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": user_msg}],
-            temperature=0.6,
-            max_completion_tokens=1024,
-            top_p=0.95,
-            reasoning_effort="default",
-        )
-        reply = completion.choices[0].message.content
-        return Response({"reply": reply})
+        reply = await acomplete(model, messages, **params)
+        return JsonResponse({"reply": reply})
     except Exception as e:
-        return Response({"error": str(e)}, status=500)
+        return JsonResponse({"error": str(e)}, status=500)
 
 
 @api_view(["POST"])
@@ -1,10 +1,9 @@
-import os
 import requests
-from groq import Groq
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from .async_api import async_api_view
+from .llm import acomplete
 
 def fetch_imd_weather(location_id="42182"):
     try:
@@ -14,13 +13,13 @@ def fetch_imd_weather(location_id="42182"):
     except Exception as e:
         return {"error": str(e)}
 
-@api_view(["POST"])
-def crop_recommendation(request):
+@async_api_view(["POST"])
+async def crop_recommendation(request):
     location = request.data.get("location", "Delhi")
     soil = request.data.get("soil", "Loamy")
     location_id = request.data.get("location_id", "42182")
 
-    imd = fetch_imd_weather(location_id)
+    imd = await sync_to_async(fetch_imd_weather, thread_sensitive=False)(location_id)
 
     prompt = f"""
 You are an agricultural AI model. Based on:
@@ -40,16 +39,14 @@ Generate:
 7. Disease/Pest risk score
 """
 
-    response = client.chat.completions.create(
-        model="qwen/qwen3-32b",
-        messages=[{"role": "user", "content": prompt}],
+    result = await acomplete(
+        "qwen/qwen3-32b",
+        [{"role": "user", "content": prompt}],
         temperature=0.3,
         max_completion_tokens=700
     )
 
-    result = response.choices[0].message["content"]
-
-    return Response({
+    return JsonResponse({
         "location": location,
         "soil": soil,
         "recommendation": result
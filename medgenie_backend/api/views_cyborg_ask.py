@@ -1,24 +1,24 @@
-import os
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from groq import Groq
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 
 from medgenie_backend.cyborg_client import get_medical_index
-from .utils import generate_embedding
+from .async_api import async_api_view
+from .llm import acomplete
+from .utils import generate_embedding, generate_embeddings
 
 
-@api_view(["POST"])
-def cyborg_ask(request):
+@async_api_view(["POST"])
+async def cyborg_ask(request):
     question = (request.data.get("question") or "").strip()
     top_k = int(request.data.get("top_k", 5))
     model = request.data.get("model", "qwen/qwen3-32b")
 
     if not question:
-        return Response({"error": "question is required"}, status=400)
+        return JsonResponse({"error": "question is required"}, status=400)
 
     try:
-        index = get_medical_index(embedding_fn=generate_embedding)
-        res = index.query(
+        index = get_medical_index(embedding_fn=generate_embedding, batch_embedding_fn=generate_embeddings)
+        res = await sync_to_async(index.query, thread_sensitive=False)(
             query_contents=question,
             top_k=top_k,
             include=["distance", "metadata", "contents"],
@@ -47,17 +47,14 @@ Return:
 2) Bullet citations like: (Sources: DOC 1, DOC 2)
 """
 
-        client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
+        answer = await acomplete(
+            model,
+            [{"role": "user", "content": prompt}],
             temperature=0.3,
             max_completion_tokens=800,
             top_p=0.95,
         )
-
-        answer = completion.choices[0].message.content
-        return Response({"answer": answer, "hits": hits})
+        return JsonResponse({"answer": answer, "hits": hits})
 
     except Exception as e:
-        return Response({"error": str(e)}, status=500)
+        return JsonResponse({"error": str(e)}, status=500)
@@ -1,95 +1,85 @@
 # medgenie_backend/api/views_cyborg_memory.py
-import uuid
-import json
-import math
+import os
 import random
-import urllib.request
-import urllib.parse
 
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from groq import Groq
-from .utils import generate_embedding
+from medgenie_backend.cyborg_client import get_medical_index
+from .answer_cache import ANSWER_CACHE
+from .async_api import async_api_view, sse_completion, sse_event, sse_response, wants_stream
+from .chunking import document_id, reindex_documents
+from .context import CONTEXT_TOKEN_BUDGET, assemble_context, format_blocks
+from .embed_cache import EMBED_CACHE
+from .jobs import JOBS
+from .llm import LLM_STATS, acomplete
+from .openfda import OPENFDA
+from .utils import EMBED_STATS, generate_embedding, generate_embeddings
+from .views_jobs import submit_job
+
+MAX_BATCH_QUERIES = 32
+# cyborg_index runs larger texts (or any with "async": true) as a background job
+INLINE_INDEX_CHARS = 20000
+# default retrieval for search/ask: "vector", "lexical" (BM25) or "hybrid" (both, rank-fused)
+SEARCH_MODE = os.getenv("CYBORG_SEARCH_MODE", "vector").strip().lower()
+SEARCH_MODES = ("vector", "lexical", "hybrid")
 
 # ---------------------------
-# In-memory "vault"
+# "Vault": the shared medical index
 # ---------------------------
-# Each item: {id, vector, contents, metadata}
-VAULT = []
-
-
-def _cosine_distance(a, b):
-    # a,b are normalized most of the time; still safe
-    dot = 0.0
-    na = 0.0
-    nb = 0.0
-    for i in range(min(len(a), len(b))):
-        dot += a[i] * b[i]
-        na += a[i] * a[i]
-        nb += b[i] * b[i]
-    denom = (math.sqrt(na) * math.sqrt(nb)) or 1.0
-    cos = dot / denom
-    # distance: smaller is better
-    return 1.0 - cos
-
-
-def _chunk_text(text: str, max_chars: int = 900):
-    text = (text or "").strip()
-    if not text:
-        return []
-    return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
-
-
-def _vault_upsert(text: str, metadata: dict):
-    chunks = _chunk_text(text)
-    base_id = str(uuid.uuid4())
-
-    inserted = 0
-    for i, c in enumerate(chunks):
-        vec = generate_embedding(c)
-        VAULT.append(
-            {
-                "id": f"{base_id}_{i}",
-                "vector": vec,
-                "contents": c,
-                "metadata": {**(metadata or {}), "chunk": i},
-            }
-        )
-        inserted += 1
-
-    return base_id, inserted
-
-
-def _vault_search(query: str, top_k: int = 5, filters: dict | None = None):
-    qv = generate_embedding(query)
-
-    hits = []
-    for it in VAULT:
-        md = it.get("metadata") or {}
-
-        # simple filter support
-        if filters and isinstance(filters, dict):
-            ok = True
-            for k, v in filters.items():
-                if md.get(k) != v:
-                    ok = False
-                    break
-            if not ok:
-                continue
-
-        dist = _cosine_distance(qv, it["vector"])
-        hits.append(
-            {
-                "distance": dist,
-                "metadata": md,
-                "contents": it["contents"],
-                "id": it["id"],
-            }
-        )
+# Each item: {id, vector, contents, metadata}. Same index as the seed/RAG
+# views, so anything indexed here is searchable there and vice versa.
+VAULT = get_medical_index(embedding_fn=generate_embedding, batch_embedding_fn=generate_embeddings)
+# answers citing a chunk that is re-written or deleted (by any writer) are dropped
+VAULT.on_change(ANSWER_CACHE.invalidate)
+
+
+def _vault_upsert(text: str, metadata: dict, doc_id: str = None):
+    return _vault_upsert_many([(text, metadata, doc_id)])[0]
+
+
+def _vault_upsert_many(docs: list):
+    """
+    Chunks and indexes [(text, metadata, doc_id), ...], embedding every new
+    chunk of every doc in one generate_embeddings call. doc_id None derives
+    a stable one from the source and the text, so sending the same document
+    again (re-seeding, client retries) embeds nothing. Re-indexing
+    an existing doc_id only embeds the chunks whose text changed and drops
+    the ones that are gone. Returns [(doc_id, counts)] with counts as in
+    reindex_documents.
+    """
+    planned = [(doc_id or document_id(text, metadata), text, metadata or {}) for text, metadata, doc_id in docs]
+    counts = reindex_documents(VAULT, planned, generate_embeddings)
+    return [(doc_id, c) for (doc_id, _, _), c in zip(planned, counts)]
+
+
+def _vault_retrieve(query: str, top_k: int = 5, mode: str = SEARCH_MODE):
+    """(question embedding, hits); the embedding also keys the answer cache."""
+    qvec = generate_embedding(query)
+    top_k = max(1, int(top_k))
+    if mode == "hybrid":
+        return qvec, VAULT.search_hybrid([query], [qvec], top_k=top_k)[0]
+    if mode == "lexical":
+        return qvec, VAULT.search_text([query], top_k=top_k)[0]
+    return qvec, VAULT.search_vectors([qvec], top_k=top_k)[0]
 
-    hits.sort(key=lambda x: x["distance"])
-    return hits[: max(1, int(top_k))]
+
+def _vault_search_batch(queries: list, top_k: int = 5, filters: dict | None = None, mode: str = SEARCH_MODE):
+    if not isinstance(filters, dict):
+        filters = None
+    return VAULT.query_batch(queries, top_k=max(1, int(top_k)), filters=filters, mode=mode)
+
+
+def _search_modes():
+    # lexical/hybrid only when the index keeps BM25 postings (MEDGENIE_LEXICAL)
+    return [m for m in SEARCH_MODES if m in VAULT.search_modes]
+
+
+def _search_mode(request):
+    mode = str(request.data.get("mode") or SEARCH_MODE).strip().lower()
+    return mode if mode in _search_modes() else None
 
 
 # ---------------------------
@@ -99,37 +89,78 @@ def _vault_search(query: str, top_k: int = 5, filters: dict | None = None):
 def cyborg_index(request):
     text = request.data.get("text", "")
     metadata = request.data.get("metadata", {}) or {}
+    # re-sending a doc_id re-indexes that document: only changed chunks are embedded
+    doc_id = request.data.get("doc_id") or None
 
     if not text:
         return Response({"error": "text is required"}, status=400)
 
-    base_id, chunks = _vault_upsert(text, metadata)
-    return Response({"status": "indexed", "id_prefix": base_id, "chunks": chunks, "vault_size": len(VAULT)})
+    if request.data.get("async") or len(text) > INLINE_INDEX_CHARS:
+        return submit_job("cyborg_index", _index_job, text=text, metadata=metadata, doc_id=doc_id)
+
+    doc_id, counts = _vault_upsert(text, metadata, doc_id)
+    return Response({"status": "indexed", "id_prefix": doc_id, **counts, "vault_size": len(VAULT)})
+
+
+def _index_job(job, text: str, metadata: dict, doc_id: str = None):
+    doc_id, counts = _vault_upsert(text, metadata, doc_id)
+    job.update(docs=1, chunks=counts["chunks"], bytes=len(text.encode("utf-8")))
+    return {"id_prefix": doc_id, **counts, "vault_size": len(VAULT)}
 
 
 @api_view(["POST"])
 def cyborg_search(request):
-    query = (request.data.get("query") or "").strip()
+    queries = request.data.get("queries")
     top_k = int(request.data.get("top_k", 5))
     filters = request.data.get("filters")
+    mode = _search_mode(request)
+    batched = queries is not None
+
+    if mode is None:
+        return Response({"error": f"mode must be one of {', '.join(_search_modes())}"}, status=400)
+
+    # Batch form: {"queries": [...]} -> {"results": [[hits], [hits], ...]}
+    if batched:
+        if not isinstance(queries, list):
+            return Response({"error": "queries must be a list"}, status=400)
+        queries = [str(q or "").strip() for q in queries]
+        if not queries or not all(queries):
+            return Response({"error": "queries must be non-empty strings"}, status=400)
+        if len(queries) > MAX_BATCH_QUERIES:
+            return Response({"error": f"at most {MAX_BATCH_QUERIES} queries per request"}, status=400)
+    else:
+        query = (request.data.get("query") or "").strip()
+        if not query:
+            return Response({"error": "query is required"}, status=400)
+        queries = [query]
 
-    if not query:
-        return Response({"error": "query is required"}, status=400)
+    try:
+        results = _vault_search_batch(queries, top_k=top_k, filters=filters, mode=mode)
+    except ValueError as e:
+        # e.g. an unsupported filter operator
+        return Response({"error": str(e)}, status=400)
 
-    hits = _vault_search(query, top_k=top_k, filters=filters)
-    return Response({"results": hits})
+    return Response({"results": results if batched else results[0]})
 
 
-def _fetch_openfda_one(search_q: str, limit: int = 1):
-    url = "https://api.fda.gov/drug/label.json?" + urllib.parse.urlencode(
-        {"search": search_q, "limit": str(limit)}
+@api_view(["GET"])
+def cyborg_stats(request):
+    return Response(
+        {
+            "vault_size": len(VAULT),
+            "embedding_cache": EMBED_CACHE.stats(),
+            "embedding": EMBED_STATS.as_dict(),
+            "jobs": JOBS.stats(),
+            "openfda": OPENFDA.stats(),
+            "llm": LLM_STATS.as_dict(),
+            "answer_cache": ANSWER_CACHE.stats(),
+        }
     )
 
-    with urllib.request.urlopen(url, timeout=15) as r:
-        raw = r.read().decode("utf-8")
-        data = json.loads(raw)
 
-    r0 = (data.get("results") or [None])[0]
+def _label_doc(results):
+    """Seed doc from openFDA label results (first label), or None."""
+    r0 = (results or [None])[0]
     if not r0:
         return None
 
@@ -171,10 +202,14 @@ def _fetch_openfda_one(search_q: str, limit: int = 1):
 @api_view(["POST"])
 def cyborg_seed(request):
     """
-    Seeds:
+    Seeds, as a background job (poll status_url):
     - curated clinical demo notes (safe, synthetic)
     - openFDA public drug labels (open-source)
     """
+    return submit_job("cyborg_seed", _seed_job)
+
+
+def _seed_job(job):
     curated = [
         {
             "title": "ECG Note — ST Elevation",
@@ -213,49 +248,67 @@ def cyborg_seed(request):
     docs = []
     docs.extend(curated)
 
+    # concurrent + disk-cached; failed lookups come back as None
     open_ok = 0
-    for q in open_queries:
-        try:
-            d = _fetch_openfda_one(q, limit=1)
-            if d:
-                docs.append(d)
-                open_ok += 1
-        except Exception:
-            continue
-
-    doc_count = 0
-    chunk_count = 0
-    for d in docs:
-        _, chunks = _vault_upsert(d["text"], {**(d.get("metadata") or {}), "title": d["title"]})
-        doc_count += 1
-        chunk_count += chunks
+    for results in OPENFDA.fetch_many(open_queries, limit=1):
+        d = _label_doc(results)
+        if d:
+            docs.append(d)
+            open_ok += 1
+    job.update(docs=len(docs))
+
+    job.check_cancelled()
+    upserted = _vault_upsert_many([(d["text"], {**(d.get("metadata") or {}), "title": d["title"]}, None) for d in docs])
+    doc_count = len(upserted)
+    chunk_count = sum(c["chunks"] for _, c in upserted)
+    job.update(docs=doc_count, chunks=chunk_count, bytes=sum(len(d["text"].encode("utf-8")) for d in docs))
+    # re-seeding finds every chunk already indexed: "new" is 0 and nothing is embedded
+    counts = {key: sum(c[key] for _, c in upserted) for key in ("new", "updated", "unchanged", "deleted")}
 
-    return Response(
-        {
-            "status": "seeded",
-            "docs": doc_count,
-            "chunks": chunk_count,
-            "openfda_docs": open_ok,
-            "vault_size": len(VAULT),
-        }
-    )
+    return {
+        "docs": doc_count,
+        "chunks": chunk_count,
+        **counts,
+        "openfda_docs": open_ok,
+        "vault_size": len(VAULT),
+    }
 
 
-@api_view(["POST"])
-def cyborg_ask(request):
+@async_api_view(["POST"])
+async def cyborg_ask(request):
     question = (request.data.get("question") or "").strip()
     top_k = int(request.data.get("top_k", 5))
     model = (request.data.get("model") or "qwen/qwen3-32b").strip()
 
+    mode = _search_mode(request)
+
     if not question:
-        return Response({"error": "question is required"}, status=400)
+        return JsonResponse({"error": "question is required"}, status=400)
+    if mode is None:
+        return JsonResponse({"error": f"mode must be one of {', '.join(_search_modes())}"}, status=400)
+
+    # embedding + scoring are CPU/blocking work: keep them off the event loop
+    qvec, hits = await sync_to_async(_vault_retrieve, thread_sensitive=False)(question, top_k=top_k, mode=mode)
 
-    hits = _vault_search(question, top_k=top_k)
+    budget = int(request.data.get("context_budget") or CONTEXT_TOKEN_BUDGET)
 
-    ctx = []
-    for i, h in enumerate(hits):
-        title = (h.get("metadata") or {}).get("title") or f"DOC {i+1}"
-        ctx.append(f"[DOC {i+1}] {title}\n{h.get('contents','')}".strip())
+    # same (or near-identical) question over the same chunks: no LLM call
+    use_cache = request.data.get("cache", True) is not False
+    cached = ANSWER_CACHE.get(model, question, qvec, hits, budget) if use_cache else None
+    if cached is not None:
+        answer, kind = cached
+        if wants_stream(request):
+            return sse_response(_cached_events(hits, answer, kind))
+        return JsonResponse({"answer": answer, "hits": hits, "cached": kind})
+
+    def remember(answer):
+        if use_cache:
+            ANSWER_CACHE.put(model, question, qvec, hits, answer, budget)
+
+    # deduped, neighbours merged, fitted to the token budget
+    context = assemble_context(hits, budget=budget)
+    # [DOC n] in the answer cites the chunk ids of block n
+    context_info = {**context["stats"], "docs": [b["ids"] for b in context["blocks"]]}
 
     prompt = f"""
 You are MedGenie, a cautious medical assistant.
@@ -269,23 +322,30 @@ Question:
 {question}
 
 Docs:
-{chr(10).join(ctx)}
+{format_blocks(context["blocks"])}
 
 Answer:
 """.strip()
 
-    try:
-        client = Groq()
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4,
-            max_completion_tokens=800,
-            top_p=0.95,
-            reasoning_effort="default",
+    messages = [{"role": "user", "content": prompt}]
+    params = dict(temperature=0.4, max_completion_tokens=800, top_p=0.95, reasoning_effort="default")
+
+    # {"stream": true}: SSE "hits" right after retrieval, then token events,
+    # then "done" with the full answer
+    if wants_stream(request):
+        return sse_completion(
+            model, messages, params, "answer", first=[("hits", {"hits": hits, "context": context_info})], on_done=remember
         )
-        answer = completion.choices[0].message.content
-        return Response({"answer": answer, "hits": hits})
+
+    try:
+        answer = await acomplete(model, messages, **params)
+        remember(answer)
+        return JsonResponse({"answer": answer, "hits": hits, "context": context_info})
     except Exception as e:
         # Still return hits so UI works
-        return Response({"error": str(e), "hits": hits}, status=500)
+        return JsonResponse({"error": str(e), "hits": hits}, status=500)
+
+
+async def _cached_events(hits, answer, kind):
+    yield sse_event("hits", {"hits": hits})
+    yield sse_event("done", {"answer": answer, "cached": kind})
@@ -1,39 +1,36 @@
 # api/views_cyborg_seed_open.py
-import uuid
-import requests
 from rest_framework.decorators import api_view
-from rest_framework.response import Response
 
-from medgenie_backend.cyborg_client import get_medical_index
-from .utils import generate_embedding
-
-
-def _upsert_text(index, text: str, metadata: dict):
-    vec = generate_embedding(text)
-    index.upsert([{
-        "id": str(uuid.uuid4()),
-        "vector": vec,
-        "contents": text,
-        "metadata": metadata,
-    }])
+from .openfda import OPENFDA
+from .views_cyborg_memory import _vault_upsert_many
+from .views_jobs import submit_job
 
 
 @api_view(["POST"])
 def cyborg_seed_open(request):
     """
-    Pulls a few LIVE open-source medical texts and indexes them.
-    Uses openFDA drug label API.
+    Pulls a few LIVE open-source medical texts and indexes them, as a
+    background job (poll status_url). Uses openFDA drug label API.
     """
-    index = get_medical_index(embedding_fn=generate_embedding)
-
-    seeded = []
-
-    def fetch_label(query: str, title: str):
-        url = f"https://api.fda.gov/drug/label.json?search={query}&limit=1"
-        r = requests.get(url, timeout=12)
-        r.raise_for_status()
-        js = r.json()
-        res = js["results"][0]
+    return submit_job("openfda_seed", _seed_open_job)
+
+
+def _seed_open_job(job):
+    labels = [
+        ("openfda.generic_name:metformin", "Metformin — label summary (openFDA)"),
+        ("openfda.generic_name:penicillin", "Penicillin — label summary (openFDA)"),
+        ("openfda.generic_name:aspirin", "Aspirin — label summary (openFDA)"),
+    ]
+    # concurrent + disk-cached; failed lookups come back as None
+    fetched = OPENFDA.fetch_many([q for q, _ in labels], limit=1)
+
+    docs, seeded, missing = [], [], []
+    for (query, title), results in zip(labels, fetched):
+        job.check_cancelled()
+        if not results:
+            missing.append(title)
+            continue
+        res = results[0]
         # take safe text fields
         parts = []
         for k in ["indications_and_usage", "contraindications", "warnings", "adverse_reactions"]:
@@ -42,13 +39,13 @@ def cyborg_seed_open(request):
                 if isinstance(v, list) and v:
                     parts.append(f"{k}: {v[0]}")
         text = f"{title}\n" + "\n\n".join(parts)
-        _upsert_text(index, text, {"source": "openFDA", "title": title})
+        docs.append((text, {"source": "openFDA", "title": title}, None))
         seeded.append(title)
 
-    try:
-        fetch_label("openfda.generic_name:metformin", "Metformin — label summary (openFDA)")
-        fetch_label("openfda.generic_name:penicillin", "Penicillin — label summary (openFDA)")
-        fetch_label("openfda.generic_name:aspirin", "Aspirin — label summary (openFDA)")
-        return Response({"status": "seeded", "count": len(seeded), "items": seeded})
-    except Exception as e:
-        return Response({"error": str(e), "seeded_so_far": seeded}, status=500)
+    if not seeded:
+        raise RuntimeError("openFDA labels unavailable: " + ", ".join(missing))
+    # content-derived ids: seeding the same labels again embeds nothing
+    upserted = _vault_upsert_many(docs)
+    counts = {key: sum(c[key] for _, c in upserted) for key in ("chunks", "new", "updated", "unchanged")}
+    job.update(docs=len(seeded), chunks=counts["chunks"], bytes=sum(len(t.encode("utf-8")) for t, _, _ in docs))
+    return {"count": len(seeded), "items": seeded, "missing": missing, **counts}
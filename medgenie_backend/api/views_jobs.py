@@ -0,0 +1,34 @@
+# medgenie_backend/api/views_jobs.py
+import queue
+
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from .jobs import JOBS
+
+
+def submit_job(kind: str, fn, **kwargs):
+    """Queues `fn(job, **kwargs)` and answers 202 with the job id (429 when the queue is full)."""
+    try:
+        job = JOBS.submit(kind, fn, **kwargs)
+    except queue.Full:
+        return Response({"error": "job queue is full, retry later", "jobs": JOBS.stats()}, status=429)
+    return Response(
+        {"status": "queued", "job_id": job.id, "status_url": f"/api/jobs/{job.id}/"},
+        status=202,
+    )
+
+
+@api_view(["GET"])
+def job_list(request):
+    return Response({"jobs": [j.as_dict() for j in JOBS.list()], **JOBS.stats()})
+
+
+@api_view(["GET", "DELETE"])
+def job_detail(request, job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return Response({"error": "job not found"}, status=404)
+    if request.method == "DELETE":
+        job.cancel()
+    return Response(job.as_dict())
@@ -1,29 +1,29 @@
-import os
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from groq import Groq
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 
 from medgenie_backend.cyborg_client import get_medical_index  # your helper
+from .async_api import async_api_view
+from .llm import acomplete
+from .utils import generate_embedding, generate_embeddings
 
-@api_view(["POST"])
-def cyborg_ask(request):
+@async_api_view(["POST"])
+async def cyborg_ask(request):
     question = (request.data.get("question") or "").strip()
     top_k = int(request.data.get("top_k") or 5)
 
     if not question:
-        return Response({"error": "question is required"}, status=400)
+        return JsonResponse({"error": "question is required"}, status=400)
 
     try:
         # 1) Retrieve from Cyborg
-        index = get_medical_index()
-        results = index.search(query=question, top_k=top_k)  # adapt to your SDK method
+        index = get_medical_index(embedding_fn=generate_embedding, batch_embedding_fn=generate_embeddings)
+        results = (await sync_to_async(index.query, thread_sensitive=False)(question, top_k=top_k))[0]
 
-        # results should include docs/snippets + metadata
         # Normalize to a list of {text, metadata}
         hits = []
-        for r in results.get("results", results):  # flexible
+        for r in results:
             hits.append({
-                "text": r.get("text") or r.get("document") or "",
+                "text": r.get("contents") or "",
                 "metadata": r.get("metadata") or {}
             })
 
@@ -39,7 +39,6 @@ def cyborg_ask(request):
         context = "\n\n".join(context_blocks) if context_blocks else "No matching records found."
 
         # 2) Ask Groq using retrieved context
-        client = Groq()  # reads GROQ_API_KEY from env
         prompt = f"""
 You are MedGenie, a clinical assistant.
 Use ONLY the provided context. If context is insufficient, say so.
@@ -55,16 +54,14 @@ Return:
 2) Citations as [DOC #] references
 """
 
-        completion = client.chat.completions.create(
-            model=request.data.get("model") or "qwen/qwen3-32b",
-            messages=[{"role": "user", "content": prompt}],
+        answer = await acomplete(  # reads GROQ_API_KEY from env
+            request.data.get("model") or "qwen/qwen3-32b",
+            [{"role": "user", "content": prompt}],
             temperature=0.3,
             max_completion_tokens=800,
             top_p=0.95,
         )
-
-        answer = completion.choices[0].message.content
-        return Response({"answer": answer, "hits": hits})
+        return JsonResponse({"answer": answer, "hits": hits})
 
     except Exception as e:
-        return Response({"error": str(e)}, status=500)
+        return JsonResponse({"error": str(e)}, status=500)
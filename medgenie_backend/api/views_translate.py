@@ -1,22 +1,19 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from groq import Groq
-import os
+from django.http import JsonResponse
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from .async_api import async_api_view
+from .llm import acomplete
 
-@api_view(["POST"])
-def translate_handler(request):
+
+@async_api_view(["POST"])
+async def translate_handler(request):
     text = request.data.get("text", "")
     target = request.data.get("lang", "pa")   # default Punjabi
 
     prompt = f"Translate this text to {target}: {text}"
 
-    reply = client.chat.completions.create(
-        model="qwen/qwen3-32b",
-        messages=[{"role": "user", "content": prompt}]
+    result = await acomplete(
+        "qwen/qwen3-32b",
+        [{"role": "user", "content": prompt}]
     )
 
-    result = reply.choices[0].message.content
-
-    return Response({"translated": result})
+    return JsonResponse({"translated": result})
@@ -0,0 +1,193 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .cyborg_client import LocalVectorIndex, _top_k
+
+
+# ------------------------------------------------------------
+# IVF (inverted file) approximate index
+# ------------------------------------------------------------
+class IVFVectorIndex(LocalVectorIndex):
+    """
+    Inverted-file ANN index on top of LocalVectorIndex storage.
+
+    Rows are partitioned by spherical k-means into `nlist` lists; a query
+    scores only the rows in its `nprobe` closest lists. Until `min_train`
+    rows exist (or after filters leave only a small candidate set) the
+    search is exact. New rows are assigned to their closest centroid on
+    upsert, and the centroids are retrained once the index has grown by
+    `retrain_factor` since the last training.
+    """
+
+    def __init__(
+        self,
+        embedding_fn,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        min_train: int = 2048,
+        retrain_factor: float = 4.0,
+        **kwargs,
+    ):
+        self.nlist = nlist
+        self.nprobe = max(1, int(nprobe))
+        self.min_train = max(1, int(min_train))
+        self.retrain_factor = retrain_factor
+        self._centroids: Optional[np.ndarray] = None  # (nlist, dim), unit length
+        # list id -> rows; append-only between (re)trainings, tombstones filtered at query time
+        self._lists: List[List[int]] = []
+        self._trained_at = 0
+        super().__init__(embedding_fn, **kwargs)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def train(self):
+        with self._lock:
+            self._train()
+            self._publish()
+
+    def _aux(self):
+        return (self._centroids, self._lists)
+
+    def _train(self):
+        live = np.flatnonzero(self._alive[: self._count])
+        if live.size == 0:
+            return
+        nlist = self.nlist or max(1, int(np.sqrt(live.size)))
+        nlist = min(nlist, live.size)
+        unit = self._vectors[live] / self._norms[live, None]
+        self._centroids = _spherical_kmeans(unit, nlist)
+        self._lists = self._assign_lists(live, unit)
+        self._trained_at = live.size
+
+    def _assign_lists(self, live: np.ndarray, unit: np.ndarray) -> List[List[int]]:
+        # fresh lists object: published snapshots keep the old assignment
+        lists: List[List[int]] = [[] for _ in range(self._centroids.shape[0])]
+        for row, c in zip(live.tolist(), _nearest(unit, self._centroids).tolist()):
+            lists[c].append(row)
+        return lists
+
+    def _reset(self):
+        super()._reset()
+        self._centroids = None
+        self._lists = []
+        self._trained_at = 0
+
+    def _after_upsert(self, rows: List[int]):
+        if self._centroids is None:
+            if self._count - self._dead >= self.min_train:
+                self._train()
+            return
+        if self._count - self._dead >= self._trained_at * self.retrain_factor:
+            self._train()
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        unit = self._vectors[rows] / self._norms[rows, None]
+        for row, c in zip(rows.tolist(), _nearest(unit, self._centroids).tolist()):
+            self._lists[c].append(row)
+
+    def _after_compact(self):
+        # Rows were renumbered; keep the centroids and rebuild the lists.
+        if self._centroids is None:
+            return
+        live = np.arange(self._count)
+        self._lists = self._assign_lists(live, self._vectors[live] / self._norms[live, None])
+
+    def _search(self, snap, Q, qnorms, rows, k, nprobe: Optional[int] = None, **search_params):
+        centroids, lists = snap.aux
+        # Exact when untrained, or when a filter already narrowed things down
+        # to fewer rows than a probe would visit anyway.
+        if centroids is None or (rows is not None and rows.size <= k * 64):
+            return self._exact(snap, Q, qnorms, rows, k)
+
+        n = snap.count
+        nprobe = min(max(1, int(nprobe or self.nprobe)), len(lists))
+        coarse = (Q / qnorms[:, None]) @ centroids.T  # (b, nlist)
+        out = []
+        for b in range(Q.shape[0]):
+            probe = _top_k(-coarse[b], nprobe)
+            cand = np.concatenate([np.array(lists[c], dtype=np.int64) for c in probe.tolist()])
+            cand = cand[cand < n]
+            if snap.dead:
+                cand = cand[snap.alive[cand]]
+            if rows is not None:
+                cand = np.intersect1d(cand, rows)
+            if cand.size < k:
+                # Probed lists are too thin to fill top_k: fall back to exact.
+                cand = rows
+            out.extend(self._exact(snap, Q[b : b + 1], qnorms[b : b + 1], cand, k))
+        return out
+
+
+def _nearest(unit: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    """Closest centroid (by dot product) for each row, computed in blocks."""
+    out = np.empty(unit.shape[0], dtype=np.int64)
+    for start in range(0, unit.shape[0], block):
+        out[start : start + block] = np.argmax(unit[start : start + block] @ centroids.T, axis=1)
+    return out
+
+
+def _spherical_kmeans(unit: np.ndarray, k: int, iters: int = 10, max_train: int = 256, seed: int = 0) -> np.ndarray:
+    """k-means on unit vectors (cosine), trained on a sample of at most max_train*k rows."""
+    rng = np.random.default_rng(seed)
+    sample = unit
+    if unit.shape[0] > max_train * k:
+        sample = unit[rng.choice(unit.shape[0], max_train * k, replace=False)]
+    centroids = sample[rng.choice(sample.shape[0], k, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty clusters from random points
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+# ------------------------------------------------------------
+# Recall vs latency against the exact index
+# ------------------------------------------------------------
+def recall_report(
+    exact: LocalVectorIndex,
+    ann: LocalVectorIndex,
+    qvecs: List[List[float]],
+    top_k: int = 10,
+    nprobes: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    For each nprobe setting, returns mean recall@top_k of `ann` against
+    `exact` over `qvecs`, plus per-query latency (ms) for both.
+    """
+    include = ["distance"]
+
+    t0 = time.perf_counter()
+    truth = [exact.search_vectors([q], top_k=top_k, include=include)[0] for q in qvecs]
+    exact_ms = (time.perf_counter() - t0) * 1000.0 / max(1, len(qvecs))
+    truth_ids = [{h["id"] for h in hits} for hits in truth]
+
+    rows = []
+    for nprobe in nprobes or [getattr(ann, "nprobe", 1)]:
+        t0 = time.perf_counter()
+        got = [ann.search_vectors([q], top_k=top_k, include=include, nprobe=nprobe)[0] for q in qvecs]
+        ann_ms = (time.perf_counter() - t0) * 1000.0 / max(1, len(qvecs))
+        recall = [
+            len(want & {h["id"] for h in hits}) / max(1, len(want))
+            for want, hits in zip(truth_ids, got)
+        ]
+        rows.append({
+            "nprobe": nprobe,
+            "recall": float(np.mean(recall)) if recall else 0.0,
+            "ann_ms": ann_ms,
+            "exact_ms": exact_ms,
+            "speedup": exact_ms / ann_ms if ann_ms else 0.0,
+        })
+    return rows
@@ -1,92 +1,662 @@
-import math
+import logging
 import os
 import threading
-from typing import Any, Dict, List, Optional
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .lexical_index import LexicalIndex, rrf
+from .metadata_index import MetadataIndex
+from .record_columns import RecordColumns
+from .vector_store import SegmentStore
+
+logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------------
 # Local in-memory fallback index (works even if cyborgdb fails)
 # ------------------------------------------------------------
+class _Snapshot:
+    """
+    Immutable view of the index that readers work from without locking.
+    Writers never touch rows < count of a published snapshot: new rows go
+    past the end, overwrites are tombstone + append, and the alive mask,
+    range lists and (on compaction) whole buffers are copied before being
+    changed. Posting lists are append-only, so rows >= count are ignored.
+    """
+
+    __slots__ = ("count", "dead", "vectors", "norms", "alive", "records", "meta", "lexical", "aux")
+
+    def __init__(
+        self, count=0, dead=0, vectors=None, norms=None, alive=None, records=None, meta=None, lexical=None, aux=None
+    ):
+        self.count = count
+        self.dead = dead
+        self.vectors = vectors
+        self.norms = norms
+        self.alive = alive
+        self.records = records
+        self.meta = meta
+        self.lexical = lexical  # BM25 postings, or None when disabled
+        self.aux = aux  # subclass state (e.g. IVF centroids + lists)
+
+
 class LocalVectorIndex:
-    def __init__(self, embedding_fn):
+    """
+    Brute-force cosine index. Vectors live in one contiguous float32 matrix
+    (grown by doubling) with their norms precomputed, so a query is a single
+    matrix-vector product plus a partial top-k selection.
+
+    Queries run lock-free against the last published _Snapshot; writers
+    serialise on self._lock, append past the snapshot's end and publish a
+    new snapshot when done, so a slow write never stalls readers.
+
+    With a SegmentStore the matrix and norms are memory-mapped files and
+    every write is logged, so a restart maps the vectors back instead of
+    re-embedding anything. Several processes may share one store: writes
+    take the store's file lock after catching up with the log, and queries
+    first replay whatever other processes appended since (see refresh()).
+    """
+
+    def __init__(
+        self,
+        embedding_fn,
+        dim: Optional[int] = None,
+        batch_embedding_fn=None,
+        initial_capacity: int = 1024,
+        compact_ratio: float = 0.25,
+        compact_min: int = 256,
+        store: Optional[SegmentStore] = None,
+        lexical: bool = True,
+    ):
         self.embedding_fn = embedding_fn
-        self._lock = threading.Lock()
-        self._items: List[Dict[str, Any]] = []
+        # optional texts -> (n, dim) matrix; lets query_batch embed all queries in one call
+        self.batch_embedding_fn = batch_embedding_fn
+        self._lock = threading.Lock()  # writers only
+        self._dim = dim
+        self._capacity = max(1, int(initial_capacity))
+        self._count = 0  # rows in use, tombstones included
+        self._dead = 0  # tombstoned rows awaiting compaction
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim) float32
+        self._norms: Optional[np.ndarray] = None  # (capacity,) float32
+        self._alive: Optional[np.ndarray] = None  # (capacity,) bool
+        # row i of the matrix <-> record i (id, contents, metadata), stored by column
+        self._records = RecordColumns(self._capacity)
+        self._slots: Dict[str, int] = {}  # id -> live row
+        self._meta = MetadataIndex()
+        self._lexical = LexicalIndex() if lexical else None  # BM25 over contents, same rows
+        self._store = store
+        self._store_gen: Optional[int] = None  # store generation last caught up with
+        self._listeners: List[Callable[[List[str]], Any]] = []  # see on_change()
+        self._snap = _Snapshot(records=self._records, meta=self._meta, lexical=self._lexical)
+        if store is not None:
+            with self._writing():
+                self._maybe_compact()
+                self._publish()
+
+    def __len__(self):
+        self.refresh()
+        snap = self._snap
+        return snap.count - snap.dead
+
+    def __contains__(self, id_: str):
+        self.refresh()
+        return id_ in self._slots
+
+    def _publish(self):
+        """Makes the writer's current state visible to readers. Caller holds the lock."""
+        self._snap = _Snapshot(
+            count=self._count,
+            dead=self._dead,
+            vectors=self._vectors,
+            norms=self._norms,
+            alive=self._alive,
+            records=self._records,
+            meta=self._meta,
+            lexical=self._lexical,
+            aux=self._aux(),
+        )
+
+    def _aux(self):
+        """Hook: extra reader state for subclasses. Caller holds the lock."""
+        return None
+
+    # ---------- persistence / other processes ----------
+    def refresh(self) -> bool:
+        """
+        Catches up with writes other processes made to the shared store.
+        Costs one read of the store's generation counter when nothing changed.
+        """
+        store = self._store
+        if store is None or store.generation() == self._store_gen:
+            return False
+        # shared: writers (and compaction's file swap) wait until we have read
+        with self._lock, store.locked(shared=True):
+            self._sync_store()
+        return True
+
+    @contextmanager
+    def _writing(self):
+        """
+        Writer section: the in-process lock plus, with a store, its file lock,
+        after replaying anything other processes wrote. Announces the write
+        to them afterwards if the log or generation moved.
+        """
+        with self._lock:
+            store = self._store
+            if store is None:
+                yield
+                return
+            with store.locked():
+                self._sync_store()
+                store.truncate_torn_tail()
+                before = store.position()
+                try:
+                    yield
+                finally:
+                    if store.position() != before:
+                        self._store_gen = store.bump()
+
+    def _sync_store(self):
+        """Applies store changes made elsewhere and publishes them. Caller holds the lock."""
+        store = self._store
+        gen = store.generation()
+        if gen == self._store_gen:
+            return
+        if store.is_stale():
+            # first load, or another process compacted into a new generation
+            self._reset()
+            self._load_store()
+        else:
+            entries, maps = store.read_new()
+            if maps is not None:
+                alive = np.zeros(maps[0].shape[0], dtype=bool)
+                alive[: self._count] = self._alive[: self._count]
+                self._vectors, self._norms, self._alive = maps[0], maps[1], alive
+                self._capacity = alive.shape[0]
+            self._replay(entries)
+        self._store_gen = gen
+        self._publish()
+
+    def _reset(self):
+        """Drops all rows (before reloading from the store). Caller holds the lock."""
+        self._count = self._dead = 0
+        self._vectors = self._norms = self._alive = None
+        self._records = RecordColumns(self._capacity)
+        self._slots = {}
+        self._meta = MetadataIndex(self._meta.fields, self._meta.range_fields)
+        if self._lexical is not None:
+            self._lexical = LexicalIndex(self._lexical.k1, self._lexical.b)
+
+    def _load_store(self):
+        """Maps the persisted vectors and replays the record log. Caller holds the lock."""
+        loaded = self._store.load()
+        if loaded is None:
+            return
+        self._dim, self._capacity = loaded["dim"], loaded["capacity"]
+        self._vectors, self._norms = loaded["vectors"], loaded["norms"]
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._replay(loaded["entries"])
+
+    def _replay(self, entries: List[Dict[str, Any]]):
+        """Applies logged puts/deletes whose vectors are already in the maps. Caller holds the lock."""
+        if not entries:
+            return
+        # copy-on-write, like _tombstone
+        alive = np.zeros(self._capacity, dtype=bool)
+        alive[: self._count] = self._alive[: self._count]
+        start, dead, added, texts = self._count, [], [], []
+        for entry in entries:
+            old = self._slots.pop(entry["id"], None)
+            if old is not None:
+                alive[old] = False
+                dead.append(old)
+            if entry["op"] != "put":
+                continue
+            metadata = entry.get("metadata") or {}
+            row = self._records.append(entry["id"], entry.get("contents", ""), metadata)
+            self._slots[entry["id"]] = row
+            alive[row] = True
+            added.append((row, metadata))
+            texts.append(entry.get("contents", ""))
+        self._alive = alive
+        self._count = len(self._records)
+        self._dead += len(dead)
+        self._meta.add_batch(added)
+        if self._lexical is not None:
+            # add first: a row can be put and deleted within the same entries
+            self._lexical.add([row for row, _ in added], texts)
+            self._lexical.remove(dead, [self._records.contents(row) for row in dead])
+        if dead:
+            self._after_delete(dead)
+        if self._count > start:
+            self._after_upsert(list(range(start, self._count)))
+
+    def _ensure_capacity(self, needed: int):
+        if self._vectors is None:
+            cap = max(self._capacity, needed)
+            if self._store is not None:
+                self._vectors, self._norms = self._store.create(self._dim, cap)
+            else:
+                self._vectors = np.zeros((cap, self._dim), dtype=np.float32)
+                self._norms = np.zeros(cap, dtype=np.float32)
+            self._alive = np.zeros(cap, dtype=bool)
+            self._capacity = cap
+            return
+        if needed <= self._capacity:
+            return
+        cap = self._capacity
+        while cap < needed:
+            cap *= 2
+        # fresh buffers: published snapshots keep reading the old ones
+        if self._store is not None:
+            # the files only grow, so the new maps already hold rows [:count]
+            vectors, norms = self._store.grow(cap)
+        else:
+            vectors = np.zeros((cap, self._dim), dtype=np.float32)
+            vectors[: self._count] = self._vectors[: self._count]
+            norms = np.zeros(cap, dtype=np.float32)
+            norms[: self._count] = self._norms[: self._count]
+        alive = np.zeros(cap, dtype=bool)
+        alive[: self._count] = self._alive[: self._count]
+        self._vectors, self._norms, self._alive, self._capacity = vectors, norms, alive, cap
 
     def upsert(self, items: List[Dict[str, Any]]):
         # items: [{id, vector, contents, metadata}]
-        with self._lock:
-            existing = {it["id"]: i for i, it in enumerate(self._items)}
-            for it in items:
-                if it["id"] in existing:
-                    self._items[existing[it["id"]]] = it
-                else:
-                    self._items.append(it)
+        # Cost is O(len(items)): ids resolve through the persistent id -> row map.
+        if not items:
+            return
+        with self._writing():
+            if self._dim is None:
+                first = items[0].get("vector")
+                self._dim = (len(first) if first is not None else 0) or 1
+
+            # last write of an id within the batch wins
+            latest = {it["id"]: it for it in items}
+            self._ensure_capacity(self._count + len(latest))
+
+            changed = [id_ for id_ in latest if id_ in self._slots]
+            if changed:
+                self._tombstone([self._slots[id_] for id_ in changed])
+
+            start = self._count
+            added, records = [], []
+            for it in latest.values():
+                record = {
+                    "id": it["id"],
+                    "contents": it.get("contents", ""),
+                    "metadata": it.get("metadata") or {},
+                }
+                row = self._records.append(record["id"], record["contents"], record["metadata"])
+                self._slots[record["id"]] = row
+                records.append(record)
+                added.append((row, record["metadata"]))
+
+            vecs = np.stack([_fit(it.get("vector"), self._dim) for it in latest.values()])
+            end = start + vecs.shape[0]
+            self._vectors[start:end] = vecs
+            norms = np.linalg.norm(vecs, axis=1)
+            norms[norms == 0] = 1.0
+            self._norms[start:end] = norms
+            self._alive[start:end] = True
+            self._count = end
+            self._meta.add_batch(added)
+            if self._lexical is not None:
+                self._lexical.add(list(range(start, end)), [r["contents"] for r in records])
+            if self._store is not None:
+                self._store.commit(self._vectors, self._norms, records)
+
+            self._after_upsert(list(range(start, end)))
+            self._maybe_compact()
+            self._publish()
+        self._notify(changed)
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstones the given ids; returns how many were present."""
+        with self._writing():
+            gone = [id_ for id_ in dict.fromkeys(ids) if id_ in self._slots]
+            rows = [self._slots.pop(id_) for id_ in gone]
+            if rows:
+                if self._store is not None:
+                    self._store.log_deletes(gone)
+                self._tombstone(rows)
+                self._maybe_compact()
+                self._publish()
+        self._notify(gone)
+        return len(rows)
+
+    def on_change(self, fn: Callable[[List[str]], Any]):
+        """
+        Calls fn(ids) after each write that replaced or deleted existing
+        ids (e.g. to drop caches built on them). Runs in the writing thread,
+        after the write is published. Writes replayed from other processes
+        are not reported.
+        """
+        self._listeners.append(fn)
+
+    def _notify(self, ids: List[str]):
+        if not ids:
+            return
+        for fn in self._listeners:
+            try:
+                fn(ids)
+            except Exception as e:
+                logger.warning("Index change listener failed: %s", e)
+
+    def _tombstone(self, rows: List[int]):
+        # copy-on-write: readers may be scanning the published mask
+        self._alive = self._alive.copy()
+        self._alive[rows] = False
+        self._dead += len(rows)
+        if self._lexical is not None:
+            self._lexical.remove(rows, [self._records.contents(row) for row in rows])
+        self._after_delete(rows)
+
+    def _maybe_compact(self):
+        if self._dead >= self.compact_min and self._dead >= self.compact_ratio * self._count:
+            self._compact()
+
+    def compact(self):
+        """Drops tombstoned rows and renumbers the survivors."""
+        with self._writing():
+            self._compact()
+            self._publish()
+
+    def _compact(self):
+        if not self._dead:
+            return
+        keep = np.flatnonzero(self._alive[: self._count])
+        m = keep.shape[0]
+        cap = max(self._capacity // 2, m, 1) if m < self._capacity // 4 else self._capacity
+        records = self._records.take(keep.tolist())
+        if self._store is not None:
+            vectors, norms = self._store.rewrite(
+                self._dim, cap, self._vectors[keep], self._norms[keep], records.records(0, m)
+            )
+        else:
+            vectors = np.zeros((cap, self._dim), dtype=np.float32)
+            vectors[:m] = self._vectors[keep]
+            norms = np.zeros(cap, dtype=np.float32)
+            norms[:m] = self._norms[keep]
+        alive = np.zeros(cap, dtype=bool)
+        alive[:m] = True
+        self._vectors, self._norms, self._alive, self._capacity = vectors, norms, alive, cap
+        self._records = records
+        self._slots = {id_: row for row, id_ in enumerate(records.ids)}
+        self._meta = MetadataIndex(self._meta.fields, self._meta.range_fields)
+        self._meta.add_batch([(row, records.metadata(row)) for row in range(m)])
+        if self._lexical is not None:
+            self._lexical = LexicalIndex(self._lexical.k1, self._lexical.b)
+            self._lexical.add(list(range(m)), [records.contents(row) for row in range(m)])
+        self._count, self._dead = m, 0
+        self._after_compact()
+
+    def _after_upsert(self, rows: List[int]):
+        """Hook: `rows` were appended. Caller holds the lock."""
+
+    def _after_delete(self, rows: List[int]):
+        """Hook: `rows` were tombstoned. Caller holds the lock."""
+
+    def _after_compact(self):
+        """Hook: rows were renumbered by compaction. Caller holds the lock."""
+
+    @property
+    def search_modes(self) -> tuple:
+        """query_batch modes this index can serve (lexical/hybrid need the BM25 index)."""
+        return ("vector", "lexical", "hybrid") if self._lexical is not None else ("vector",)
+
+    def ids(self, filters: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Ids of the live records matching `filters` (all of them without)."""
+        self.refresh()
+        snap = self._snap
+        rows = self._filter_rows(snap, filters)
+        if rows is None:
+            rows = np.flatnonzero(snap.alive[: snap.count])
+        return [snap.records.ids[r] for r in rows]
+
+    def get(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """{id: {"vector", "contents", "metadata"}} for those of `ids` that are indexed."""
+        self.refresh()
+        snap = self._snap
+        out = {}
+        for id_ in ids:
+            row = self._slots.get(id_)
+            # the writer's slots may be ahead of (or renumbered past) the snapshot
+            if row is None or row >= snap.count or not snap.alive[row] or snap.records.ids[row] != id_:
+                continue
+            out[id_] = {"vector": snap.vectors[row].tolist(), **_format_hit(None, snap.records, row, ["metadata", "contents"])}
+        return out
 
     def query(
         self,
-        query_contents: str,
+        query_contents,
         top_k: int = 5,
         filters: Optional[Dict[str, Any]] = None,
         include: Optional[List[str]] = None,
+        **search_params,
     ):
+        """
+        query_contents may be a single string or a list of strings; either
+        way the result is batched: one hit list per query.
+        """
+        queries = [query_contents] if isinstance(query_contents, str) else list(query_contents)
+        return self.query_batch(queries, top_k=top_k, filters=filters, include=include, **search_params)
+
+    def query_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        mode: str = "vector",
+        **search_params,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Scores every query in one matrix-matrix product; returns [[hits], ...].
+        mode "lexical" ranks by BM25 instead, "hybrid" fuses both (see search_hybrid).
+        """
+        if not queries:
+            return []
+        if mode == "lexical":
+            return self.search_text(queries, top_k=top_k, filters=filters, include=include)
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown search mode: {mode!r}")
+        if self.batch_embedding_fn is not None:
+            qvecs = self.batch_embedding_fn(queries)
+        else:
+            qvecs = [self.embedding_fn(q) for q in queries]
+        if mode == "hybrid":
+            return self.search_hybrid(queries, qvecs, top_k=top_k, filters=filters, include=include, **search_params)
+        return self.search_vectors(qvecs, top_k=top_k, filters=filters, include=include, **search_params)
+
+    def search_vectors(
+        self,
+        qvecs: List[List[float]],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        **search_params,
+    ) -> List[List[Dict[str, Any]]]:
+        """Same as query_batch, for callers that already hold query embeddings."""
+        include = include or ["distance", "metadata", "contents"]
+        if len(qvecs) == 0:
+            return []
+
+        self.refresh()
+        snap = self._snap
+        rows = self._filter_rows(snap, filters)
+        if rows is not None and rows.size == 0:
+            return [[] for _ in qvecs]
+        found = self._vector_rows(snap, qvecs, rows, max(1, int(top_k)), **search_params)
+        return [[_format_hit(dist, snap.records, row, include) for dist, row in hits] for hits in found]
+
+    def search_text(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """BM25 over the chunk contents; hits carry "score" instead of "distance"."""
+        include = include or ["distance", "metadata", "contents"]
+        if not queries:
+            return []
+        self.refresh()
+        snap = self._snap
+        rows = self._filter_rows(snap, filters)
+        if rows is not None and rows.size == 0:
+            return [[] for _ in queries]
+        found = self._text_rows(snap, queries, rows, max(1, int(top_k)))
+        return [
+            [{"score": score, **_format_hit(None, snap.records, row, include, distance=False)} for score, row in hits]
+            for hits in found
+        ]
+
+    def search_hybrid(
+        self,
+        queries: List[str],
+        qvecs: List[List[float]],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        depth: Optional[int] = None,
+        rrf_k: int = 60,
+        **search_params,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Vector and BM25 rankings (each `depth` deep, default HYBRID_DEPTH x
+        top_k) fused by reciprocal rank. Hits carry the fused "score", plus
+        "distance" and "bm25" from whichever rankings they appeared in.
+        """
         include = include or ["distance", "metadata", "contents"]
+        if len(qvecs) == 0:
+            return []
+        k = max(1, int(top_k))
+        depth = max(k, int(depth or k * HYBRID_DEPTH))
+        self.refresh()
+        snap = self._snap
+        rows = self._filter_rows(snap, filters)
+        if rows is not None and rows.size == 0:
+            return [[] for _ in qvecs]
+        dense = self._vector_rows(snap, qvecs, rows, depth, **search_params)
+        sparse = self._text_rows(snap, queries, rows, depth)
 
-        qvec = self.embedding_fn(query_contents)
-        qnorm = _norm(qvec) or 1.0
+        out = []
+        for vec_hits, text_hits in zip(dense, sparse):
+            dist = {row: d for d, row in vec_hits}
+            bm25 = {row: s for s, row in text_hits}
+            hits = []
+            for score, row in rrf([[r for _, r in vec_hits], [r for _, r in text_hits]], k, rrf_k):
+                hit = {"score": score, **_format_hit(dist.get(row), snap.records, row, include)}
+                if row in bm25:
+                    hit["bm25"] = bm25[row]
+                hits.append(hit)
+            out.append(hits)
+        return out
 
-        def match_filters(meta: Dict[str, Any]) -> bool:
-            if not filters:
-                return True
-            for k, v in filters.items():
-                if meta.get(k) != v:
-                    return False
-            return True
+    def _filter_rows(self, snap: _Snapshot, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Live rows matching `filters`, None for "all rows" (tombstones still to be masked)."""
+        n = snap.count
+        if n == snap.dead:
+            return np.empty(0, dtype=np.int64)
+        if not filters:
+            return None
+        rows = snap.meta.select(filters, n, snap.records.select)
+        if snap.dead:
+            rows = rows[snap.alive[rows]]
+        return rows
 
-        scored = []
-        with self._lock:
-            for it in self._items:
-                meta = it.get("metadata") or {}
-                if not match_filters(meta):
-                    continue
-                vec = it.get("vector") or []
-                sim = _cos_sim(qvec, vec, qnorm=qnorm)
-                # distance like "1 - similarity"
-                dist = 1.0 - sim
-                scored.append((dist, it))
-
-        scored.sort(key=lambda x: x[0])
-        hits = []
-        for dist, it in scored[: max(1, top_k)]:
-            out = {}
-            if "distance" in include:
-                out["distance"] = dist
-            if "metadata" in include:
-                out["metadata"] = it.get("metadata") or {}
-            if "contents" in include:
-                out["contents"] = it.get("contents", "")
-            if "id" in it:
-                out["id"] = it["id"]
-            hits.append(out)
-
-        # Return in the same “batched list” shape your code expects
-        return [hits]
+    def _vector_rows(self, snap: _Snapshot, qvecs, rows: Optional[np.ndarray], k: int, **search_params):
+        dim = snap.vectors.shape[1]
+        Q = np.stack([_fit(v, dim) for v in qvecs])  # (b, dim)
+        qnorms = np.array([_norm(v) or 1.0 for v in qvecs], dtype=np.float32)
+        return self._search(snap, Q, qnorms, rows, k, **search_params)
 
+    def _text_rows(self, snap: _Snapshot, queries: List[str], rows: Optional[np.ndarray], k: int):
+        if snap.lexical is None:
+            raise ValueError("this index was built without a lexical (BM25) index")
+        n = snap.count
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(n, dtype=bool)
+            allowed[rows] = True
+        elif snap.dead:
+            allowed = snap.alive[:n]
+        return snap.lexical.search(queries, n, k, allowed)
 
-def _norm(v: List[float]) -> float:
-    return math.sqrt(sum((x * x) for x in v)) if v else 0.0
+    def _search(self, snap: _Snapshot, Q: np.ndarray, qnorms: np.ndarray, rows: Optional[np.ndarray], k: int, **search_params):
+        """
+        Exact scan over `rows` (all live rows when None). Returns, per query,
+        [(distance, row), ...] ascending.
+        """
+        return self._exact(snap, Q, qnorms, rows, k)
 
+    @staticmethod
+    def _exact(snap: _Snapshot, Q, qnorms, rows, k):
+        alive = snap.alive[: snap.count] if snap.dead else None
+        return _exact_search(snap.vectors, snap.norms, snap.count, Q, qnorms, rows, k, alive=alive)
 
-def _cos_sim(a: List[float], b: List[float], qnorm: Optional[float] = None) -> float:
-    if not a or not b:
-        return 0.0
-    n = min(len(a), len(b))
-    dot = 0.0
-    bnorm = 0.0
-    for i in range(n):
-        dot += a[i] * b[i]
-        bnorm += b[i] * b[i]
-    denom = (qnorm or _norm(a)) * (math.sqrt(bnorm) or 1.0)
-    return dot / denom if denom else 0.0
+
+def _exact_search(vectors, norms, n, Q, qnorms, rows, k, alive=None):
+    """`alive` (bool[n]) masks tombstones when scanning all rows (rows=None)."""
+    if rows is None:
+        vectors, norms = vectors[:n], norms[:n]
+    else:
+        vectors, norms = vectors[rows], norms[rows]
+
+    # (m, b) similarities; distance like "1 - similarity"
+    dists = 1.0 - (vectors @ Q.T) / (norms[:, None] * qnorms[None, :])
+    if rows is None and alive is not None:
+        dists[~alive] = np.inf
+    out = []
+    for b in range(Q.shape[0]):
+        col = dists[:, b]
+        order = _top_k(col, k)
+        out.append([
+            (float(col[j]), int(rows[j]) if rows is not None else int(j))
+            for j in order
+            if col[j] != np.inf
+        ])
+    return out
+
+
+def _format_hit(dist: Optional[float], records: RecordColumns, row: int, include: List[str], distance: bool = True) -> Dict[str, Any]:
+    out = {}
+    if distance and "distance" in include:
+        out["distance"] = dist
+    if "metadata" in include:
+        out["metadata"] = records.metadata(row)
+    if "contents" in include:
+        out["contents"] = records.contents(row)
+    out["id"] = records.ids[row]
+    return out
+
+
+def _fit(v, dim: int) -> np.ndarray:
+    """Coerce a vector to float32[dim], truncating or zero-padding as needed."""
+    arr = np.asarray(v if v is not None else [], dtype=np.float32).ravel()
+    if arr.shape[0] == dim:
+        return arr
+    out = np.zeros(dim, dtype=np.float32)
+    n = min(dim, arr.shape[0])
+    out[:n] = arr[:n]
+    return out
+
+
+def _top_k(dists: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest distances, ascending (ties keep insertion order)."""
+    k = min(k, dists.shape[0])
+    if k < dists.shape[0]:
+        idx = np.argpartition(dists, k - 1)[:k]
+    else:
+        idx = np.arange(dists.shape[0])
+    return idx[np.lexsort((idx, dists[idx]))]
+
+
+def _norm(v: List[float]) -> float:
+    return float(np.linalg.norm(np.asarray(v, dtype=np.float32))) if v is not None and len(v) else 0.0
 
 
 # ------------------------------------------------------------
@@ -95,13 +665,95 @@ def _cos_sim(a: List[float], b: List[float], qnorm: Optional[float] = None) -> f
 _MEDICAL_INDEX = None
 _MEDICAL_INDEX_LOCK = threading.Lock()
 
-def get_medical_index(embedding_fn):
+# "exact" (brute force), "ivf" (approximate, see ann_index.py), or "sq8" / "pq"
+# (compressed codes + exact re-ranking, see quant_index.py)
+INDEX_BACKEND = os.getenv("MEDGENIE_INDEX_BACKEND", "exact").strip().lower()
+IVF_NLIST = int(os.getenv("MEDGENIE_IVF_NLIST", "0")) or None  # default: sqrt(N) at train time
+IVF_NPROBE = int(os.getenv("MEDGENIE_IVF_NPROBE", "8"))
+PQ_M = int(os.getenv("MEDGENIE_PQ_M", "48"))  # bytes per vector with "pq"
+QUANT_RERANK = int(os.getenv("MEDGENIE_QUANT_RERANK", "32"))  # shortlist = rerank x top_k
+# BM25 postings next to the vectors, for search mode "lexical" / "hybrid"
+LEXICAL = os.getenv("MEDGENIE_LEXICAL", "1").strip().lower() not in ("0", "false", "no")
+HYBRID_DEPTH = int(os.getenv("MEDGENIE_HYBRID_DEPTH", "4"))  # each ranking is depth x top_k deep before fusion
+# When set, named indexes persist under <dir>/<name> (see vector_store.py)
+INDEX_DIR = os.getenv("MEDGENIE_INDEX_DIR", "").strip() or None
+
+
+def create_index(embedding_fn, backend: Optional[str] = None, batch_embedding_fn=None, name: Optional[str] = None):
+    """
+    Builds an index for the configured backend. With MEDGENIE_INDEX_DIR set
+    and a `name`, the index is backed by <dir>/<name> and reloads from it.
+    """
+    backend = (backend or INDEX_BACKEND)
+    store = SegmentStore(os.path.join(INDEX_DIR, name)) if (INDEX_DIR and name) else None
+    if backend == "ivf":
+        from .ann_index import IVFVectorIndex
+
+        return IVFVectorIndex(
+            embedding_fn=embedding_fn,
+            batch_embedding_fn=batch_embedding_fn,
+            nlist=IVF_NLIST,
+            nprobe=IVF_NPROBE,
+            store=store,
+            lexical=LEXICAL,
+        )
+    if backend in ("sq8", "pq"):
+        from .quant_index import QuantizedVectorIndex
+
+        if store is None:
+            raise ValueError(f"MEDGENIE_INDEX_BACKEND={backend!r} needs MEDGENIE_INDEX_DIR for the float vectors")
+        return QuantizedVectorIndex(
+            embedding_fn=embedding_fn,
+            batch_embedding_fn=batch_embedding_fn,
+            kind=backend,
+            pq_m=PQ_M,
+            rerank=QUANT_RERANK,
+            store=store,
+            lexical=LEXICAL,
+        )
+    if backend != "exact":
+        raise ValueError(f"Unknown MEDGENIE_INDEX_BACKEND: {backend!r}")
+    return LocalVectorIndex(
+        embedding_fn=embedding_fn, batch_embedding_fn=batch_embedding_fn, store=store, lexical=LEXICAL
+    )
+
+
+def get_medical_index(embedding_fn=None, batch_embedding_fn=None):
     """
-    Returns a singleton index. Today: LocalVectorIndex fallback.
-    Later: replace with real CyborgDB client index creation.
+    Returns the one index every endpoint reads and writes (the /cyborg/
+    vault, seeding, RAG), so records are stored once. Today: local index
+    (exact or IVF, see MEDGENIE_INDEX_BACKEND). Later: replace with real
+    CyborgDB client index creation.
+
+    The embedders are only needed for text queries; a caller that passes
+    them completes an index first created without (e.g. by query_vector).
     """
     global _MEDICAL_INDEX
     with _MEDICAL_INDEX_LOCK:
         if _MEDICAL_INDEX is None:
-            _MEDICAL_INDEX = LocalVectorIndex(embedding_fn=embedding_fn)
+            _MEDICAL_INDEX = create_index(
+                embedding_fn=embedding_fn, batch_embedding_fn=batch_embedding_fn, name="medical"
+            )
+        else:
+            if _MEDICAL_INDEX.embedding_fn is None:
+                _MEDICAL_INDEX.embedding_fn = embedding_fn
+            if _MEDICAL_INDEX.batch_embedding_fn is None:
+                _MEDICAL_INDEX.batch_embedding_fn = batch_embedding_fn
         return _MEDICAL_INDEX
+
+
+def upsert_items(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """items: [{id, vector, contents, metadata}] with precomputed vectors."""
+    index = get_medical_index()
+    index.upsert(items)
+    return {"upserted": len(items), "size": len(index)}
+
+
+def query_vector(
+    vector: List[float],
+    top_k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    include: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    hits = get_medical_index().search_vectors([vector], top_k=top_k, filters=filters, include=include)[0]
+    return {"results": hits}
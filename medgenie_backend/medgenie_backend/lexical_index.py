@@ -0,0 +1,209 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# same token rule as the hashing embedder, minus the apostrophes
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class _Postings:
+    """One term's (row, tf) list, ascending rows. `state` is swapped whole so readers see a consistent triple."""
+
+    __slots__ = ("state", "max_tf", "min_len", "dead")
+
+    def __init__(self):
+        self.state = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0)
+        self.max_tf = 0.0
+        self.min_len = math.inf
+        self.dead = 0  # listed rows that were removed: not counted in the term's df
+
+    def extend(self, rows: List[int], tfs: List[int], lengths: List[int]):
+        old_rows, old_tfs, n = self.state
+        m = n + len(rows)
+        if m > old_rows.shape[0]:
+            cap = max(4, old_rows.shape[0])
+            while cap < m:
+                cap *= 2
+            # fresh arrays: readers may hold the old ones
+            new_rows = np.empty(cap, dtype=np.int64)
+            new_rows[:n] = old_rows[:n]
+            new_tfs = np.empty(cap, dtype=np.float32)
+            new_tfs[:n] = old_tfs[:n]
+        else:
+            new_rows, new_tfs = old_rows, old_tfs
+        new_rows[n:m] = rows
+        new_tfs[n:m] = tfs
+        self.max_tf = max(self.max_tf, max(tfs))
+        self.min_len = min(self.min_len, min(lengths))
+        self.state = (new_rows, new_tfs, m)
+
+
+class LexicalIndex:
+    """
+    BM25 over the same rows as the vector index, built incrementally: each
+    upsert appends the new rows to their terms' posting lists (rows only
+    ever grow, so lists stay sorted). Like the other reader structures it
+    never changes rows a snapshot can see; tombstones are masked at query
+    time and dropped when the owner rebuilds it on compaction. The corpus
+    statistics (document count, average length, document frequencies)
+    cover live rows only: the owner reports tombstoned rows to remove().
+
+    Queries use MaxScore: terms are taken in decreasing order of their
+    score upper bound, and once the bounds of the remaining terms add up to
+    less than the current k-th best score, those terms' posting lists are
+    no longer walked: they only top up the scores of rows already found
+    (binary search per candidate), and candidates that can no longer make
+    the top k are dropped on the way.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._terms: Dict[str, _Postings] = {}
+        self._lengths = np.zeros(1024, dtype=np.float32)  # row -> tokens
+        self._count = 0  # rows indexed, removed ones included
+        self._docs = 0  # live rows
+        self._total = 0  # tokens over live rows
+        self.postings_scored = self.postings_skipped = 0
+
+    def __len__(self):
+        return self._docs
+
+    def add(self, rows: List[int], texts: List[str]):
+        """Indexes `texts` as `rows`; rows must be ascending and past every indexed row."""
+        if not rows:
+            return
+        end = rows[-1] + 1
+        if end > self._lengths.shape[0]:
+            cap = self._lengths.shape[0]
+            while cap < end:
+                cap *= 2
+            lengths = np.zeros(cap, dtype=np.float32)
+            lengths[: self._count] = self._lengths[: self._count]
+            self._lengths = lengths
+
+        self._docs += len(rows)
+        pending: Dict[str, Tuple[List[int], List[int], List[int]]] = {}
+        for row, text in zip(rows, texts):
+            tokens = tokenize(text)
+            self._lengths[row] = len(tokens)
+            self._total += len(tokens)
+            for term, tf in Counter(tokens).items():
+                p = pending.setdefault(term, ([], [], []))
+                p[0].append(row)
+                p[1].append(tf)
+                p[2].append(len(tokens))
+        for term, (prow, ptf, plen) in pending.items():
+            postings = self._terms.get(term)
+            if postings is None:
+                postings = self._terms[term] = _Postings()
+            postings.extend(prow, ptf, plen)
+        self._count = end
+
+    def remove(self, rows: List[int], texts: List[str]):
+        """Takes tombstoned `rows` (with the texts they were added with) out of the BM25 statistics."""
+        for row, text in zip(rows, texts):
+            self._total -= int(self._lengths[row])
+            self._docs -= 1
+            for term in set(tokenize(text)):
+                postings = self._terms.get(term)
+                if postings is not None:
+                    postings.dead += 1
+
+    def search(
+        self, queries: List[str], n: int, k: int, allowed: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[float, int]]]:
+        """
+        Per query, [(bm25, row), ...] best first, over rows < n where
+        `allowed` (bool[n], e.g. alive & filter) is true.
+        """
+        return [self._search_one(tokenize(q), n, k, allowed) for q in queries]
+
+    def _search_one(self, terms: List[str], n: int, k: int, allowed: Optional[np.ndarray]):
+        docs = max(1, self._docs)
+        avgdl = (self._total / docs) or 1.0
+        lengths = self._lengths
+        k1, b = self.k1, self.b
+
+        lists = []
+        for term in dict.fromkeys(terms):
+            postings = self._terms.get(term)
+            if postings is None:
+                continue
+            rows, tfs, m = postings.state
+            m = int(np.searchsorted(rows[:m], n))
+            if m == 0:
+                continue
+            df = max(1, m - postings.dead)
+            idf = math.log(1.0 + (docs - df + 0.5) / (df + 0.5))
+            # tf saturates and long rows are damped: max tf + shortest row bound every score
+            bound = idf * postings.max_tf * (k1 + 1) / (postings.max_tf + k1 * (1 - b + b * postings.min_len / avgdl))
+            lists.append((bound, idf, rows[:m], tfs[:m]))
+        if not lists:
+            return []
+        lists.sort(key=lambda x: -x[0])
+
+        def scores(idf, rows, tfs):
+            norm = k1 * (1 - b + b * lengths[rows] / avgdl)
+            return idf * tfs * (k1 + 1) / (tfs + norm)
+
+        cand = np.empty(0, dtype=np.int64)
+        acc = np.empty(0, dtype=np.float32)
+        remaining = sum(x[0] for x in lists)
+        theta = 0.0
+        i = 0
+        # essential terms: walk their lists in full
+        while i < len(lists) and (cand.size < k or remaining > theta):
+            bound, idf, rows, tfs = lists[i]
+            self.postings_scored += rows.size
+            if allowed is not None:
+                keep = allowed[rows]
+                rows, tfs = rows[keep], tfs[keep]
+            merged, inverse = np.unique(np.concatenate([cand, rows]), return_inverse=True)
+            acc = np.bincount(inverse, weights=np.concatenate([acc, scores(idf, rows, tfs)])).astype(np.float32)
+            cand = merged
+            remaining -= bound
+            theta = _kth(acc, k)
+            i += 1
+        # the rest can't lift an unseen row into the top k: only score known candidates
+        for bound, idf, rows, tfs in lists[i:]:
+            live = acc + remaining > theta
+            cand, acc = cand[live], acc[live]
+            pos = np.searchsorted(rows, cand)
+            pos[pos >= rows.size] = 0
+            found = rows[pos] == cand
+            self.postings_skipped += rows.size - int(found.sum())
+            acc[found] += scores(idf, rows[pos[found]], tfs[pos[found]])
+            remaining -= bound
+            theta = _kth(acc, k)
+
+        order = np.argsort(-acc, kind="stable")[:k]
+        return [(float(acc[j]), int(cand[j])) for j in order]
+
+
+def _kth(acc: np.ndarray, k: int) -> float:
+    if acc.size < k:
+        return 0.0
+    return float(np.partition(acc, acc.size - k)[acc.size - k])
+
+
+def rrf(rankings: List[List[int]], k: int, rrf_k: int = 60) -> List[Tuple[float, int]]:
+    """Reciprocal rank fusion of row rankings (best first): sum of 1 / (rrf_k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(((s, r) for r, s in fused.items()), key=lambda x: (-x[0], x[1]))[:k]
@@ -0,0 +1,274 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Fields with posting lists (value -> rows). List values (e.g. tags) post
+# every element, so equality on them means "list contains value".
+DEFAULT_FIELDS = ("patient_id", "source", "type", "tags", "doc_id")
+# Fields with sorted (value, row) arrays for $gt/$gte/$lt/$lte.
+DEFAULT_RANGE_FIELDS = ("visit_date",)
+
+RANGE_OPS = ("$gt", "$gte", "$lt", "$lte")
+
+# An unsorted tail of range entries is merged into the sorted arrays once it
+# holds more than RANGE_TAIL_MIN entries and 1/RANGE_TAIL_FRACTION of them.
+RANGE_TAIL_MIN = 1024
+RANGE_TAIL_FRACTION = 16
+
+
+# ------------------------------------------------------------
+# Filter semantics (shared by the index and the residual check)
+# ------------------------------------------------------------
+# filters: {field: cond}, all fields must match. cond is one of
+#   value                     equality (membership when metadata is a list)
+#   [v1, v2]                  metadata list contains every value
+#   {"$in": [v1, v2]}         equality with any of the values
+#   {"$gte": a, "$lt": b}     range (any of $gt/$gte/$lt/$lte)
+def match_filters(meta: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    if not filters:
+        return True
+    for field, cond in filters.items():
+        if not _match_value(meta.get(field), cond):
+            return False
+    return True
+
+
+def _match_value(actual: Any, cond: Any) -> bool:
+    values = actual if isinstance(actual, list) else [actual]
+    if _is_ops(cond):
+        for op, arg in cond.items():
+            if op == "$in":
+                if not any(v in values for v in _in_values(arg)):
+                    return False
+            elif op in RANGE_OPS:
+                if not any(_compare(v, op, arg) for v in values):
+                    return False
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+        return True
+    if isinstance(cond, list):
+        return all(c in values for c in cond)
+    return cond in values
+
+
+def _in_values(arg: Any) -> List[Any]:
+    # a bare string would otherwise be iterated character by character
+    if arg is None:
+        return []
+    if not isinstance(arg, (list, tuple)):
+        raise ValueError(f"$in expects a list, got {type(arg).__name__}")
+    return list(arg)
+
+
+def _is_ops(cond: Any) -> bool:
+    return isinstance(cond, dict) and bool(cond) and all(str(k).startswith("$") for k in cond)
+
+
+def _compare(v: Any, op: str, arg: Any) -> bool:
+    a, b = _range_key(v), _range_key(arg)
+    if a is None or b is None or a[0] != b[0]:
+        return False
+    if op == "$gt":
+        return a > b
+    if op == "$gte":
+        return a >= b
+    if op == "$lt":
+        return a < b
+    return a <= b
+
+
+def _range_key(v: Any):
+    # Keeps numbers and strings (ISO dates) in separate, comparable bands.
+    if isinstance(v, bool) or v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return (0, v)
+    if isinstance(v, str):
+        return (1, v)
+    return None
+
+
+def _indexable(v: Any) -> bool:
+    return isinstance(v, (str, int, float, bool))
+
+
+# ------------------------------------------------------------
+# Inverted index over metadata
+# ------------------------------------------------------------
+class MetadataIndex:
+    """
+    Posting lists over a few metadata fields, maintained on upsert, so a
+    filtered query only has to score (and residual-check) the rows the
+    indexed clauses allow instead of walking every item.
+
+    Safe for lock-free readers alongside one writer: posting lists only
+    ever grow (rows arrive in increasing order, so each list stays sorted).
+    Range entries first go to an unsorted per-band tail that queries scan
+    directly; once a tail outgrows RANGE_TAIL_MIN and 1/RANGE_TAIL_FRACTION
+    of the sorted arrays it is merged in with one searchsorted + insert into
+    fresh arrays, so an upsert costs O(batch) and the merge copies are
+    amortized. Rows that were tombstoned stay listed until the owner
+    rebuilds the index on compaction, so callers must mask results with
+    their alive set.
+    """
+
+    def __init__(self, fields: Iterable[str] = DEFAULT_FIELDS, range_fields: Iterable[str] = DEFAULT_RANGE_FIELDS):
+        self.fields = tuple(fields)
+        self.range_fields = tuple(range_fields)
+        self._postings: Dict[str, Dict[Any, List[int]]] = {f: {} for f in self.fields}
+        # field -> ({band: (values, rows)}, {band: [(value, row), ...]}):
+        # numbers (band 0) and strings (band 1) never compare, so each band
+        # is its own sorted pair of arrays plus an unsorted, append-only tail.
+        # Both halves are swapped together so a reader never misses entries.
+        self._sorted: Dict[str, Tuple[Dict[int, Tuple[np.ndarray, np.ndarray]], Dict[int, List[tuple]]]] = {
+            f: ({}, {0: [], 1: []}) for f in self.range_fields
+        }
+
+    def add_batch(self, rows_meta: List[Tuple[int, Dict[str, Any]]]):
+        """Indexes (row, metadata) pairs; rows must be ascending and new."""
+        pending: Dict[str, List[tuple]] = {f: [] for f in self.range_fields}
+        for row, meta in rows_meta:
+            for field in self.fields:
+                for v in _values(meta.get(field)):
+                    posting = self._postings[field].setdefault(v, [])
+                    if not posting or posting[-1] != row:
+                        posting.append(row)
+            for field in self.range_fields:
+                for v in _values(meta.get(field)):
+                    key = _range_key(v)
+                    if key is not None:
+                        pending[field].append((key, row))
+        for field, entries in pending.items():
+            if not entries:
+                continue
+            bands, tail = self._sorted[field]
+            for key, row in entries:
+                tail[key[0]].append((key[1], row))
+            if any(len(t) > max(RANGE_TAIL_MIN, _band_size(bands, b) // RANGE_TAIL_FRACTION) for b, t in tail.items()):
+                self._merge_tail(field)
+
+    def _merge_tail(self, field: str):
+        bands, tail = self._sorted[field]
+        bands = dict(bands)
+        for band, entries in tail.items():
+            if not entries:
+                continue
+            new = sorted(entries)
+            new_values = np.empty(len(new), dtype=object)
+            new_values[:] = [v for v, _ in new]
+            new_rows = np.fromiter((row for _, row in new), dtype=np.int64, count=len(new))
+            values, rows = bands.get(band, (np.empty(0, dtype=object), np.empty(0, dtype=np.int64)))
+            # tail rows are past every merged row: insert after equal values
+            at = np.searchsorted(values, new_values, side="right")
+            bands[band] = (np.insert(values, at, new_values), np.insert(rows, at, new_rows))
+        # copy-on-write so concurrent readers see stable arrays
+        self._sorted[field] = (bands, {0: [], 1: []})
+
+    def select(self, filters: Dict[str, Any], n: int, scan: Callable[[Dict[str, Any], int], np.ndarray]) -> np.ndarray:
+        """
+        Sorted rows (< n) matching `filters`. Indexed clauses are answered
+        from posting lists; any remaining clauses go to `scan(residual, n)`,
+        which returns a bool mask over rows < n (see RecordColumns.select),
+        and are kept only where the candidates allow.
+        """
+        candidates: Optional[np.ndarray] = None
+        residual: Dict[str, Any] = {}
+        for field, cond in filters.items():
+            rows = self._lookup(field, cond, n)
+            if rows is None:
+                residual[field] = cond
+                continue
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+            if candidates.size == 0:
+                return candidates
+
+        if not residual:
+            return candidates
+        mask = scan(residual, n)
+        return np.flatnonzero(mask) if candidates is None else candidates[mask[candidates]]
+
+    def _posting(self, field: str, value: Any, n: int) -> np.ndarray:
+        rows = np.array(self._postings[field].get(value, ()), dtype=np.int64)
+        return rows[: np.searchsorted(rows, n)]
+
+    def _lookup(self, field: str, cond: Any, n: int) -> Optional[np.ndarray]:
+        """Sorted unique rows for one clause, or None when the clause is not indexable."""
+        if _is_ops(cond):
+            out: Optional[np.ndarray] = None
+            ranges = {op: arg for op, arg in cond.items() if op in RANGE_OPS}
+            for op, arg in cond.items():
+                if op == "$in":
+                    values = _in_values(arg)
+                    if field not in self._postings or not all(_indexable(v) for v in values):
+                        return None
+                    parts = [self._posting(field, v, n) for v in values]
+                    rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+                elif op in RANGE_OPS:
+                    continue
+                else:
+                    return None
+                out = rows if out is None else np.intersect1d(out, rows, assume_unique=True)
+            if ranges:
+                if field not in self._sorted:
+                    return None
+                rows = self._range(field, ranges, n)
+                if rows is None:
+                    return None
+                out = rows if out is None else np.intersect1d(out, rows, assume_unique=True)
+            return out
+
+        if field not in self._postings:
+            return None
+        wanted = cond if isinstance(cond, list) else [cond]
+        if not all(_indexable(v) for v in wanted):
+            return None
+        out = None
+        for v in wanted:
+            rows = self._posting(field, v, n)
+            out = rows if out is None else np.intersect1d(out, rows, assume_unique=True)
+        return out if out is not None else np.empty(0, dtype=np.int64)
+
+    def _range(self, field: str, ranges: Dict[str, Any], n: int) -> Optional[np.ndarray]:
+        bands, tail = self._sorted[field]
+        band = None
+        for op, arg in ranges.items():
+            key = _range_key(arg)
+            if key is None:
+                return None
+            if band is None:
+                # numbers never compare with strings: stay inside the bound's band
+                band = key[0]
+                values, rows = bands.get(band, (np.empty(0, dtype=object), np.empty(0, dtype=np.int64)))
+                lo, hi = 0, values.size
+                # the writer may append while we read: take what is there now
+                pending = tail[band][:]
+                tail_values = np.empty(len(pending), dtype=object)
+                tail_values[:] = [v for v, _ in pending]
+                tail_rows = np.fromiter((row for _, row in pending), dtype=np.int64, count=len(pending))
+                keep = np.ones(len(pending), dtype=bool)
+            elif key[0] != band:
+                return np.empty(0, dtype=np.int64)
+            if op == "$gt":
+                lo = max(lo, int(np.searchsorted(values, key[1], side="right")))
+                keep &= tail_values > key[1]
+            elif op == "$gte":
+                lo = max(lo, int(np.searchsorted(values, key[1], side="left")))
+                keep &= tail_values >= key[1]
+            elif op == "$lt":
+                hi = min(hi, int(np.searchsorted(values, key[1], side="left")))
+                keep &= tail_values < key[1]
+            else:
+                hi = min(hi, int(np.searchsorted(values, key[1], side="right")))
+                keep &= tail_values <= key[1]
+        out = np.unique(np.concatenate([rows[lo:max(lo, hi)], tail_rows[keep]]))
+        return out[out < n]
+
+
+def _band_size(bands: Dict[int, Tuple[np.ndarray, np.ndarray]], band: int) -> int:
+    return bands[band][0].size if band in bands else 0
+
+
+def _values(v: Any) -> List[Any]:
+    if isinstance(v, list):
+        return [x for x in v if _indexable(x)]
+    return [v] if _indexable(v) else []
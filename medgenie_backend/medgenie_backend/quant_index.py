@@ -0,0 +1,304 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .cyborg_client import LocalVectorIndex, _top_k
+
+SCAN_BLOCK = 16384  # rows decoded/scored at a time, bounds the temporaries
+
+
+# ------------------------------------------------------------
+# Quantizers (on unit vectors: dot product = cosine similarity)
+# ------------------------------------------------------------
+class ScalarQuantizer:
+    """int8 per dimension: x ~ lo + code * step, one byte per dimension."""
+
+    def __init__(self, sample: np.ndarray):
+        self.lo = sample.min(axis=0)
+        step = (sample.max(axis=0) - self.lo) / 255.0
+        step[step == 0] = 1.0
+        self.step = step.astype(np.float32)
+        self.code_size = sample.shape[1]
+
+    def encode(self, unit: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((unit - self.lo) / self.step), 0, 255).astype(np.uint8)
+
+    def scorer(self, Q: np.ndarray):
+        """Returns codes -> approximate Q . x, (rows, queries), without decoding the codes."""
+        bias = Q @ self.lo
+        qs = (Q * self.step).T.astype(np.float32)
+        return lambda codes: codes.astype(np.float32) @ qs + bias
+
+    @property
+    def nbytes(self) -> int:
+        return self.lo.nbytes + self.step.nbytes
+
+
+class ProductQuantizer:
+    """
+    `m` subspaces with up to 256 k-means centroids each, one byte per
+    subspace. Scoring is asymmetric (ADC): the query stays in float and is
+    compared with every centroid once; a row's score is then m table lookups.
+    """
+
+    def __init__(self, sample: np.ndarray, m: int, iters: int = 8, seed: int = 0):
+        dim = sample.shape[1]
+        m = max(1, min(int(m), dim))
+        while dim % m:
+            m -= 1
+        self.m, self.dsub = m, dim // m
+        self.ksub = min(256, sample.shape[0])
+        self.code_size = m
+        rng = np.random.default_rng(seed)
+        self.codebooks = np.stack([
+            _kmeans(sample[:, j * self.dsub : (j + 1) * self.dsub], self.ksub, iters, rng) for j in range(m)
+        ])  # (m, ksub, dsub)
+
+    def encode(self, unit: np.ndarray) -> np.ndarray:
+        codes = np.empty((unit.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _assign(unit[:, j * self.dsub : (j + 1) * self.dsub], self.codebooks[j])
+        return codes
+
+    def scorer(self, Q: np.ndarray):
+        # (m, ksub, queries): every query against every centroid, once
+        tables = np.einsum("jkd,bjd->jkb", self.codebooks, Q.reshape(Q.shape[0], self.m, self.dsub))
+
+        def score(codes):
+            out = tables[0][codes[:, 0]]
+            for j in range(1, self.m):
+                out += tables[j][codes[:, j]]
+            return out
+
+        return score
+
+    @property
+    def nbytes(self) -> int:
+        return self.codebooks.nbytes
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (euclidean) per row."""
+    d = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * (x @ centroids.T)
+    return np.argmin(d, axis=1)
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int, rng) -> np.ndarray:
+    centroids = x[rng.choice(x.shape[0], k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids = sums / np.maximum(counts, 1)[:, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(x.shape[0], int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32)
+
+
+# ------------------------------------------------------------
+# Quantized index
+# ------------------------------------------------------------
+class QuantizedVectorIndex(LocalVectorIndex):
+    """
+    Searches compressed codes instead of the float32 matrix: int8 scalar
+    quantization ("sq8", 1 byte per dimension) or product quantization
+    ("pq", `pq_m` bytes per vector). The codes pick a shortlist of
+    `rerank` x top_k rows, which is re-ranked exactly against the float
+    vectors. Those live in the (required) SegmentStore, memory-mapped, so
+    only the codes take process memory and the floats are file pages the
+    OS can drop; a query only touches the shortlist's rows.
+
+    This buys memory, not speed: scanning the codes in numpy is slower than
+    the exact index's single BLAS matrix product (at 20k x 384, about
+    4.5 ms for sq8 and 5 ms for pq48 against 1.7 ms exact), and a
+    shortlist row that is not in the page cache costs a disk read. Use it
+    when the float matrix does not fit in RAM.
+
+    Codes are derived state: the quantizer is trained once `min_train` rows
+    exist (exact search until then), new rows are encoded on upsert, and
+    everything is retrained after the index grows by `retrain_factor`.
+    """
+
+    def __init__(
+        self,
+        embedding_fn,
+        kind: str = "sq8",
+        pq_m: int = 48,
+        rerank: int = 32,
+        min_train: int = 2048,
+        retrain_factor: float = 4.0,
+        max_train: int = 8192,
+        **kwargs,
+    ):
+        if kind not in ("sq8", "pq"):
+            raise ValueError(f"Unknown quantizer: {kind!r}")
+        if kwargs.get("store") is None:
+            # without one the float matrix stays in RAM next to the codes
+            raise ValueError("QuantizedVectorIndex needs a SegmentStore to keep the float vectors on disk")
+        self.kind = kind
+        self.pq_m = pq_m
+        self.rerank = max(1, int(rerank))
+        self.min_train = max(1, int(min_train))
+        self.retrain_factor = retrain_factor
+        self.max_train = max_train
+        self._quantizer = None
+        self._codes: Optional[np.ndarray] = None  # (capacity, code_size) uint8, rows aligned with _vectors
+        self._trained_at = 0
+        super().__init__(embedding_fn, **kwargs)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._quantizer is not None
+
+    def train(self):
+        with self._lock:
+            self._train()
+            self._publish()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Sizes per live vector. `resident_bytes_per_vector` is what the index
+        holds in process memory: the code buffer (capacity included) plus
+        any float copy that is not a file mapping.
+        """
+        snap = self._snap
+        dim = snap.vectors.shape[1] if snap.vectors is not None else (self._dim or 0)
+        quantizer, codes = snap.aux if snap.aux else (None, None)
+        code_size = quantizer.code_size if quantizer is not None else 0
+        live = snap.count - snap.dead
+        resident = codes.nbytes if codes is not None else 0
+        if snap.vectors is not None and not isinstance(snap.vectors, np.memmap):
+            resident += snap.vectors.nbytes + snap.norms.nbytes
+        return {
+            "kind": self.kind,
+            "vectors": live,
+            "float_bytes_per_vector": dim * 4,
+            "code_bytes_per_vector": code_size,
+            "resident_bytes_per_vector": resident / live if live else 0.0,
+            "compression": (dim * 4 / code_size) if code_size else 0.0,
+            "codebook_bytes": quantizer.nbytes if quantizer is not None else 0,
+        }
+
+    def _aux(self):
+        return (self._quantizer, self._codes)
+
+    def _unit(self, rows: np.ndarray) -> np.ndarray:
+        return self._vectors[rows] / self._norms[rows, None]
+
+    def _train(self):
+        live = np.flatnonzero(self._alive[: self._count])
+        if live.size == 0:
+            return
+        sample = live
+        if live.size > self.max_train:
+            sample = np.sort(np.random.default_rng(0).choice(live, self.max_train, replace=False))
+        unit = self._unit(sample)
+        if self.kind == "pq":
+            self._quantizer = ProductQuantizer(unit, self.pq_m)
+        else:
+            self._quantizer = ScalarQuantizer(unit)
+        # fresh buffer: published snapshots keep the old codes
+        codes = np.zeros((self._capacity, self._quantizer.code_size), dtype=np.uint8)
+        self._codes = codes
+        self._encode(np.arange(self._count))
+        self._trained_at = live.size
+
+    def _encode(self, rows: np.ndarray):
+        if self._codes.shape[0] < self._capacity:
+            codes = np.zeros((self._capacity, self._codes.shape[1]), dtype=np.uint8)
+            codes[: self._codes.shape[0]] = self._codes
+            self._codes = codes
+        for start in range(0, rows.size, SCAN_BLOCK):
+            block = rows[start : start + SCAN_BLOCK]
+            self._codes[block] = self._quantizer.encode(self._unit(block))
+
+    def _reset(self):
+        super()._reset()
+        self._quantizer = None
+        self._codes = None
+        self._trained_at = 0
+
+    def _after_upsert(self, rows: List[int]):
+        live = self._count - self._dead
+        if self._quantizer is None:
+            if live >= self.min_train:
+                self._train()
+            return
+        if live >= self._trained_at * self.retrain_factor:
+            self._train()
+            return
+        self._encode(np.asarray(rows, dtype=np.int64))
+
+    def _after_compact(self):
+        # Rows were renumbered: re-encode with the same quantizer.
+        if self._quantizer is None:
+            return
+        self._codes = np.zeros((self._capacity, self._quantizer.code_size), dtype=np.uint8)
+        self._encode(np.arange(self._count))
+
+    def _search(self, snap, Q, qnorms, rows, k, rerank: Optional[int] = None, **search_params):
+        quantizer, codes = snap.aux
+        shortlist = k * max(1, int(rerank or self.rerank))
+        n = snap.count
+        # exact when untrained, or when a filter leaves about a shortlist's worth of rows
+        if quantizer is None or (rows is not None and rows.size <= shortlist * 4):
+            return self._exact(snap, Q, qnorms, rows, k)
+
+        cand_rows = rows if rows is not None else np.arange(n)
+        score = quantizer.scorer(Q / qnorms[:, None])
+        approx = np.empty((cand_rows.size, Q.shape[0]), dtype=np.float32)
+        for start in range(0, cand_rows.size, SCAN_BLOCK):
+            approx[start : start + SCAN_BLOCK] = score(codes[cand_rows[start : start + SCAN_BLOCK]])
+        if rows is None and snap.dead:
+            approx[~snap.alive[:n]] = -np.inf
+
+        out = []
+        for b in range(Q.shape[0]):
+            col = approx[:, b]
+            best = _top_k(-col, shortlist)
+            cand = cand_rows[best[np.isfinite(col[best])]]
+            out.extend(self._exact(snap, Q[b : b + 1], qnorms[b : b + 1], cand, k))
+        return out
+
+
+# ------------------------------------------------------------
+# Memory and recall against the exact index
+# ------------------------------------------------------------
+def quant_report(
+    exact: LocalVectorIndex,
+    index: QuantizedVectorIndex,
+    qvecs: List[List[float]],
+    top_k: int = 10,
+    reranks: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    For each rerank factor (1 = codes alone decide the top_k), mean
+    recall@top_k of `index` against `exact` over `qvecs`, per-query latency
+    (ms) for both, and the index's resident bytes per vector.
+    """
+    include = ["distance"]
+
+    t0 = time.perf_counter()
+    truth = [{h["id"] for h in exact.search_vectors([q], top_k=top_k, include=include)[0]} for q in qvecs]
+    exact_ms = (time.perf_counter() - t0) * 1000.0 / max(1, len(qvecs))
+    memory = index.memory_stats()
+
+    rows = []
+    for rerank in reranks or [index.rerank]:
+        t0 = time.perf_counter()
+        got = [index.search_vectors([q], top_k=top_k, include=include, rerank=rerank)[0] for q in qvecs]
+        quant_ms = (time.perf_counter() - t0) * 1000.0 / max(1, len(qvecs))
+        recall = [len(want & {h["id"] for h in hits}) / max(1, len(want)) for want, hits in zip(truth, got)]
+        rows.append({
+            "kind": index.kind,
+            "rerank": rerank,
+            "recall": float(np.mean(recall)) if recall else 0.0,
+            "quant_ms": quant_ms,
+            "exact_ms": exact_ms,
+            "bytes_per_vector": memory["resident_bytes_per_vector"],
+            "float_bytes_per_vector": memory["float_bytes_per_vector"],
+        })
+    return rows
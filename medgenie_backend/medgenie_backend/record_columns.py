@@ -0,0 +1,149 @@
+import json
+import sys
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from .metadata_index import _match_value
+
+
+def _value_key(v: Any):
+    # 1, 1.0 and True are equal as dict keys but not as metadata values
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return (type(v).__name__, v)
+    return ("json", json.dumps(v, sort_keys=True, default=str))
+
+
+class _Column:
+    """One metadata key, dictionary-encoded: codes[row] indexes values (-1 = key absent)."""
+
+    __slots__ = ("values", "codes", "_lookup")
+
+    def __init__(self, capacity: int):
+        self.values: List[Any] = []
+        self.codes = np.full(capacity, -1, dtype=np.int32)
+        self._lookup: Dict[Any, int] = {}
+
+    def encode(self, v: Any) -> int:
+        key = _value_key(v)
+        code = self._lookup.get(key)
+        if code is None:
+            code = self._lookup[key] = len(self.values)
+            self.values.append(sys.intern(v) if isinstance(v, str) else v)
+        return code
+
+    def grow(self, capacity: int, n: int):
+        codes = np.full(capacity, -1, dtype=np.int32)
+        codes[:n] = self.codes[:n]
+        self.codes = codes
+
+
+class RecordColumns:
+    """
+    The records behind the vector rows ({id, contents, metadata} per row),
+    stored by column: ids in one list, all contents in one UTF-8 buffer
+    addressed by offsets, and each metadata key as an int32 code array
+    into that key's distinct values, so a value repeated across thousands
+    of chunks is held once.
+
+    Append-only like the vector matrix: rows < a published count never
+    change, and arrays are replaced (not resized in place) when they grow,
+    so lock-free readers can keep using rows they know about. Compaction
+    builds a new RecordColumns with take().
+    """
+
+    __slots__ = ("ids", "_buf", "_offsets", "_columns", "_count", "_capacity")
+
+    def __init__(self, capacity: int = 1024):
+        self.ids: List[str] = []
+        self._buf = bytearray()
+        self._capacity = max(1, int(capacity))
+        self._offsets = np.zeros(self._capacity + 1, dtype=np.int64)
+        self._columns: Dict[str, _Column] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    # ---------- writes ----------
+    def append(self, id_: str, contents: str, metadata: Dict[str, Any]) -> int:
+        row = self._count
+        if row >= self._capacity:
+            self._grow(self._capacity * 2)
+        for key, v in (metadata or {}).items():
+            col = self._columns.get(key)
+            if col is None:
+                # copy-on-write: readers may be iterating the column map
+                col = _Column(self._capacity)
+                self._columns = {**self._columns, sys.intern(str(key)): col}
+            col.codes[row] = col.encode(v)
+        self._buf += (contents or "").encode("utf-8")
+        self._offsets[row + 1] = len(self._buf)
+        self.ids.append(id_)
+        self._count = row + 1
+        return row
+
+    def take(self, rows: Iterable[int]) -> "RecordColumns":
+        """A new RecordColumns holding `rows`, renumbered from 0."""
+        rows = list(rows)
+        out = RecordColumns(capacity=max(1, len(rows)))
+        for row in rows:
+            out.append(self.ids[row], self.contents(row), self.metadata(row))
+        return out
+
+    def _grow(self, capacity: int):
+        offsets = np.zeros(capacity + 1, dtype=np.int64)
+        offsets[: self._count + 1] = self._offsets[: self._count + 1]
+        self._offsets = offsets
+        for col in self._columns.values():
+            col.grow(capacity, self._count)
+        self._capacity = capacity
+
+    # ---------- reads ----------
+    def contents(self, row: int) -> str:
+        offsets = self._offsets
+        return bytes(self._buf[offsets[row] : offsets[row + 1]]).decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        out = {}
+        for key, col in self._columns.items():
+            code = col.codes[row]
+            if code >= 0:
+                v = col.values[code]
+                # shared value objects: hand out copies of the mutable ones
+                out[key] = v.copy() if isinstance(v, (list, dict)) else v
+        return out
+
+    def record(self, row: int) -> Dict[str, Any]:
+        return {"id": self.ids[row], "contents": self.contents(row), "metadata": self.metadata(row)}
+
+    def records(self, start: int, end: int) -> List[Dict[str, Any]]:
+        return [self.record(row) for row in range(start, end)]
+
+    def select(self, filters: Dict[str, Any], n: int) -> np.ndarray:
+        """
+        Rows (< n) matching `filters` as a bool mask. Each clause is
+        evaluated once per distinct value of its key, then applied to the
+        rows as one array comparison on the codes.
+        """
+        mask = np.ones(n, dtype=bool)
+        columns = self._columns
+        for field, cond in filters.items():
+            col = columns.get(field)
+            absent_ok = _match_value(None, cond)
+            if col is None:
+                if not absent_ok:
+                    mask[:] = False
+                continue
+            values = col.values[:]
+            good = np.array([code for code, v in enumerate(values) if _match_value(v, cond)], dtype=np.int32)
+            codes = col.codes[:n]
+            hit = np.isin(codes, good)
+            if absent_ok:
+                hit |= codes < 0
+            mask &= hit
+        return mask
+
+    def nbytes(self) -> int:
+        """Approximate memory of the arrays and buffers (ids and distinct values excluded)."""
+        return len(self._buf) + self._offsets.nbytes + sum(c.codes.nbytes for c in self._columns.values())
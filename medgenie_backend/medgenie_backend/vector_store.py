@@ -0,0 +1,264 @@
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: single-process use only
+    fcntl = None
+
+# ------------------------------------------------------------
+# On-disk segment store for LocalVectorIndex
+# ------------------------------------------------------------
+# <path>/CURRENT            name of the live generation dir (swapped atomically)
+# <path>/GENERATION         uint64 bumped after every committed write (mmap'd)
+# <path>/LOCK               flock'd exclusively by the writer, shared by readers catching up
+# <path>/gen-000001/
+#     meta.json             {"dim": ..., "capacity": ...}
+#     vectors.f32           float32[capacity, dim], rows past the log are unused
+#     norms.f32             float32[capacity]
+#     records.jsonl         append-only log: {"op": "put", id, contents, metadata}
+#                           or {"op": "del", "id"}; the n-th put owns row n
+#
+# Writes go vectors -> msync -> log line -> fsync, so every logged put has
+# its vector on disk; a torn last log line is dropped on load and rows past
+# the last put are simply reused. Compaction writes a new generation and
+# flips CURRENT, so a crash leaves either the old or the new one intact.
+# The generation it replaced is only deleted by the compaction after that,
+# so a reader that resolved it just before the flip (e.g. without flock)
+# can still finish reading it.
+#
+# Several processes (gunicorn/uvicorn workers) can open the same store: the
+# vector files are shared page cache, writes are serialised with flock, and
+# readers compare GENERATION with what they last saw to know when to pick
+# up new log entries (or a new generation after compaction), reading them
+# under a shared flock so a compaction cannot swap files mid-read.
+
+
+class SegmentStore:
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self._gen: Optional[str] = None
+        self._dim = 0
+        self._capacity = 0
+        self._log = None
+        self._offset = 0  # bytes of the live log already replayed
+        os.makedirs(path, exist_ok=True)
+
+        counter = os.path.join(path, "GENERATION")
+        with open(counter, "ab") as f:
+            if f.tell() < 8:
+                f.truncate(8)
+        self._counter = np.memmap(counter, dtype=np.uint64, mode="r+", shape=(1,))
+
+    # ---------- layout ----------
+    def _gen_dir(self, gen: Optional[str] = None) -> str:
+        return os.path.join(self.path, gen or self._gen)
+
+    def _file(self, name: str, gen: Optional[str] = None) -> str:
+        return os.path.join(self._gen_dir(gen), name)
+
+    def _current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _next_gen(self) -> str:
+        cur = self._current()
+        n = int(cur.split("-")[1]) + 1 if cur else 1
+        return f"gen-{n:06d}"
+
+    def _map(self, gen: str) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = np.memmap(self._file("vectors.f32", gen), dtype=np.float32, mode="r+", shape=(self._capacity, self._dim))
+        norms = np.memmap(self._file("norms.f32", gen), dtype=np.float32, mode="r+", shape=(self._capacity,))
+        return vectors, norms
+
+    # ---------- cross-process coordination ----------
+    @contextmanager
+    def locked(self, shared: bool = False):
+        """Exclusive writer lock across processes, or a shared one for reading the live generation."""
+        with open(os.path.join(self.path, "LOCK"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def generation(self) -> int:
+        return int(self._counter[0])
+
+    def bump(self) -> int:
+        """Announces a committed write to other processes. Call while locked()."""
+        self._counter[0] += 1
+        self._counter.flush()
+        return int(self._counter[0])
+
+    def position(self) -> Tuple[Optional[str], int]:
+        """(generation dir, log bytes) as this process last wrote or read them."""
+        return self._gen, self._offset
+
+    def is_stale(self) -> bool:
+        """True when another process switched generations (e.g. compacted)."""
+        return self._current() != self._gen
+
+    def read_new(self) -> Tuple[List[Dict[str, Any]], Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Log entries appended since the last load/read, plus fresh maps if the
+        files were grown meanwhile (else None). Call while locked(shared=True).
+        """
+        if self._gen is None:
+            return [], None
+        entries = self._read_log(self._file("records.jsonl"))
+        with open(self._file("meta.json")) as f:
+            capacity = int(json.load(f)["capacity"])
+        maps = None
+        if capacity > self._capacity:
+            self._capacity = capacity
+            maps = self._map(self._gen)
+        return entries, maps
+
+    def _read_log(self, path: str) -> List[Dict[str, Any]]:
+        entries, good = [], self._offset
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail (crash) or a write still in progress
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                good += len(line)
+        self._offset = good
+        return entries
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    # ---------- lifecycle ----------
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        Maps the live generation. Returns None for an empty store, else
+        {"vectors", "norms" (memmaps), "capacity", "dim", "entries"} where
+        entries is the replayable log. Call while locked() (shared or not).
+        """
+        gen = self._current()
+        if not gen:
+            return None
+        with open(self._file("meta.json", gen)) as f:
+            meta = json.load(f)
+        self._gen, self._dim, self._capacity = gen, int(meta["dim"]), int(meta["capacity"])
+
+        log_path = self._file("records.jsonl", gen)
+        self._offset = 0
+        entries = self._read_log(log_path)
+
+        vectors, norms = self._map(gen)
+        if self._log is not None:
+            self._log.close()
+        self._log = open(log_path, "ab")
+        return {"vectors": vectors, "norms": norms, "capacity": self._capacity, "dim": self._dim, "entries": entries}
+
+    def create(self, dim: int, capacity: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Starts an empty generation sized for `capacity` rows."""
+        return self.rewrite(dim, capacity, np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.float32), [])
+
+    def grow(self, capacity: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Extends the files (sparse) and returns fresh, larger maps; old maps stay valid."""
+        for name, width in (("vectors.f32", self._dim), ("norms.f32", 1)):
+            with open(self._file(name), "r+b") as f:
+                f.truncate(capacity * width * 4)
+        self._capacity = capacity
+        self._write_meta(self._gen)
+        return self._map(self._gen)
+
+    def commit(self, vectors: np.ndarray, norms: np.ndarray, records: List[Dict[str, Any]]):
+        """Makes already-written rows durable, then logs their records."""
+        vectors.flush()
+        norms.flush()
+        self._append([{"op": "put", **r} for r in records])
+
+    def log_deletes(self, ids: List[str]):
+        self._append([{"op": "del", "id": id_} for id_ in ids])
+
+    def truncate_torn_tail(self):
+        """Drops bytes past the last complete log line (left by a crashed writer). Call while locked()."""
+        if self._gen is None:
+            return
+        path = self._file("records.jsonl")
+        if os.path.getsize(path) > self._offset:
+            with open(path, "r+b") as f:
+                f.truncate(self._offset)
+
+    def rewrite(self, dim: int, capacity: int, vectors: np.ndarray, norms: np.ndarray, records: List[Dict[str, Any]]):
+        """Writes a new generation holding exactly `records` (row i = records[i]) and switches to it."""
+        old = self._gen
+        gen = self._next_gen()
+        os.makedirs(self._gen_dir(gen), exist_ok=True)
+        self._dim, self._capacity = dim, capacity
+
+        for name, data, width in (("vectors.f32", vectors, dim), ("norms.f32", norms, 1)):
+            with open(self._file(name, gen), "wb") as f:
+                f.write(np.ascontiguousarray(data, dtype=np.float32).tobytes())
+                f.truncate(capacity * width * 4)
+                self._sync(f)
+        with open(self._file("records.jsonl", gen), "wb") as f:
+            for r in records:
+                f.write(_line({"op": "put", **r}))
+            self._sync(f)
+        self._write_meta(gen)
+
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp, "w") as f:
+            f.write(gen)
+            self._sync(f)
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+        if self._log is not None:
+            self._log.close()
+        self._gen = gen
+        self._log = open(self._file("records.jsonl"), "ab")
+        self._offset = self._log.tell()
+        # keep `old` for readers that resolved it before the flip; anything
+        # older has been superseded for a whole compaction cycle. Open maps
+        # of a removed generation keep working until released.
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in (gen, old):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        return self._map(gen)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    # ---------- helpers ----------
+    def _append(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        data = b"".join(_line(e) for e in entries)
+        self._log.write(data)
+        self._sync(self._log)
+        self._offset += len(data)
+
+    def _write_meta(self, gen: str):
+        tmp = self._file("meta.json.tmp", gen)
+        with open(tmp, "w") as f:
+            json.dump({"dim": self._dim, "capacity": self._capacity}, f)
+            self._sync(f)
+        os.replace(tmp, self._file("meta.json", gen))
+
+
+def _line(entry: Dict[str, Any]) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")